@@ -31,7 +31,7 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 from app.database import Base
-from app.models import user, knowledge_base, query_history
+from app.models import user, knowledge_base, query_history, knowledge_base_stats
 
 target_metadata = Base.metadata
 
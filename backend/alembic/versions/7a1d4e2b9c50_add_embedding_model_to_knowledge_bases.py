@@ -0,0 +1,35 @@
+"""Add embedding model and re-embedding migration columns to knowledge_bases
+
+Revision ID: 7a1d4e2b9c50
+Revises: 3cff2864c3cd
+Create Date: 2026-10-19 10:12:31.418207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '7a1d4e2b9c50'
+down_revision: Union[str, Sequence[str], None] = '3cff2864c3cd'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('knowledge_bases', sa.Column('embedding_model', sa.String(length=200), nullable=True))
+    op.add_column('knowledge_bases', sa.Column('embedding_dimension', sa.Integer(), nullable=True))
+    op.add_column('knowledge_bases', sa.Column('migration_collection', sa.String(length=200), nullable=True))
+    op.add_column('knowledge_bases', sa.Column('migration_embedding_model', sa.String(length=200), nullable=True))
+    # 已有知识库可能由默认模型或加载失败后的后备模型生成，迁移中无法确定，保持为空，
+    # 应用启动时按Qdrant集合的实际向量维度补全（见 reembedding.backfill_embedding_models）
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('knowledge_bases', 'migration_embedding_model')
+    op.drop_column('knowledge_bases', 'migration_collection')
+    op.drop_column('knowledge_bases', 'embedding_dimension')
+    op.drop_column('knowledge_bases', 'embedding_model')
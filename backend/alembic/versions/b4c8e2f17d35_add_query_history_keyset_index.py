@@ -0,0 +1,33 @@
+"""Add composite index for keyset pagination of query_histories
+
+Revision ID: b4c8e2f17d35
+Revises: 7a1d4e2b9c50
+Create Date: 2026-10-19 14:36:08.527391
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'b4c8e2f17d35'
+down_revision: Union[str, Sequence[str], None] = '7a1d4e2b9c50'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 查询历史按 (created_at, id) 降序翻页，索引覆盖过滤和排序，不需要额外排序
+    op.create_index(
+        'ix_query_histories_kb_created_id',
+        'query_histories',
+        ['knowledge_base_id', 'created_at', 'id'],
+        unique=False
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_query_histories_kb_created_id', table_name='query_histories')
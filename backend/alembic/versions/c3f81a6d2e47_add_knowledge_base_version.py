@@ -0,0 +1,31 @@
+"""Add version column to knowledge_bases
+
+Revision ID: c3f81a6d2e47
+Revises: e5a27c9d1f63
+Create Date: 2026-10-19 21:08:12.417390
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3f81a6d2e47'
+down_revision: Union[str, Sequence[str], None] = 'e5a27c9d1f63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 每次更新知识库时加一，多进程的元数据缓存按版本号判断是否过期
+    op.add_column(
+        'knowledge_bases',
+        sa.Column('version', sa.Integer(), nullable=False, server_default='1')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('knowledge_bases', 'version')
@@ -0,0 +1,51 @@
+"""Add knowledge_base_stats table with incrementally maintained usage statistics
+
+Revision ID: d91f3a6c0b84
+Revises: b4c8e2f17d35
+Create Date: 2026-10-19 15:02:44.190536
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'd91f3a6c0b84'
+down_revision: Union[str, Sequence[str], None] = 'b4c8e2f17d35'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'knowledge_base_stats',
+        sa.Column('knowledge_base_id', sa.Integer(), nullable=False),
+        sa.Column('query_count', sa.Integer(), nullable=False),
+        sa.Column('scored_count', sa.Integer(), nullable=False),
+        sa.Column('score_sum', sa.Float(), nullable=False),
+        sa.Column('min_score', sa.Float(), nullable=True),
+        sa.Column('latency_count', sa.Integer(), nullable=False),
+        sa.Column('latency_histogram', sa.Text(), nullable=True),
+        sa.Column('last_used_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['knowledge_base_id'], ['knowledge_bases.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('knowledge_base_id')
+    )
+    op.create_index(
+        op.f('ix_knowledge_base_stats_last_used_at'), 'knowledge_base_stats', ['last_used_at'], unique=False
+    )
+    # 由已有的查询历史回填统计，历史记录没有延迟，直方图从空开始
+    op.execute(
+        "INSERT INTO knowledge_base_stats "
+        "(knowledge_base_id, query_count, scored_count, score_sum, min_score, latency_count, last_used_at) "
+        "SELECT knowledge_base_id, COUNT(*), COUNT(similarity_score), COALESCE(SUM(similarity_score), 0), "
+        "MIN(similarity_score), 0, MAX(created_at) "
+        "FROM query_histories GROUP BY knowledge_base_id"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_knowledge_base_stats_last_used_at'), table_name='knowledge_base_stats')
+    op.drop_table('knowledge_base_stats')
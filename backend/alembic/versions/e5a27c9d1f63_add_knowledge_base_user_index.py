@@ -0,0 +1,33 @@
+"""Add composite (user_id, id) index to knowledge_bases
+
+Revision ID: e5a27c9d1f63
+Revises: d91f3a6c0b84
+Create Date: 2026-10-19 16:21:37.804512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a27c9d1f63'
+down_revision: Union[str, Sequence[str], None] = 'd91f3a6c0b84'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 按用户列出知识库和按 (用户, ID) 校验归属都走该索引
+    op.create_index(
+        'ix_knowledge_bases_user_id_id', 'knowledge_bases', ['user_id', 'id'], unique=False
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # MySQL在新建以 user_id 开头的索引后会删除外键自动创建的索引，删除前先为外键补建单列索引
+    if op.get_bind().dialect.name == 'mysql':
+        op.create_index('ix_knowledge_bases_user_id', 'knowledge_bases', ['user_id'], unique=False)
+    op.drop_index('ix_knowledge_bases_user_id_id', table_name='knowledge_bases')
@@ -1,12 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.security import OAuth2PasswordRequestForm
 from datetime import timedelta
-from app.database import get_db
+from app.database import get_async_db
 from app.models.user import User
 from app.schemas.auth import UserCreate, User as UserSchema, Token, PasswordChange
-from app.core.security import create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES, verify_token
+from app.core.password_hashing import PasswordHashingBusy, password_hasher
+from app.core.security import create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES, verify_token_claims
+from app.core.user_cache import user_cache
 from fastapi.security import OAuth2PasswordBearer
 import os
 import shutil
@@ -18,13 +21,35 @@ router = APIRouter(
     tags=["auth"]
 )
 
+async def hash_password(password: str) -> str:
+    """在密码哈希线程池中哈希密码，排队过多时返回503"""
+    try:
+        return await password_hasher.hash(password)
+    except PasswordHashingBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="服务繁忙，请稍后重试",
+            headers={"Retry-After": "1"},
+        )
+
+async def verify_password(password: str, hashed_password: str):
+    """在密码哈希线程池中校验密码，返回 (是否正确, 需要更新时的新哈希)，排队过多时返回503"""
+    try:
+        return await password_hasher.verify_and_update(password, hashed_password)
+    except PasswordHashingBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="服务繁忙，请稍后重试",
+            headers={"Retry-After": "1"},
+        )
+
 @router.post("/register", response_model=UserSchema)
-def register_user(user: UserCreate, db: Session = Depends(get_db)):
+async def register_user(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
     """
     用户注册端点
     """
     # 检查用户名是否已存在
-    db_user = db.query(User).filter(User.username == user.username).first()
+    db_user = (await db.execute(select(User).where(User.username == user.username))).scalars().first()
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -32,7 +57,7 @@ def register_user(user: UserCreate, db: Session = Depends(get_db)):
         )
     
     # 检查邮箱是否已存在
-    db_user = db.query(User).filter(User.email == user.email).first()
+    db_user = (await db.execute(select(User).where(User.email == user.email))).scalars().first()
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -44,12 +69,13 @@ def register_user(user: UserCreate, db: Session = Depends(get_db)):
         username=user.username,
         email=user.email
     )
-    new_user.set_password(user.password)
+    # bcrypt哈希耗时较长，在专用线程池中执行，不阻塞事件循环
+    new_user.hashed_password = await hash_password(user.password)
     
     try:
         db.add(new_user)
-        db.commit()
-        db.refresh(new_user)
+        await db.commit()
+        await db.refresh(new_user)
         
         # 为新用户创建专属的知识库目录
         # 注意：Qdrant 是外部数据库，不需要本地目录
@@ -67,35 +93,41 @@ def register_user(user: UserCreate, db: Session = Depends(get_db)):
         }
         return user_dict
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="用户注册失败"
         )
 
 @router.post("/login", response_model=Token)
-def login_user(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login_user(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
     """
     用户登录端点
     """
     # 根据用户名查找用户
-    user = db.query(User).filter(User.username == form_data.username).first()
-    if not user or not user.check_password(form_data.password):
+    user = (await db.execute(select(User).where(User.username == form_data.username))).scalars().first()
+    verified, new_hash = await verify_password(form_data.password, user.hashed_password) if user else (False, None)
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="用户名或密码错误",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # 创建访问令牌
+    # bcrypt代价因子调整后，登录时用新的代价因子重新哈希
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
+    
+    # 创建访问令牌，带上用户ID以便按主键解析用户
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data={"sub": user.username, "uid": user.id}, expires_delta=access_token_expires
     )
     
     return {"access_token": access_token, "token_type": "bearer"}
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
     """
     获取当前用户依赖项
     """
@@ -105,13 +137,26 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    username = verify_token(token, credentials_exception)
-    user = db.query(User).filter(User.username == username).first()
+    username, user_id = verify_token_claims(token, credentials_exception)
+    
+    # 缓存命中时不访问数据库
+    user = user_cache.get(username)
+    if user is not None and (user_id is None or user.id == user_id):
+        return user
+    
+    if user_id is not None:
+        user = await db.get(User, user_id)
+        if user is not None and user.username != username:
+            user = None
+    else:
+        # 早期签发的令牌不包含用户ID，按用户名查询
+        user = (await db.execute(select(User).where(User.username == username))).scalars().first()
     if user is None:
         raise credentials_exception
+    user_cache.put(username, user)
     return user
 
-def get_current_active_user(current_user: User = Depends(get_current_user)):
+async def get_current_active_user(current_user: User = Depends(get_current_user)):
     """
     获取当前活跃用户依赖项
     """
@@ -119,33 +164,43 @@ def get_current_active_user(current_user: User = Depends(get_current_user)):
     return current_user
 
 @router.put("/users/me/password", response_model=UserSchema)
-def change_password(
+async def change_password(
     password_change: PasswordChange,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     修改当前用户密码
     """
+    # 当前用户可能来自缓存，修改前在本次会话中重新加载
+    user = await db.get(User, current_user.id)
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="用户不存在"
+        )
+    
     # 验证当前密码是否正确
-    if not current_user.check_password(password_change.current_password):
+    verified, _ = await verify_password(password_change.current_password, user.hashed_password)
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="当前密码错误"
         )
     
     # 设置新密码
-    current_user.set_password(password_change.new_password)
-    db.commit()
-    db.refresh(current_user)
+    user.hashed_password = await hash_password(password_change.new_password)
+    await db.commit()
+    await db.refresh(user)
+    user_cache.invalidate(user.username)
     
     # 手动转换 datetime 字段为字符串
     user_dict = {
-        "id": current_user.id,
-        "username": current_user.username,
-        "email": current_user.email,
-        "created_at": current_user.created_at.isoformat() if current_user.created_at else None,
-        "updated_at": current_user.updated_at.isoformat() if current_user.updated_at else None
+        "id": user.id,
+        "username": user.username,
+        "email": user.email,
+        "created_at": user.created_at.isoformat() if user.created_at else None,
+        "updated_at": user.updated_at.isoformat() if user.updated_at else None
     }
     return user_dict
 
@@ -154,10 +209,19 @@ def delete_user_knowledge(current_user: User = Depends(get_current_active_user))
     """
     删除当前用户的知识库
     """
-    # Qdrant 不需要手动清理目录，由 UserRAGPipeline 处理
+    # Qdrant 不需要手动清理目录，直接删除用户专属集合
     # user_kb_path = f"./chroma_db/user_{current_user.id}"
     # if os.path.exists(user_kb_path):
     #     shutil.rmtree(user_kb_path)
+    from app.core.qdrant_collections import drop_collection
+    from app.core.qdrant_connection import get_qdrant_client
+    try:
+        drop_collection(get_qdrant_client(), f"user_{current_user.id}_knowledge")
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"删除知识库时出错: {str(e)}"
+        )
     return
 
 @router.get("/users/me", response_model=UserSchema)
@@ -173,4 +237,11 @@ def read_users_me(current_user: User = Depends(get_current_active_user)):
         "created_at": current_user.created_at.isoformat() if current_user.created_at else None,
         "updated_at": current_user.updated_at.isoformat() if current_user.updated_at else None
     }
-    return user_dict
\ No newline at end of file
+    return user_dict
+
+@router.get("/password-hashing/stats")
+async def password_hashing_stats(current_user: User = Depends(get_current_active_user)):
+    """
+    获取密码哈希线程池的排队深度、拒绝数和耗时统计
+    """
+    return password_hasher.stats()
@@ -1,9 +1,9 @@
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
-from ..core.langchain_integration import LangChainIntegration
-from ..core.user_rag_pipeline import UserRAGPipeline
 from ..core.config import settings
+from ..core.reranker import request_deadline
 from ..models.user import User
 from ..api.auth import get_current_active_user
 import os
@@ -22,7 +22,8 @@ class ChatResponse(BaseModel):
     message: Message
 
 def get_langchain_integration():
-    """获取LangChain集成实例"""
+    """获取LangChain集成实例，LangChain在首次请求时才导入"""
+    from ..core.langchain_integration import LangChainIntegration
     try:
         return LangChainIntegration(settings.TONGYI_API_KEY)
     except ValueError:
@@ -32,12 +33,13 @@ def get_langchain_integration():
 @router.post("/completion", response_model=ChatResponse)
 async def chat_completion(
     request: ChatRequest, 
-    langchain: LangChainIntegration = Depends(get_langchain_integration),
+    langchain=Depends(get_langchain_integration),
     current_user: User = Depends(get_current_active_user)
 ):
     """
     AI对话接口，结合用户个人知识库
     """
+    deadline = request_deadline()
     try:
         # 获取用户最新消息
         if not request.messages:
@@ -46,7 +48,8 @@ async def chat_completion(
         # 初始化用户RAG管道
         user_rag_pipeline = None
         try:
-            user_rag_pipeline = UserRAGPipeline(current_user.id, settings.TONGYI_API_KEY)
+            from ..core.user_rag_pipeline import UserRAGPipeline
+            user_rag_pipeline = await run_in_threadpool(UserRAGPipeline, current_user.id, settings.TONGYI_API_KEY)
         except Exception as e:
             print(f"警告: 无法初始化用户RAG管道: {str(e)}")
         
@@ -57,8 +60,11 @@ async def chat_completion(
             if user_rag_pipeline:
                 try:
                     # 查询用户知识库以获取相关上下文
-                    user_context = user_rag_pipeline.query(
-                        f"请提供与以下问题相关的背景信息: {messages[-1]['content']}"
+                    # 检索、重排和生成都是阻塞操作，在线程池中执行
+                    user_context = await run_in_threadpool(
+                        user_rag_pipeline.query,
+                        f"请提供与以下问题相关的背景信息: {messages[-1]['content']}",
+                        deadline=deadline
                     )
                     # 将用户知识库上下文添加到消息中
                     enhanced_messages = messages.copy()
@@ -81,8 +87,10 @@ async def chat_completion(
             user_context = None
             if user_rag_pipeline:
                 try:
-                    user_context = user_rag_pipeline.query(
-                        f"请提供与以下问题相关的背景信息: {user_message}"
+                    user_context = await run_in_threadpool(
+                        user_rag_pipeline.query,
+                        f"请提供与以下问题相关的背景信息: {user_message}",
+                        deadline=deadline
                     )
                 except Exception as e:
                     print(f"警告: 查询用户知识库时出错: {str(e)}")
@@ -111,7 +119,7 @@ async def chat_completion(
         raise HTTPException(status_code=500, detail=f"处理聊天请求时出错: {str(e)}")
 
 @router.post("/interview_question", response_model=ChatResponse)
-async def generate_interview_question(request: ChatRequest, langchain: LangChainIntegration = Depends(get_langchain_integration)):
+async def generate_interview_question(request: ChatRequest, langchain=Depends(get_langchain_integration)):
     """
     根据简历生成面试问题
     """
@@ -0,0 +1,22 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from ..core.warmup import readiness
+
+router = APIRouter()
+
+@router.get("/live")
+async def liveness():
+    """
+    存活检查，进程能响应即返回成功
+    """
+    return {"status": "alive"}
+
+@router.get("/ready")
+async def readiness_check():
+    """
+    就绪检查，模型、Qdrant和语言模型客户端全部预热完成后才返回成功
+    """
+    checks = readiness.snapshot()
+    if not readiness.ready:
+        return JSONResponse(status_code=503, content={"status": "warming_up", "checks": checks})
+    return {"status": "ready", "checks": checks}
@@ -1,14 +1,15 @@
 from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, status
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
 import tempfile
 import os
-from ..core.rag_pipeline import RAGPipeline
-from ..core.user_rag_pipeline import UserRAGPipeline
 from ..core.config import settings
+from ..core.reranker import request_deadline
 from ..utils.resume_parser import parse_resume
 from ..models.user import User
 from ..api.auth import get_current_active_user
+from ..schemas.knowledge_base import RetrievalOptions
 
 router = APIRouter()
 
@@ -16,19 +17,22 @@ class DocumentAddRequest(BaseModel):
     documents: List[str]
     metadatas: Optional[List[Dict[str, Any]]] = None
 
-class QueryRequest(BaseModel):
+class QueryRequest(RetrievalOptions):
     question: str
 
 class QueryResponse(BaseModel):
     answer: str
     source_documents: List[Dict[str, Any]]
 
-class SearchRequest(BaseModel):
+class SearchRequest(RetrievalOptions):
     query: str
     k: int = 4
 
+# RAG管道依赖LangChain和Qdrant客户端，在首次请求时才导入，参数不标注管道类型
+
 def get_rag_pipeline():
     """获取RAG管道实例"""
+    from ..core.rag_pipeline import RAGPipeline
     try:
         return RAGPipeline(settings.TONGYI_API_KEY)
     except ValueError:
@@ -36,6 +40,7 @@ def get_rag_pipeline():
 
 def get_user_rag_pipeline(current_user: User = Depends(get_current_active_user)):
     """获取用户专属RAG管道实例"""
+    from ..core.user_rag_pipeline import UserRAGPipeline
     try:
         return UserRAGPipeline(current_user.id, settings.TONGYI_API_KEY)
     except ValueError:
@@ -44,7 +49,7 @@ def get_user_rag_pipeline(current_user: User = Depends(get_current_active_user))
 @router.post("/documents/add")
 async def add_documents(
     request: DocumentAddRequest,
-    rag_pipeline: RAGPipeline = Depends(get_rag_pipeline)
+    rag_pipeline=Depends(get_rag_pipeline)
 ):
     """
     向全局知识库中添加文档
@@ -53,7 +58,7 @@ async def add_documents(
         if not rag_pipeline:
             raise HTTPException(status_code=500, detail="RAG管道未初始化")
 
-        rag_pipeline.add_documents(request.documents, request.metadatas)
+        await run_in_threadpool(rag_pipeline.add_documents, request.documents, request.metadatas)
         return {"status": "success", "message": "文档已添加到知识库"}
     
     except Exception as e:
@@ -62,7 +67,7 @@ async def add_documents(
 @router.post("/user/documents/add")
 async def add_user_documents(
     request: DocumentAddRequest,
-    user_rag_pipeline: UserRAGPipeline = Depends(get_user_rag_pipeline)
+    user_rag_pipeline=Depends(get_user_rag_pipeline)
 ):
     """
     向当前用户的知识库中添加文档
@@ -71,7 +76,7 @@ async def add_user_documents(
         if not user_rag_pipeline:
             raise HTTPException(status_code=500, detail="用户RAG管道未初始化")
 
-        user_rag_pipeline.add_documents(request.documents, request.metadatas)
+        await run_in_threadpool(user_rag_pipeline.add_documents, request.documents, request.metadatas)
         return {"status": "success", "message": "文档已添加到您的个人知识库"}
     
     except Exception as e:
@@ -80,7 +85,7 @@ async def add_user_documents(
 @router.post("/documents/add_from_resume")
 async def add_documents_from_resume(
     file: UploadFile = File(...),
-    rag_pipeline: RAGPipeline = Depends(get_rag_pipeline)
+    rag_pipeline=Depends(get_rag_pipeline)
 ):
     """
     从简历文件中提取信息并添加到全局知识库
@@ -138,7 +143,7 @@ async def add_documents_from_resume(
             metadatas = [{"source": "resume", "filename": file.filename} for _ in documents]
             
             # 添加到知识库
-            rag_pipeline.add_documents(documents, metadatas)
+            await run_in_threadpool(rag_pipeline.add_documents, documents, metadatas)
             
             return {"status": "success", "message": "简历信息已添加到知识库", "data": parsed_data}
         
@@ -152,7 +157,7 @@ async def add_documents_from_resume(
 @router.post("/user/documents/add_from_resume")
 async def add_user_documents_from_resume(
     file: UploadFile = File(...),
-    user_rag_pipeline: UserRAGPipeline = Depends(get_user_rag_pipeline)
+    user_rag_pipeline=Depends(get_user_rag_pipeline)
 ):
     """
     从简历文件中提取信息并添加到当前用户的个人知识库
@@ -210,7 +215,7 @@ async def add_user_documents_from_resume(
             metadatas = [{"source": "resume", "filename": file.filename} for _ in documents]
             
             # 添加到用户知识库
-            user_rag_pipeline.add_documents(documents, metadatas)
+            await run_in_threadpool(user_rag_pipeline.add_documents, documents, metadatas)
             
             return {"status": "success", "message": "简历信息已添加到您的个人知识库", "data": parsed_data}
         
@@ -224,20 +229,20 @@ async def add_user_documents_from_resume(
 @router.post("/query", response_model=QueryResponse)
 async def query_knowledge(
     request: QueryRequest,
-    rag_pipeline: RAGPipeline = Depends(get_rag_pipeline)
+    rag_pipeline=Depends(get_rag_pipeline)
 ):
     """
     查询全局知识库
     """
+    deadline = request_deadline()
     try:
         if not rag_pipeline:
             raise HTTPException(status_code=500, detail="RAG管道未初始化")
 
-        # 创建检索QA链
-        answer = rag_pipeline.query(request.question)
-        
-        # 进行相似性搜索获取源文档
-        source_docs = rag_pipeline.similarity_search(request.question, k=3)
+        # 检索、重排和生成都是阻塞操作，在线程池中执行，不占用事件循环；源文档即问答链检索到的文本块
+        answer, source_docs = await run_in_threadpool(
+            rag_pipeline.query_with_sources, request.question, deadline=deadline, **request.retrieval_kwargs()
+        )
         
         return QueryResponse(
             answer=answer,
@@ -250,20 +255,20 @@ async def query_knowledge(
 @router.post("/user/query", response_model=QueryResponse)
 async def query_user_knowledge(
     request: QueryRequest,
-    user_rag_pipeline: UserRAGPipeline = Depends(get_user_rag_pipeline)
+    user_rag_pipeline=Depends(get_user_rag_pipeline)
 ):
     """
     查询当前用户的知识库
     """
+    deadline = request_deadline()
     try:
         if not user_rag_pipeline:
             raise HTTPException(status_code=500, detail="用户RAG管道未初始化")
 
-        # 创建检索QA链
-        answer = user_rag_pipeline.query(request.question)
-        
-        # 进行相似性搜索获取源文档
-        source_docs = user_rag_pipeline.similarity_search(request.question, k=3)
+        # 检索、重排和生成都是阻塞操作，在线程池中执行，不占用事件循环；源文档即问答链检索到的文本块
+        answer, source_docs = await run_in_threadpool(
+            user_rag_pipeline.query_with_sources, request.question, deadline=deadline, **request.retrieval_kwargs()
+        )
         
         return QueryResponse(
             answer=answer,
@@ -276,16 +281,19 @@ async def query_user_knowledge(
 @router.post("/search")
 async def search_similarity(
     request: SearchRequest,
-    rag_pipeline: RAGPipeline = Depends(get_rag_pipeline)
+    rag_pipeline=Depends(get_rag_pipeline)
 ):
     """
     在全局知识库中进行相似性搜索
     """
+    deadline = request_deadline()
     try:
         if not rag_pipeline:
             raise HTTPException(status_code=500, detail="RAG管道未初始化")
 
-        results = rag_pipeline.similarity_search(request.query, request.k)
+        results = await run_in_threadpool(
+            rag_pipeline.similarity_search, request.query, request.k, deadline=deadline, **request.retrieval_kwargs()
+        )
         return {"results": results}
     
     except Exception as e:
@@ -294,16 +302,23 @@ async def search_similarity(
 @router.post("/user/search")
 async def search_user_similarity(
     request: SearchRequest,
-    user_rag_pipeline: UserRAGPipeline = Depends(get_user_rag_pipeline)
+    user_rag_pipeline=Depends(get_user_rag_pipeline)
 ):
     """
     在当前用户的个人知识库中进行相似性搜索
     """
+    deadline = request_deadline()
     try:
         if not user_rag_pipeline:
             raise HTTPException(status_code=500, detail="用户RAG管道未初始化")
 
-        results = user_rag_pipeline.similarity_search(request.query, request.k)
+        results = await run_in_threadpool(
+            user_rag_pipeline.similarity_search,
+            request.query,
+            request.k,
+            deadline=deadline,
+            **request.retrieval_kwargs()
+        )
         return {"results": results}
     
     except Exception as e:
@@ -311,7 +326,7 @@ async def search_user_similarity(
 
 @router.delete("/collection")
 async def delete_collection(
-    rag_pipeline: RAGPipeline = Depends(get_rag_pipeline)
+    rag_pipeline=Depends(get_rag_pipeline)
 ):
     """
     删除整个知识库集合
@@ -320,8 +335,31 @@ async def delete_collection(
         if not rag_pipeline:
             raise HTTPException(status_code=500, detail="RAG管道未初始化")
 
-        rag_pipeline.delete_collection()
+        await run_in_threadpool(rag_pipeline.delete_collection)
         return {"status": "success", "message": "知识库集合已删除"}
     
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"删除知识库时出错: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"删除知识库时出错: {str(e)}")
+
+@router.get("/embedding/stats")
+def embedding_stats(current_user: User = Depends(get_current_active_user)):
+    """
+    获取导入模式多进程嵌入的每个工作进程吞吐量，使用共享嵌入进程时同时返回其合并编码统计
+    """
+    from ..core.parallel_embeddings import get_ingestion_stats
+    result = {"encoders": get_ingestion_stats()}
+    if settings.EMBEDDING_BACKEND == "sidecar":
+        from ..core.embedding_sidecar import get_sidecar_stats
+        try:
+            result["sidecar"] = get_sidecar_stats()
+        except OSError as e:
+            raise HTTPException(status_code=503, detail=f"无法连接嵌入进程: {str(e)}")
+    return result
+
+@router.get("/context/stats")
+async def context_stats(current_user: User = Depends(get_current_active_user)):
+    """
+    获取生成前上下文压缩节省的提示词token统计
+    """
+    from ..core.context_compression import get_compression_stats
+    return get_compression_stats()
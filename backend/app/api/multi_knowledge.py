@@ -1,139 +1,263 @@
-from fastapi import APIRouter, HTTPException, Depends, UploadFile, File
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, BackgroundTasks, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+from sqlalchemy import and_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from typing import Any, Callable, Dict, List, Optional
 import tempfile
 import os
+import shutil
+import time
 import uuid
 
-from ..database import get_db
+from ..database import SessionLocal, get_async_db
 from ..models.user import User
 from ..models.knowledge_base import KnowledgeBase
 from ..models.query_history import QueryHistory
+from ..models.knowledge_base_stats import KnowledgeBaseStats
 from ..schemas.knowledge_base import (
     KnowledgeBaseCreate, 
     KnowledgeBaseUpdate, 
     KnowledgeBase as KnowledgeBaseSchema,
     KnowledgeBaseQuery,
     KnowledgeBaseSearch,
-    KnowledgeBaseResponse
+    KnowledgeBaseFederatedSearch,
+    KnowledgeBaseResponse,
+    KnowledgeBaseReembed
 )
-from ..schemas.query_history import QueryHistory as QueryHistorySchema
-from ..core.multi_rag_pipeline import MultiRAGPipeline
+from ..schemas.query_history import QueryHistoryPage
 from ..core.config import settings
+from ..core.embeddings import EmbeddingModelUnavailable
+from ..core.federated_search import federated_search
+from ..core.history_writer import record_query_history
+from ..core.kb_cache import cache_knowledge_base, get_knowledge_base_meta, invalidate_knowledge_base
+from ..core.kb_stats import stats_to_dict
+from ..core.reranker import request_deadline
+from ..utils.pagination import decode_cursor, encode_cursor
 from ..utils.resume_parser import parse_resume
 from ..api.auth import get_current_active_user
 
 router = APIRouter()
 
+# RAG管道、Qdrant客户端和嵌入模型相关的模块依赖LangChain等重量级库，在首次使用时才导入，
+# 不拖慢工作进程的启动
+
 def get_rag_pipeline(collection_name: str):
     """获取多知识库RAG管道实例"""
+    from ..core.multi_rag_pipeline import MultiRAGPipeline
     try:
         return MultiRAGPipeline(collection_name, settings.TONGYI_API_KEY)
     except ValueError:
         return None
 
+async def build_pipeline(factory: Callable[..., Any], *args: Any) -> Any:
+    """
+    在线程池中创建RAG管道：加载嵌入模型、连接嵌入进程和Qdrant都是阻塞操作
+
+    嵌入模型暂时不可用时返回503，不退回到后备模型
+    """
+    try:
+        return await run_in_threadpool(factory, *args)
+    except EmbeddingModelUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+def run_with_session(func: Callable[[Session], Any]) -> Any:
+    """
+    使用独立的同步数据库会话执行 func(session)
+
+    请求中的异步会话不能跨线程使用，需要在线程池中执行的长耗时操作改用同步会话
+    """
+    session = SessionLocal()
+    try:
+        return func(session)
+    finally:
+        session.close()
+
+def get_knowledge_base_pipeline(knowledge_base: KnowledgeBase):
+    """获取知识库对应的RAG管道实例，使用生成其向量的嵌入模型"""
+    from ..core.multi_rag_pipeline import MultiRAGPipeline
+    try:
+        return MultiRAGPipeline(
+            knowledge_base.collection_name,
+            settings.TONGYI_API_KEY,
+            embedding_model_name=knowledge_base.embedding_model,
+            migration_collection=knowledge_base.migration_collection,
+            migration_embedding_model=knowledge_base.migration_embedding_model
+        )
+    except ValueError:
+        return None
+
 @router.post("/knowledge-bases", response_model=KnowledgeBaseSchema)
 async def create_knowledge_base(
     knowledge_base: KnowledgeBaseCreate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     为当前用户创建新的知识库
     """
+    from ..core.qdrant_collections import get_embedding_dimension
     try:
         # 生成唯一的集合名称
         collection_name = f"user_{current_user.id}_kb_{uuid.uuid4().hex[:8]}"
         
+        # 初始化RAG管道，确定生成向量的嵌入模型
+        rag_pipeline = await build_pipeline(get_rag_pipeline, collection_name)
+        if not rag_pipeline:
+            raise HTTPException(status_code=500, detail="无法初始化RAG管道")
+        
         # 创建知识库记录
         db_knowledge_base = KnowledgeBase(
             user_id=current_user.id,
             name=knowledge_base.name,
             description=knowledge_base.description,
-            collection_name=collection_name
+            collection_name=collection_name,
+            embedding_model=rag_pipeline.embedding_model_name,
+            embedding_dimension=await run_in_threadpool(
+                get_embedding_dimension, rag_pipeline.embedding_model_name, rag_pipeline.embedding_model
+            )
         )
         
         db.add(db_knowledge_base)
-        db.commit()
-        db.refresh(db_knowledge_base)
+        await db.commit()
+        await db.refresh(db_knowledge_base)
+        cache_knowledge_base(db_knowledge_base)
         
-        # 初始化向量数据库集合
-        rag_pipeline = get_rag_pipeline(collection_name)
-        if not rag_pipeline:
-            raise HTTPException(status_code=500, detail="无法初始化RAG管道")
+        # 按部署档位显式创建集合，避免由首次写入隐式创建
+        await run_in_threadpool(rag_pipeline.ensure_collection)
         
         return db_knowledge_base
     
+    except HTTPException:
+        raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"创建知识库时出错: {str(e)}")
 
 @router.get("/knowledge-bases", response_model=List[KnowledgeBaseSchema])
 async def list_knowledge_bases(
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     获取当前用户的所有知识库
     """
     try:
-        knowledge_bases = db.query(KnowledgeBase).filter(
+        knowledge_bases = (await db.execute(select(KnowledgeBase).where(
             KnowledgeBase.user_id == current_user.id
-        ).all()
+        ))).scalars().all()
         
         return knowledge_bases
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取知识库列表时出错: {str(e)}")
 
-@router.get("/knowledge-bases/history/{kb_id}", response_model=List[QueryHistorySchema])
+@router.get("/knowledge-bases/history/{kb_id}", response_model=QueryHistoryPage)
 async def get_query_history(
     kb_id: int,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    summary: bool = False,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
-    获取指定知识库的查询历史
+    分页获取指定知识库的查询历史，按时间倒序
+
+    cursor 为上一页返回的 next_cursor；summary 为真时不返回回答正文
     """
     try:
         # 验证知识库属于当前用户
-        knowledge_base = db.query(KnowledgeBase).filter(
-            KnowledgeBase.id == kb_id,
-            KnowledgeBase.user_id == current_user.id
-        ).first()
+        knowledge_base = await get_knowledge_base_meta(db, current_user.id, kb_id)
         
         if not knowledge_base:
             raise HTTPException(status_code=404, detail="知识库未找到")
         
-        # 获取查询历史
-        history = db.query(QueryHistory).filter(
-            QueryHistory.knowledge_base_id == kb_id
-        ).order_by(QueryHistory.created_at.desc()).all()
+        # 只查询需要的列，摘要模式不读取回答正文
+        columns = [
+            QueryHistory.id,
+            QueryHistory.knowledge_base_id,
+            QueryHistory.question,
+            QueryHistory.similarity_score,
+            QueryHistory.created_at,
+        ]
+        if not summary:
+            columns.append(QueryHistory.answer)
+        query = select(*columns).where(QueryHistory.knowledge_base_id == kb_id)
+
+        if cursor:
+            try:
+                created_at, last_id = decode_cursor(cursor)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            # 展开为OR条件而不是行比较，MySQL可以对复合索引做范围扫描
+            query = query.where(or_(
+                QueryHistory.created_at < created_at,
+                and_(QueryHistory.created_at == created_at, QueryHistory.id < last_id)
+            ))
+
+        # 多取一行判断是否还有下一页
+        rows = (await db.execute(query.order_by(
+            QueryHistory.created_at.desc(), QueryHistory.id.desc()
+        ).limit(limit + 1))).all()
+        
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
         
-        return history
+        return {"items": [dict(row._mapping) for row in rows], "next_cursor": next_cursor}
     
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取查询历史时出错: {str(e)}")
 
+@router.get("/knowledge-bases/{kb_id}/stats")
+async def get_knowledge_base_stats(
+    kb_id: int,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    获取知识库的使用统计：查询次数、平均/最低相似度、延迟分位数和最后使用时间
+    """
+    try:
+        knowledge_base = await get_knowledge_base_meta(db, current_user.id, kb_id)
+        
+        if not knowledge_base:
+            raise HTTPException(status_code=404, detail="知识库未找到")
+        
+        # 统计在写入查询历史时增量维护，这里只按主键读取一行
+        stats = (await db.execute(select(KnowledgeBaseStats).where(
+            KnowledgeBaseStats.knowledge_base_id == kb_id
+        ))).scalars().first()
+        
+        return {"knowledge_base_id": kb_id, **stats_to_dict(stats)}
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取知识库统计时出错: {str(e)}")
+
 @router.put("/knowledge-bases/{kb_id}", response_model=KnowledgeBaseSchema)
 async def update_knowledge_base(
     kb_id: int,
     knowledge_base_update: KnowledgeBaseUpdate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     更新知识库信息
     """
     try:
         # 查找知识库
-        db_knowledge_base = db.query(KnowledgeBase).filter(
+        db_knowledge_base = (await db.execute(select(KnowledgeBase).where(
             KnowledgeBase.id == kb_id,
             KnowledgeBase.user_id == current_user.id
-        ).first()
+        ))).scalars().first()
         
         if not db_knowledge_base:
             raise HTTPException(status_code=404, detail="知识库未找到")
@@ -143,54 +267,74 @@ async def update_knowledge_base(
             db_knowledge_base.name = knowledge_base_update.name
         if knowledge_base_update.description is not None:
             db_knowledge_base.description = knowledge_base_update.description
+        tier_changed = (
+            knowledge_base_update.is_active is not None
+            and knowledge_base_update.is_active != db_knowledge_base.is_active
+        )
         if knowledge_base_update.is_active is not None:
             db_knowledge_base.is_active = knowledge_base_update.is_active
             
-        db.commit()
-        db.refresh(db_knowledge_base)
+        await db.commit()
+        
+        # 停用的知识库转为冷集合，向量落盘以释放Qdrant内存；本地向量索引没有冷热之分
+        if tier_changed and settings.VECTOR_STORE_BACKEND != "local":
+            from ..core.qdrant_collections import set_collection_tier
+            from ..core.qdrant_connection import get_qdrant_client
+            try:
+                set_collection_tier(
+                    get_qdrant_client(),
+                    db_knowledge_base.collection_name,
+                    cold=not db_knowledge_base.is_active
+                )
+            except Exception as e:
+                print(f"警告: 切换集合存储方式失败: {str(e)}")
+
+        await db.refresh(db_knowledge_base)
+        cache_knowledge_base(db_knowledge_base)
         
         return db_knowledge_base
     
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"更新知识库时出错: {str(e)}")
 
 @router.delete("/knowledge-bases/{kb_id}")
 async def delete_knowledge_base(
     kb_id: int,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     删除知识库
     """
     try:
         # 查找知识库
-        db_knowledge_base = db.query(KnowledgeBase).filter(
+        db_knowledge_base = (await db.execute(select(KnowledgeBase).where(
             KnowledgeBase.id == kb_id,
             KnowledgeBase.user_id == current_user.id
-        ).first()
+        ))).scalars().first()
         
         if not db_knowledge_base:
             raise HTTPException(status_code=404, detail="知识库未找到")
         
         # 删除向量数据库中的集合
-        rag_pipeline = get_rag_pipeline(db_knowledge_base.collection_name)
+        rag_pipeline = await build_pipeline(get_knowledge_base_pipeline, db_knowledge_base)
         if rag_pipeline:
-            rag_pipeline.delete_collection()
+            await run_in_threadpool(rag_pipeline.delete_collection)
         
         # 删除数据库记录
-        db.delete(db_knowledge_base)
-        db.commit()
+        await db.delete(db_knowledge_base)
+        await db.commit()
+        invalidate_knowledge_base(current_user.id, kb_id)
         
         return {"status": "success", "message": "知识库已删除"}
     
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"删除知识库时出错: {str(e)}")
 
 @router.post("/knowledge-bases/{kb_id}/documents/add")
@@ -199,17 +343,17 @@ async def add_documents_to_knowledge_base(
     documents: List[str],
     metadatas: Optional[List[Dict[str, Any]]] = None,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     向指定知识库中添加文档
     """
     try:
         # 查找知识库
-        db_knowledge_base = db.query(KnowledgeBase).filter(
+        db_knowledge_base = (await db.execute(select(KnowledgeBase).where(
             KnowledgeBase.id == kb_id,
             KnowledgeBase.user_id == current_user.id
-        ).first()
+        ))).scalars().first()
         
         if not db_knowledge_base:
             raise HTTPException(status_code=404, detail="知识库未找到")
@@ -217,13 +361,16 @@ async def add_documents_to_knowledge_base(
         if not db_knowledge_base.is_active:
             raise HTTPException(status_code=400, detail="知识库未激活")
         
+        # 写入文档总是使用数据库中的最新记录，重新嵌入期间需要双写到影子集合
+        cache_knowledge_base(db_knowledge_base)
+        
         # 获取RAG管道
-        rag_pipeline = get_rag_pipeline(db_knowledge_base.collection_name)
+        rag_pipeline = await build_pipeline(get_knowledge_base_pipeline, db_knowledge_base)
         if not rag_pipeline:
             raise HTTPException(status_code=500, detail="RAG管道未初始化")
         
-        # 添加文档
-        rag_pipeline.add_documents(documents, metadatas)
+        # 添加文档，切分、编码和写入向量库都是阻塞操作，在线程池中执行
+        await run_in_threadpool(rag_pipeline.add_documents, documents, metadatas)
         
         return {"status": "success", "message": "文档已添加到知识库"}
     
@@ -237,17 +384,17 @@ async def add_resume_to_knowledge_base(
     kb_id: int,
     file: UploadFile = File(...),
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     从简历文件中提取信息并添加到指定知识库
     """
     try:
         # 查找知识库
-        db_knowledge_base = db.query(KnowledgeBase).filter(
+        db_knowledge_base = (await db.execute(select(KnowledgeBase).where(
             KnowledgeBase.id == kb_id,
             KnowledgeBase.user_id == current_user.id
-        ).first()
+        ))).scalars().first()
         
         if not db_knowledge_base:
             raise HTTPException(status_code=404, detail="知识库未找到")
@@ -303,12 +450,13 @@ async def add_resume_to_knowledge_base(
             # 添加元数据
             metadatas = [{"source": "resume", "filename": file.filename} for _ in documents]
             
-            # 获取RAG管道并添加到知识库
-            rag_pipeline = get_rag_pipeline(db_knowledge_base.collection_name)
+            # 获取RAG管道并添加到知识库，使用数据库中的最新记录
+            cache_knowledge_base(db_knowledge_base)
+            rag_pipeline = await build_pipeline(get_knowledge_base_pipeline, db_knowledge_base)
             if not rag_pipeline:
                 raise HTTPException(status_code=500, detail="RAG管道未初始化")
             
-            rag_pipeline.add_documents(documents, metadatas)
+            await run_in_threadpool(rag_pipeline.add_documents, documents, metadatas)
             
             return {"status": "success", "message": "简历信息已添加到知识库", "data": parsed_data}
         
@@ -326,17 +474,15 @@ async def query_knowledge_base(
     kb_id: int,
     request: KnowledgeBaseQuery,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     查询指定知识库
     """
+    deadline = request_deadline()
     try:
         # 查找知识库
-        db_knowledge_base = db.query(KnowledgeBase).filter(
-            KnowledgeBase.id == kb_id,
-            KnowledgeBase.user_id == current_user.id
-        ).first()
+        db_knowledge_base = await get_knowledge_base_meta(db, current_user.id, kb_id)
         
         if not db_knowledge_base:
             raise HTTPException(status_code=404, detail="知识库未找到")
@@ -345,28 +491,22 @@ async def query_knowledge_base(
             raise HTTPException(status_code=400, detail="知识库未激活")
         
         # 获取RAG管道
-        rag_pipeline = get_rag_pipeline(db_knowledge_base.collection_name)
+        rag_pipeline = await build_pipeline(get_knowledge_base_pipeline, db_knowledge_base)
         if not rag_pipeline:
             raise HTTPException(status_code=500, detail="RAG管道未初始化")
 
-        # 查询知识库
-        answer = rag_pipeline.query(request.question)
-        
-        # 进行相似性搜索获取源文档
-        source_docs = rag_pipeline.similarity_search(request.question, k=3)
-        
-        # 保存查询历史
-        similarity_score = min(source_docs, key=lambda x: x.score).score if source_docs else None
-        
-        query_history = QueryHistory(
-            knowledge_base_id=kb_id,
-            question=request.question,
-            answer=answer,
-            similarity_score=similarity_score
+        # 查询知识库，检索、重排和生成都是阻塞操作，在线程池中执行；源文档即问答链检索到的文本块
+        started = time.perf_counter()
+        answer, source_docs = await run_in_threadpool(
+            rag_pipeline.query_with_sources, request.question, deadline=deadline, **request.retrieval_kwargs()
         )
         
-        db.add(query_history)
-        db.commit()
+        # 保存查询历史，由后台任务批量写入，不在请求中提交
+        # 只由词法检索命中的结果没有向量相似度
+        scores = [doc["score"] for doc in source_docs if doc.get("score") is not None]
+        similarity_score = min(scores) if scores else None
+        latency_ms = (time.perf_counter() - started) * 1000
+        await record_query_history(kb_id, request.question, answer, similarity_score, latency_ms)
         
         return KnowledgeBaseResponse(
             answer=answer,
@@ -383,17 +523,15 @@ async def search_knowledge_base(
     kb_id: int,
     request: KnowledgeBaseSearch,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     在指定知识库中进行相似性搜索
     """
+    deadline = request_deadline()
     try:
         # 查找知识库
-        db_knowledge_base = db.query(KnowledgeBase).filter(
-            KnowledgeBase.id == kb_id,
-            KnowledgeBase.user_id == current_user.id
-        ).first()
+        db_knowledge_base = await get_knowledge_base_meta(db, current_user.id, kb_id)
         
         if not db_knowledge_base:
             raise HTTPException(status_code=404, detail="知识库未找到")
@@ -402,14 +540,183 @@ async def search_knowledge_base(
             raise HTTPException(status_code=400, detail="知识库未激活")
         
         # 获取RAG管道
-        rag_pipeline = get_rag_pipeline(db_knowledge_base.collection_name)
+        rag_pipeline = await build_pipeline(get_knowledge_base_pipeline, db_knowledge_base)
         if not rag_pipeline:
             raise HTTPException(status_code=500, detail="RAG管道未初始化")
 
-        results = rag_pipeline.similarity_search(request.query, request.k)
+        results = await run_in_threadpool(
+            rag_pipeline.similarity_search, request.query, request.k, deadline=deadline, **request.retrieval_kwargs()
+        )
         return {"results": results}
     
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"相似性搜索时出错: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"相似性搜索时出错: {str(e)}")
+
+@router.post("/knowledge-bases/search")
+async def search_all_knowledge_bases(
+    request: KnowledgeBaseFederatedSearch,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    在当前用户的多个知识库中并发进行相似性搜索并合并结果
+    """
+    deadline = request_deadline()
+    try:
+        query = select(KnowledgeBase).where(
+            KnowledgeBase.user_id == current_user.id,
+            KnowledgeBase.is_active == True
+        )
+        if request.knowledge_base_ids:
+            query = query.where(KnowledgeBase.id.in_(request.knowledge_base_ids))
+        knowledge_bases = (await db.execute(query)).scalars().all()
+        
+        if request.knowledge_base_ids and len(knowledge_bases) != len(set(request.knowledge_base_ids)):
+            raise HTTPException(status_code=404, detail="部分知识库未找到或未激活")
+        
+        return await federated_search(
+            knowledge_bases,
+            get_knowledge_base_pipeline,
+            request.query,
+            request.k,
+            search_kwargs={**request.retrieval_kwargs(), "deadline": deadline}
+        )
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"跨知识库搜索时出错: {str(e)}")
+
+@router.post("/knowledge-bases/{kb_id}/reembed", response_model=KnowledgeBaseSchema)
+async def reembed_knowledge_base(
+    kb_id: int,
+    request: KnowledgeBaseReembed,
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    使用新的嵌入模型重新嵌入知识库，迁移在后台进行，期间知识库可以正常读写
+    """
+    from ..core.embeddings import EMBEDDING_MODELS
+    from ..core.reembedding import run_reembedding, start_reembedding
+    try:
+        # 查找知识库
+        db_knowledge_base = (await db.execute(select(KnowledgeBase).where(
+            KnowledgeBase.id == kb_id,
+            KnowledgeBase.user_id == current_user.id
+        ))).scalars().first()
+        
+        if not db_knowledge_base:
+            raise HTTPException(status_code=404, detail="知识库未找到")
+        
+        if request.embedding_model not in EMBEDDING_MODELS:
+            raise HTTPException(status_code=400, detail=f"未注册的嵌入模型: {request.embedding_model}")
+        
+        try:
+            # 创建影子集合要请求Qdrant，在线程池中使用同步会话执行
+            db_knowledge_base = await run_in_threadpool(
+                run_with_session,
+                lambda session: start_reembedding(
+                    session, session.get(KnowledgeBase, kb_id), request.embedding_model
+                )
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        
+        # 后续的检索和写入需要看到影子集合
+        cache_knowledge_base(db_knowledge_base)
+        background_tasks.add_task(run_reembedding, kb_id)
+        
+        return db_knowledge_base
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"重新嵌入知识库时出错: {str(e)}")
+
+@router.get("/knowledge-bases/{kb_id}/export")
+async def export_knowledge_base_file(
+    kb_id: int,
+    background_tasks: BackgroundTasks,
+    vector_dtype: str = "float16",
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    导出知识库的记录、向量和文本，导入到其它环境时不需要重新嵌入
+    """
+    from ..core.kb_transfer import VECTOR_DTYPES, export_knowledge_base
+    try:
+        # 查找知识库
+        db_knowledge_base = (await db.execute(select(KnowledgeBase).where(
+            KnowledgeBase.id == kb_id,
+            KnowledgeBase.user_id == current_user.id
+        ))).scalars().first()
+        
+        if not db_knowledge_base:
+            raise HTTPException(status_code=404, detail="知识库未找到")
+        
+        if vector_dtype not in VECTOR_DTYPES:
+            raise HTTPException(status_code=400, detail=f"不支持的向量类型: {vector_dtype}")
+        
+        with tempfile.NamedTemporaryFile(suffix=".tar", delete=False) as tmp_file:
+            tmp_file_path = tmp_file.name
+        
+        try:
+            # 大知识库导出耗时较长，放到线程池中执行
+            await run_in_threadpool(export_knowledge_base, db_knowledge_base, tmp_file_path, vector_dtype)
+        except ValueError as e:
+            os.unlink(tmp_file_path)
+            raise HTTPException(status_code=409, detail=str(e))
+        except Exception:
+            os.unlink(tmp_file_path)
+            raise
+        
+        # 响应发送完成后删除临时文件
+        background_tasks.add_task(os.unlink, tmp_file_path)
+        return FileResponse(
+            tmp_file_path,
+            media_type="application/x-tar",
+            filename=f"knowledge_base_{kb_id}.tar"
+        )
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"导出知识库时出错: {str(e)}")
+
+@router.post("/knowledge-bases/import", response_model=KnowledgeBaseSchema)
+async def import_knowledge_base_file(
+    file: UploadFile = File(...),
+    name: Optional[str] = None,
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    从导出文件创建新的知识库，向量直接写入，不重新嵌入
+    """
+    from ..core.kb_transfer import import_knowledge_base
+    try:
+        # 分块写入临时文件，不把整个上传文件读入内存
+        with tempfile.NamedTemporaryFile(suffix=".tar", delete=False) as tmp_file:
+            await run_in_threadpool(shutil.copyfileobj, file.file, tmp_file)
+            tmp_file_path = tmp_file.name
+        
+        try:
+            db_knowledge_base = await run_in_threadpool(
+                run_with_session,
+                lambda session: import_knowledge_base(session, current_user.id, tmp_file_path, name)
+            )
+            cache_knowledge_base(db_knowledge_base)
+            return db_knowledge_base
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        finally:
+            os.unlink(tmp_file_path)
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"导入知识库时出错: {str(e)}")
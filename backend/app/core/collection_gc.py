@@ -0,0 +1,201 @@
+"""
+Qdrant孤立集合回收
+
+删除知识库、删除用户或删除失败时，Qdrant中可能残留不再被任何记录引用的集合。
+回收任务对比数据库中的 KnowledgeBase.collection_name（以及现有用户的
+user_{id}_knowledge 集合）与Qdrant的集合列表，删除孤立集合并统计回收的点数。
+
+集合的创建不是原子的：ensure_collection 先创建物理集合再创建指向它的别名，两步之间物理集合
+看起来没有被任何记录引用。因此回收分两阶段：第一次判定为孤立时只记录时间，连续判定为孤立
+超过 COLLECTION_GC_GRACE_SECONDS 后才删除，期间被引用的集合从记录中移除。
+
+判定时间记录在进程内，后台回收只在持有 COLLECTION_GC_LOCK_FILE 锁的一个worker中执行，
+其它worker每个回收间隔尝试获取一次锁，持有锁的进程退出后由其中一个接替。
+"""
+import argparse
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional, Set
+
+from qdrant_client import QdrantClient
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .qdrant_collections import forget_collection
+from .qdrant_connection import get_qdrant_client
+from ..database import SessionLocal
+from ..models.user import User
+from ..models.knowledge_base import KnowledgeBase
+from ..utils.file_lock import try_leader_lock
+
+logger = logging.getLogger(__name__)
+
+# 只回收本应用按命名规则创建的集合，其它集合（如全局知识库）永远不会被删除
+MANAGED_COLLECTION_PREFIX = "user_"
+PROTECTED_COLLECTIONS = {"global_knowledge"}
+
+# 首次被判定为孤立的时间（time.monotonic()）：集合名称 -> 时间
+_orphan_first_seen: Dict[str, float] = {}
+
+
+def expected_collections(db: Session, aliases: Optional[Dict[str, str]] = None) -> Set[str]:
+    """
+    获取数据库中仍被引用的集合名称
+
+    Args:
+        db: 数据库会话
+        aliases: 别名到物理集合的映射，被引用别名指向的物理集合同样视为被引用
+
+    Returns:
+        集合名称集合
+    """
+    names = set()
+    for name, migration_collection in db.query(
+        KnowledgeBase.collection_name, KnowledgeBase.migration_collection
+    ):
+        names.add(name)
+        # 重新嵌入迁移中的影子集合
+        if migration_collection:
+            names.add(migration_collection)
+    names.update(f"user_{user_id}_knowledge" for (user_id,) in db.query(User.id))
+
+    aliases = aliases or {}
+    names.update(aliases[name] for name in list(names) if name in aliases)
+    return names
+
+
+def find_orphan_collections(existing: List[str], expected: Set[str]) -> List[str]:
+    """
+    从Qdrant现有集合中筛选出孤立集合
+
+    Args:
+        existing: Qdrant中的集合名称列表
+        expected: 数据库中仍被引用的集合名称
+
+    Returns:
+        孤立集合名称列表
+    """
+    return sorted(
+        name for name in existing
+        if name.startswith(MANAGED_COLLECTION_PREFIX)
+        and name not in PROTECTED_COLLECTIONS
+        and name not in expected
+    )
+
+
+def collect_orphan_collections(
+    db: Session,
+    client: Optional[QdrantClient] = None,
+    dry_run: bool = False,
+    grace_seconds: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    回收Qdrant中的孤立集合，只删除连续判定为孤立超过 grace_seconds 的集合
+
+    Args:
+        db: 数据库会话
+        client: Qdrant客户端，为空时按配置创建
+        dry_run: 为True时只统计，不删除
+        grace_seconds: 宽限时间（秒），为空时使用 COLLECTION_GC_GRACE_SECONDS
+
+    Returns:
+        回收报告，包含孤立集合、仍在宽限期内的集合、已删除集合和回收（dry_run 时为可回收）的点数
+    """
+    client = client or get_qdrant_client()
+    grace_seconds = settings.COLLECTION_GC_GRACE_SECONDS if grace_seconds is None else grace_seconds
+
+    # 先列出Qdrant集合再查询数据库：先提交数据库记录再创建的集合（如重新嵌入的影子集合）
+    # 在随后的数据库查询中一定可见；先建物理集合再建别名的窗口由宽限期覆盖
+    existing = [collection.name for collection in client.get_collections().collections]
+    aliases = {alias.alias_name: alias.collection_name for alias in client.get_aliases().aliases}
+    orphans = find_orphan_collections(existing, expected_collections(db, aliases))
+
+    now = time.monotonic()
+    for name in list(_orphan_first_seen):
+        if name not in orphans:
+            # 已被引用或已删除
+            del _orphan_first_seen[name]
+    due = [name for name in orphans if now - _orphan_first_seen.setdefault(name, now) >= grace_seconds]
+
+    deleted = []
+    reclaimed_points = 0
+    for name in orphans if dry_run else due:
+        try:
+            points = client.get_collection(collection_name=name).points_count or 0
+            if not dry_run:
+                client.delete_collection(collection_name=name)
+                forget_collection(name)
+                _orphan_first_seen.pop(name, None)
+                deleted.append(name)
+            reclaimed_points += points
+        except Exception as e:
+            logger.warning("回收Qdrant集合 %s 失败: %s", name, e)
+
+    return {
+        "orphans": orphans,
+        "pending": [name for name in orphans if name not in due],
+        "deleted": deleted,
+        "reclaimed_points": reclaimed_points,
+        "dry_run": dry_run
+    }
+
+
+def run_collection_gc(dry_run: bool = False, grace_seconds: Optional[float] = None) -> Dict[str, Any]:
+    """使用独立的数据库会话执行一次回收"""
+    db = SessionLocal()
+    try:
+        return collect_orphan_collections(db, dry_run=dry_run, grace_seconds=grace_seconds)
+    finally:
+        db.close()
+
+
+async def collection_gc_loop(interval_seconds: int) -> None:
+    """
+    后台周期性回收孤立集合，在应用lifespan中启动，只在持有回收锁的worker中执行
+
+    Args:
+        interval_seconds: 回收间隔（秒）
+    """
+    lock = None
+    try:
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                if lock is None:
+                    lock = try_leader_lock(settings.COLLECTION_GC_LOCK_FILE)
+                    if lock is None:
+                        # 其它worker正在执行回收
+                        continue
+                report = await asyncio.to_thread(run_collection_gc)
+                if report["deleted"]:
+                    logger.info(
+                        "已回收 %d 个孤立集合，释放 %d 个向量点: %s",
+                        len(report["deleted"]),
+                        report["reclaimed_points"],
+                        ", ".join(report["deleted"])
+                    )
+            except Exception as e:
+                logger.warning("孤立集合回收失败: %s", e)
+    finally:
+        if lock is not None:
+            lock.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="回收Qdrant中的孤立集合")
+    parser.add_argument("--dry-run", action="store_true", help="只统计孤立集合，不删除")
+    parser.add_argument(
+        "--grace-seconds", type=float, default=settings.COLLECTION_GC_GRACE_SECONDS,
+        help="第一次扫描后等待的秒数，再次扫描时仍为孤立的集合才删除"
+    )
+    args = parser.parse_args()
+
+    report = run_collection_gc(dry_run=args.dry_run, grace_seconds=args.grace_seconds)
+    if not args.dry_run and report["pending"]:
+        print(f"发现 {len(report['pending'])} 个孤立集合，{args.grace_seconds:.0f} 秒后再次确认")
+        time.sleep(args.grace_seconds)
+        report = run_collection_gc(grace_seconds=args.grace_seconds)
+    print(f"孤立集合: {report['orphans']}")
+    print(f"已删除: {report['deleted']}")
+    print(f"回收点数: {report['reclaimed_points']}")
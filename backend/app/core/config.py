@@ -14,6 +14,149 @@ class Settings:
     
     # 数据库设置（如果需要）
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./test.db")
+    # 启动时准备数据库结构：check 确认数据库已迁移到Alembic最新版本（未迁移时拒绝启动），
+    # create 按模型建表（用于无法运行迁移的SQLite开发环境），off 不处理；为空时SQLite使用create，其它使用check
+    DB_SCHEMA_MODE: str = os.getenv("DB_SCHEMA_MODE", "")
+    # 数据库连接池：常驻连接数、高峰时额外连接数、等待连接的超时（秒）、连接回收时间（秒）、取出连接前是否探活
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_TIMEOUT: int = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "True").lower() == "true"
+    # 异步数据库驱动：MySQL使用 asyncmy 或 aiomysql，SQLite使用 aiosqlite
+    # ASYNC_DATABASE_URL 为空时由 DATABASE_URL 替换驱动得到
+    ASYNC_MYSQL_DRIVER: str = os.getenv("ASYNC_MYSQL_DRIVER", "asyncmy")
+    ASYNC_DATABASE_URL: str = os.getenv("ASYNC_DATABASE_URL", "")
+    
+    # 默认嵌入模型，必须是 app/core/embeddings.py 中注册的模型
+    EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+    
+    # 嵌入推理后端：留空使用注册表中的后端，onnx 使用导出的ONNX模型在CPU上推理，
+    # sidecar 交给本机共享的嵌入进程推理（见 app/core/embedding_sidecar.py）
+    EMBEDDING_BACKEND: str = os.getenv("EMBEDDING_BACKEND", "")
+    ONNX_MODEL_DIR: str = os.getenv("ONNX_MODEL_DIR", "./onnx_models")
+    ONNX_QUANTIZED: bool = os.getenv("ONNX_QUANTIZED", "True").lower() == "true"
+    ONNX_THREADS: int = int(os.getenv("ONNX_THREADS", "0"))
+
+    # 共享嵌入进程：Unix套接字路径、进程内的推理后端（留空或 onnx）、每批最多编码的文本数、
+    # 等待其它请求加入同一批的最长时间（毫秒）、单次请求超时（秒）、工作进程等待嵌入进程就绪的时间（秒）
+    EMBEDDING_SIDECAR_SOCKET: str = os.getenv("EMBEDDING_SIDECAR_SOCKET", "./embedding_sidecar.sock")
+    EMBEDDING_SIDECAR_BACKEND: str = os.getenv("EMBEDDING_SIDECAR_BACKEND", "")
+    EMBEDDING_SIDECAR_MAX_BATCH: int = int(os.getenv("EMBEDDING_SIDECAR_MAX_BATCH", "64"))
+    EMBEDDING_SIDECAR_BATCH_WAIT_MS: float = float(os.getenv("EMBEDDING_SIDECAR_BATCH_WAIT_MS", "5"))
+    EMBEDDING_SIDECAR_TIMEOUT: float = float(os.getenv("EMBEDDING_SIDECAR_TIMEOUT", "120"))
+    EMBEDDING_SIDECAR_CONNECT_TIMEOUT: float = float(os.getenv("EMBEDDING_SIDECAR_CONNECT_TIMEOUT", "30"))
+    # 嵌入模型加载失败（包括连接不上嵌入进程）后，多少秒内直接报错而不再重试加载
+    EMBEDDING_LOAD_RETRY_SECONDS: float = float(os.getenv("EMBEDDING_LOAD_RETRY_SECONDS", "30"))
+    
+    # 导入模式多进程嵌入：工作进程数（0或1表示不启用）、启用进程池的最小批量、分片大小
+    EMBEDDING_WORKERS: int = int(os.getenv("EMBEDDING_WORKERS", "0"))
+    EMBEDDING_PARALLEL_MIN_BATCH: int = int(os.getenv("EMBEDDING_PARALLEL_MIN_BATCH", "256"))
+    EMBEDDING_SHARD_SIZE: int = int(os.getenv("EMBEDDING_SHARD_SIZE", "64"))
+    EMBEDDING_THREADS_PER_WORKER: int = int(os.getenv("EMBEDDING_THREADS_PER_WORKER", "1"))
+    # 写入向量数据库时每批编码的文本数
+    EMBEDDING_INGEST_BATCH_SIZE: int = int(os.getenv("EMBEDDING_INGEST_BATCH_SIZE", "1024"))
+    
+    # 文本分割器：token 按句子和模型token数切分，character 为原来的按字符切分
+    TEXT_SPLITTER: str = os.getenv("TEXT_SPLITTER", "token")
+    # 每块最大token数，0表示使用嵌入模型的输入窗口
+    CHUNK_SIZE_TOKENS: int = int(os.getenv("CHUNK_SIZE_TOKENS", "0"))
+    CHUNK_OVERLAP_TOKENS: int = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+    
+    # Qdrant设置
+    QDRANT_HOST: str = os.getenv("QDRANT_HOST", "localhost")
+    QDRANT_PORT: int = int(os.getenv("QDRANT_PORT", "6333"))
+    QDRANT_GRPC_PORT: int = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
+    # 优先使用gRPC传输
+    QDRANT_PREFER_GRPC: bool = os.getenv("QDRANT_PREFER_GRPC", "False").lower() == "true"
+    # 超时（秒）：客户端默认超时、检索超时、集合管理操作超时
+    QDRANT_TIMEOUT: int = int(os.getenv("QDRANT_TIMEOUT", "10"))
+    QDRANT_SEARCH_TIMEOUT: int = int(os.getenv("QDRANT_SEARCH_TIMEOUT", "5"))
+    QDRANT_ADMIN_TIMEOUT: int = int(os.getenv("QDRANT_ADMIN_TIMEOUT", "60"))
+    # 瞬时错误的重试次数和首次重试的退避时间（秒）
+    QDRANT_RETRIES: int = int(os.getenv("QDRANT_RETRIES", "3"))
+    QDRANT_RETRY_BACKOFF: float = float(os.getenv("QDRANT_RETRY_BACKOFF", "0.2"))
+    # REST连接池大小和keep-alive时间（秒）
+    QDRANT_POOL_SIZE: int = int(os.getenv("QDRANT_POOL_SIZE", "20"))
+    QDRANT_KEEPALIVE_SECONDS: int = int(os.getenv("QDRANT_KEEPALIVE_SECONDS", "30"))
+
+    # 集合配置档位（default / balanced / memory），以下参数为空时使用档位中的值
+    QDRANT_COLLECTION_PROFILE: str = os.getenv("QDRANT_COLLECTION_PROFILE", "balanced")
+    QDRANT_HNSW_M: str = os.getenv("QDRANT_HNSW_M", "")
+    QDRANT_HNSW_EF_CONSTRUCT: str = os.getenv("QDRANT_HNSW_EF_CONSTRUCT", "")
+    QDRANT_SEARCH_HNSW_EF: str = os.getenv("QDRANT_SEARCH_HNSW_EF", "")
+    QDRANT_SCALAR_QUANTIZATION: str = os.getenv("QDRANT_SCALAR_QUANTIZATION", "")
+    QDRANT_ON_DISK: str = os.getenv("QDRANT_ON_DISK", "")
+
+    # 向量库后端：qdrant 使用Qdrant服务，local 使用进程内向量索引（单机部署）
+    VECTOR_STORE_BACKEND: str = os.getenv("VECTOR_STORE_BACKEND", "qdrant")
+    # Qdrant不可用时是否退回本地向量索引
+    LOCAL_VECTOR_FALLBACK: bool = os.getenv("LOCAL_VECTOR_FALLBACK", "False").lower() == "true"
+    LOCAL_VECTOR_DIR: str = os.getenv("LOCAL_VECTOR_DIR", "./vector_data")
+    # 点数达到该值后构建IVF索引，检索时扫描的聚类数
+    LOCAL_IVF_MIN_POINTS: int = int(os.getenv("LOCAL_IVF_MIN_POINTS", "20000"))
+    LOCAL_IVF_NPROBE: int = int(os.getenv("LOCAL_IVF_NPROBE", "8"))
+
+    # 混合检索：向量检索之外并行执行BM25词法检索，以倒数排名融合合并结果；
+    # 默认关闭，开启后写入时同时维护磁盘上的词法索引，已有集合首次检索时在后台重建
+    HYBRID_SEARCH: bool = os.getenv("HYBRID_SEARCH", "False").lower() == "true"
+    LEXICAL_INDEX_DIR: str = os.getenv("LEXICAL_INDEX_DIR", "./lexical_index")
+    # 进程内最多保持打开的词法索引数
+    LEXICAL_INDEX_CACHE_SIZE: int = int(os.getenv("LEXICAL_INDEX_CACHE_SIZE", "256"))
+    # 向量检索完成后最多再等待词法检索的时间（毫秒）
+    HYBRID_LEXICAL_BUDGET_MS: float = float(os.getenv("HYBRID_LEXICAL_BUDGET_MS", "15"))
+
+    # 交叉编码器重排：多取 k * RERANK_OVERFETCH 个候选（不超过 RERANK_MAX_CANDIDATES）重排后取前k个，
+    # 从收到请求开始计算，管道创建、检索加重排超出 RERANK_BUDGET_MS 的预算时跳过重排
+    RERANK_ENABLED: bool = os.getenv("RERANK_ENABLED", "False").lower() == "true"
+    RERANK_MODEL: str = os.getenv("RERANK_MODEL", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")
+    RERANK_OVERFETCH: int = int(os.getenv("RERANK_OVERFETCH", "4"))
+    RERANK_MAX_CANDIDATES: int = int(os.getenv("RERANK_MAX_CANDIDATES", "20"))
+    RERANK_BATCH_SIZE: int = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+    RERANK_MAX_LENGTH: int = int(os.getenv("RERANK_MAX_LENGTH", "256"))
+    RERANK_BUDGET_MS: float = float(os.getenv("RERANK_BUDGET_MS", "300"))
+    RERANK_CACHE_SIZE: int = int(os.getenv("RERANK_CACHE_SIZE", "10000"))
+    # 重排出错后跳过重排的时间（秒），之后再尝试加载模型和打分
+    RERANK_RETRY_SECONDS: float = float(os.getenv("RERANK_RETRY_SECONDS", "60"))
+
+    # MMR检索时从 k * MMR_FETCH_FACTOR 个候选中选出k个
+    MMR_FETCH_FACTOR: int = int(os.getenv("MMR_FETCH_FACTOR", "4"))
+
+    # 生成前只把与问题相关的句子交给语言模型，CONTEXT_TOKEN_BUDGET 为0时按模型使用默认预算；
+    # 尚未评估对回答质量的影响，默认关闭
+    CONTEXT_COMPRESSION: bool = os.getenv("CONTEXT_COMPRESSION", "False").lower() == "true"
+    CONTEXT_TOKEN_BUDGET: int = int(os.getenv("CONTEXT_TOKEN_BUDGET", "0"))
+    # 向量相似度不低于该值的文本块整块保留，不按句子筛选
+    CONTEXT_KEEP_SCORE: float = float(os.getenv("CONTEXT_KEEP_SCORE", "0.6"))
+
+    # 跨知识库检索时每个知识库的超时（毫秒）
+    FEDERATED_SEARCH_TIMEOUT_MS: float = float(os.getenv("FEDERATED_SEARCH_TIMEOUT_MS", "2000"))
+
+    # 查询历史异步批量写入：队列容量、每批条数和最长等待时间（毫秒）
+    HISTORY_QUEUE_SIZE: int = int(os.getenv("HISTORY_QUEUE_SIZE", "10000"))
+    HISTORY_BATCH_SIZE: int = int(os.getenv("HISTORY_BATCH_SIZE", "200"))
+    HISTORY_FLUSH_INTERVAL_MS: float = float(os.getenv("HISTORY_FLUSH_INTERVAL_MS", "500"))
+
+    # 密码哈希：bcrypt代价因子（修改后已有用户在下次登录时重新哈希）、专用线程数、最多排队的哈希请求数
+    BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", "12"))
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+    PASSWORD_HASH_MAX_PENDING: int = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+
+    # 已认证用户的进程内缓存：有效期（秒，0表示不缓存）和最大条数
+    USER_CACHE_TTL_SECONDS: float = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+    USER_CACHE_SIZE: int = int(os.getenv("USER_CACHE_SIZE", "10000"))
+
+    # 知识库元数据（集合名称、激活状态、嵌入模型）的进程内缓存：有效期（秒，0表示不缓存）和最大条数；
+    # 命中时不查询数据库，其它进程的修改在有效期结束后才可见
+    KB_CACHE_TTL_SECONDS: float = float(os.getenv("KB_CACHE_TTL_SECONDS", "5"))
+    KB_CACHE_SIZE: int = int(os.getenv("KB_CACHE_SIZE", "10000"))
+
+    # 孤立集合回收间隔（秒），0表示不启用后台回收
+    COLLECTION_GC_INTERVAL_SECONDS: int = int(os.getenv("COLLECTION_GC_INTERVAL_SECONDS", "3600"))
+    # 集合连续被判定为孤立超过该时间（秒）才删除，正在创建（已建物理集合、尚未建别名）的集合不会被误删
+    COLLECTION_GC_GRACE_SECONDS: int = int(os.getenv("COLLECTION_GC_GRACE_SECONDS", "600"))
+    # 后台回收的锁文件：多个worker中只有持有该锁的进程执行回收
+    COLLECTION_GC_LOCK_FILE: str = os.getenv("COLLECTION_GC_LOCK_FILE", "./collection_gc.lock")
     
     # CORS设置
     ALLOWED_ORIGINS: list = os.getenv("ALLOWED_ORIGINS", "*").split(",")
@@ -0,0 +1,178 @@
+"""
+生成前的上下文压缩
+
+"stuff" 链把检索到的文本块原样拼进提示词：字符切分的块最长1000个字符，相邻块还重叠200个字符，
+提示词中有不少与问题无关或重复的内容，既增加token费用也拖慢生成。这里在检索器和语言模型之间
+加一个压缩阶段：
+- 向量相似度不低于 CONTEXT_KEEP_SCORE 的块整块保留：这类块常与问题语义相关但措辞不同
+- 其余块按句子切分，只保留与问题有词项重叠的句子（块中没有这样的句子时保留首句）；
+  "什么""如何"等虚词组成的二元组不计入重叠
+- 去掉已经出现在前面块中的句子和片段，消除块间重叠
+- 按语言模型的token预算截断，检索排名靠前的块优先
+压缩前后的token数计入统计，用于观察节省的提示词token。
+"""
+import re
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from langchain.retrievers import ContextualCompressionRetriever
+from langchain.retrievers.document_compressors.base import BaseDocumentCompressor
+from langchain_core.callbacks import Callbacks
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from .config import settings
+from .lexical_index import tokenize
+from .retrievers import SCORE_METADATA_KEY
+from .text_splitter import estimate_tokens, join_sentences, split_sentences
+
+# 各语言模型的上下文token预算，只计检索到的内容，不含提示词模板和问题
+CONTEXT_TOKEN_BUDGETS = {
+    "qwen-turbo": 1200,
+    "qwen-plus": 2000,
+    "qwen-max": 3000,
+}
+DEFAULT_CONTEXT_TOKEN_BUDGET = 1500
+
+_WHITESPACE = re.compile(r"\s+")
+
+# 问题中常见、不代表内容的检索词：中文为 tokenize 切出的二元组
+STOPWORD_TERMS = frozenset({
+    "什么", "如何", "怎么", "怎样", "为什", "哪些", "哪个", "是否", "可以", "能否", "请问",
+    "介绍", "一下", "一个", "这个", "那个", "我们", "你们", "他们", "的是", "是什", "么是",
+    "有哪", "以及", "或者", "还是", "因为", "所以", "如果", "但是", "时候", "需要", "应该",
+    "a", "an", "the", "is", "are", "was", "be", "of", "to", "in", "on", "for", "and", "or",
+    "what", "how", "why", "which", "when", "do", "does", "can", "i", "you", "it", "this", "that",
+})
+
+
+def content_terms(text: str) -> List[str]:
+    """切分检索词并去掉虚词"""
+    return [term for term in tokenize(text) if term not in STOPWORD_TERMS]
+
+
+def get_context_token_budget(model_name: Optional[str] = None) -> int:
+    """
+    获取语言模型的上下文token预算，配置了 CONTEXT_TOKEN_BUDGET 时优先使用配置
+    """
+    if settings.CONTEXT_TOKEN_BUDGET:
+        return settings.CONTEXT_TOKEN_BUDGET
+    return CONTEXT_TOKEN_BUDGETS.get(model_name, DEFAULT_CONTEXT_TOKEN_BUDGET)
+
+
+class CompressionStats:
+    """
+    压缩前后的提示词token统计
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.original_tokens = 0
+        self.compressed_tokens = 0
+
+    def record(self, original_tokens: int, compressed_tokens: int) -> None:
+        with self._lock:
+            self.requests += 1
+            self.original_tokens += original_tokens
+            self.compressed_tokens += compressed_tokens
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            saved = self.original_tokens - self.compressed_tokens
+            return {
+                "requests": self.requests,
+                "original_tokens": self.original_tokens,
+                "compressed_tokens": self.compressed_tokens,
+                "saved_tokens": saved,
+                "saved_ratio": round(saved / self.original_tokens, 3) if self.original_tokens else 0.0,
+            }
+
+
+_stats = CompressionStats()
+
+
+def get_compression_stats() -> Dict[str, Any]:
+    """获取进程内的上下文压缩统计"""
+    return _stats.snapshot()
+
+
+class SentenceCompressor(BaseDocumentCompressor):
+    """
+    按句子抽取与问题相关的内容，去除块间重复，并按token预算截断
+    """
+
+    token_budget: int = DEFAULT_CONTEXT_TOKEN_BUDGET
+    token_counter: Callable[[str], int] = estimate_tokens
+
+    def compress_documents(
+        self,
+        documents: Sequence[Document],
+        query: str,
+        callbacks: Optional[Callbacks] = None
+    ) -> Sequence[Document]:
+        """
+        压缩检索到的文本块
+
+        Args:
+            documents: 按相关度降序的文本块
+            query: 用户问题
+
+        Returns:
+            压缩后的文本块，没有保留任何句子的块被丢弃
+        """
+        query_terms = set(content_terms(query))
+        # 已保留句子去除空白后的拼接，用于识别重复的句子和重叠产生的句子片段
+        kept_text = ""
+        remaining = self.token_budget
+        compressed: List[Document] = []
+        original_tokens = 0
+
+        for document in documents:
+            original_tokens += self.token_counter(document.page_content)
+            sentences = split_sentences(document.page_content)
+            score = document.metadata.get(SCORE_METADATA_KEY)
+            relevant = [sentence for sentence in sentences if query_terms & set(tokenize(sentence))]
+            if score is not None and score >= settings.CONTEXT_KEEP_SCORE:
+                # 与问题高度相关的块整块保留，只去重和按预算截断
+                relevant = sentences
+            elif not query_terms or not relevant:
+                # 问题没有可匹配的词项，或块是靠语义相似检索到的，只保留开头
+                relevant = sentences if not query_terms else sentences[:1]
+
+            kept = []
+            for sentence in relevant:
+                key = _WHITESPACE.sub("", sentence)
+                if not key or key in kept_text:
+                    continue
+                tokens = self.token_counter(sentence)
+                if tokens > remaining:
+                    continue
+                kept.append(sentence)
+                kept_text += key + "\n"
+                remaining -= tokens
+
+            if kept:
+                compressed.append(Document(page_content=join_sentences(kept), metadata=document.metadata))
+
+        _stats.record(original_tokens, sum(self.token_counter(document.page_content) for document in compressed))
+        return compressed
+
+
+def with_context_compression(retriever: BaseRetriever, model_name: Optional[str] = None) -> BaseRetriever:
+    """
+    为检索器加上上下文压缩，未启用压缩时原样返回
+
+    Args:
+        retriever: 基础检索器
+        model_name: 生成回答的语言模型，决定token预算
+
+    Returns:
+        检索器
+    """
+    if not settings.CONTEXT_COMPRESSION:
+        return retriever
+    return ContextualCompressionRetriever(
+        base_compressor=SentenceCompressor(token_budget=get_context_token_budget(model_name)),
+        base_retriever=retriever,
+    )
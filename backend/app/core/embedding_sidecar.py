@@ -0,0 +1,401 @@
+"""
+共享嵌入进程
+
+多个uvicorn/gunicorn工作进程各自加载一份嵌入模型（连同PyTorch），内存占用随工作进程数成倍增长。
+设置 EMBEDDING_BACKEND=sidecar 后，工作进程不再加载模型，而是通过Unix套接字把文本交给
+本机上单独运行的嵌入进程编码：
+- 模型只在嵌入进程中加载一次，内存占用与工作进程数无关
+- 嵌入进程把各工作进程同时到达的请求合并成一批编码（最多 EMBEDDING_SIDECAR_MAX_BATCH 条，
+  最多等待 EMBEDDING_SIDECAR_BATCH_WAIT_MS），批量越大推理效率越高
+- 嵌入进程中的推理后端由 EMBEDDING_SIDECAR_BACKEND 选择（留空使用注册表中的后端，onnx 使用ONNX模型）
+
+注册表中的后端对查询和文档的编码方式相同，查询与文档一起合并编码。向量以float32传输。
+
+消息格式：8字节头（JSON长度、二进制负载长度，均为大端无符号32位整数）+ JSON + 负载。
+请求为 {"op": "load" | "embed" | "stats", "model": 模型名称, "texts": [...]}，
+embed 的响应负载为按行排列的float32向量。
+
+启动嵌入进程（在 backend 目录下，先于应用的工作进程启动）:
+    python -m app.core.embedding_sidecar
+    python -m app.core.embedding_sidecar --socket /run/embeddings.sock --models BAAI/bge-small-zh-v1.5
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import struct
+import threading
+import time
+from array import array
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+from .config import settings
+
+_HEADER = struct.Struct("!II")
+
+
+class SidecarError(RuntimeError):
+    """嵌入进程返回的错误"""
+
+
+def _encode_frame(header: Dict[str, Any], payload: bytes = b"") -> bytes:
+    body = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    return _HEADER.pack(len(body), len(payload)) + body + payload
+
+
+def _pack_vectors(vectors: List[List[float]]) -> Tuple[int, bytes]:
+    """将向量按行打包为float32字节串，返回 (维度, 字节串)"""
+    dimension = len(vectors[0]) if vectors else 0
+    packed = array("f")
+    for vector in vectors:
+        packed.extend(vector)
+    return dimension, packed.tobytes()
+
+
+def _unpack_vectors(payload: bytes, dimension: int) -> List[List[float]]:
+    if not dimension:
+        return []
+    values = array("f")
+    values.frombytes(payload)
+    return [values[start:start + dimension].tolist() for start in range(0, len(values), dimension)]
+
+
+def _read_exactly(conn: socket.socket, size: int) -> bytes:
+    chunks = bytearray()
+    while len(chunks) < size:
+        chunk = conn.recv(min(size - len(chunks), 1 << 20))
+        if not chunk:
+            raise ConnectionResetError("嵌入进程关闭了连接")
+        chunks.extend(chunk)
+    return bytes(chunks)
+
+
+def _exchange(conn: socket.socket, request: Dict[str, Any]) -> Tuple[Dict[str, Any], bytes]:
+    """在客户端连接上发送一个请求并读取响应"""
+    conn.sendall(_encode_frame(request))
+    header_length, payload_length = _HEADER.unpack(_read_exactly(conn, _HEADER.size))
+    header = json.loads(_read_exactly(conn, header_length))
+    payload = _read_exactly(conn, payload_length) if payload_length else b""
+    if "error" in header:
+        raise SidecarError(header["error"])
+    return header, payload
+
+
+def load_sidecar_model(model_name: str) -> Embeddings:
+    """在嵌入进程中加载注册表中的模型，推理后端由 EMBEDDING_SIDECAR_BACKEND 决定"""
+    from .embeddings import EMBEDDING_BACKENDS, resolve_embedding_backend
+
+    backend = resolve_embedding_backend(model_name, settings.EMBEDDING_SIDECAR_BACKEND)
+    if backend == "sidecar":
+        raise ValueError("嵌入进程的推理后端不能是 sidecar")
+    return EMBEDDING_BACKENDS[backend](model_name)
+
+
+class _ModelBatcher:
+    """
+    单个模型的请求合并：排队的请求合并成一批，在线程中编码后按请求拆分结果
+    """
+
+    def __init__(self, model: Embeddings, max_batch: int, max_wait: float):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue: asyncio.Queue = asyncio.Queue()
+        # 放不进上一批、留给下一批的请求
+        self._carry: Optional[Tuple[List[str], asyncio.Future]] = None
+        self.requests = 0
+        self.texts = 0
+        self.batches = 0
+        self.max_batch_seen = 0
+        self.encode_seconds = 0.0
+        self._task = asyncio.create_task(self._run())
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((texts, future))
+        return await future
+
+    async def _next_batch(self) -> List[Tuple[List[str], asyncio.Future]]:
+        if self._carry is not None:
+            first, self._carry = self._carry, None
+        else:
+            first = await self.queue.get()
+        batch = [first]
+        count = len(first[0])
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while count < self.max_batch:
+            if self.queue.empty():
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            else:
+                item = self.queue.get_nowait()
+            if count + len(item[0]) > self.max_batch:
+                self._carry = item
+                break
+            batch.append(item)
+            count += len(item[0])
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._next_batch()
+            texts = [text for request_texts, _ in batch for text in request_texts]
+            started = time.perf_counter()
+            try:
+                vectors = await asyncio.to_thread(self.model.embed_documents, texts)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.encode_seconds += time.perf_counter() - started
+            self.requests += len(batch)
+            self.texts += len(texts)
+            self.batches += 1
+            self.max_batch_seen = max(self.max_batch_seen, len(texts))
+
+            start = 0
+            for request_texts, future in batch:
+                if not future.done():
+                    future.set_result(vectors[start:start + len(request_texts)])
+                start += len(request_texts)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "texts": self.texts,
+            "batches": self.batches,
+            "avg_batch_texts": round(self.texts / self.batches, 1) if self.batches else 0.0,
+            "avg_batch_requests": round(self.requests / self.batches, 1) if self.batches else 0.0,
+            "max_batch_texts": self.max_batch_seen,
+            "encode_seconds": round(self.encode_seconds, 3),
+            "queued": self.queue.qsize(),
+        }
+
+    def close(self) -> None:
+        self._task.cancel()
+
+
+class EmbeddingSidecarServer:
+    """
+    嵌入进程的Unix套接字服务，每个连接上的请求依次处理，不同连接的请求合并编码
+    """
+
+    def __init__(
+        self,
+        socket_path: str = None,
+        max_batch: int = None,
+        batch_wait_ms: float = None,
+        loader: Callable[[str], Embeddings] = load_sidecar_model
+    ):
+        """
+        Args:
+            socket_path: Unix套接字路径
+            max_batch: 每批最多编码的文本数
+            batch_wait_ms: 收到请求后等待其它请求加入同一批的最长时间（毫秒）
+            loader: 根据模型名称加载嵌入模型
+        """
+        self.socket_path = socket_path or settings.EMBEDDING_SIDECAR_SOCKET
+        self.max_batch = max_batch or settings.EMBEDDING_SIDECAR_MAX_BATCH
+        self.max_wait = (settings.EMBEDDING_SIDECAR_BATCH_WAIT_MS if batch_wait_ms is None else batch_wait_ms) / 1000
+        self.loader = loader
+        self._batchers: Dict[str, _ModelBatcher] = {}
+        self._dimensions: Dict[str, int] = {}
+        self._load_lock: Optional[asyncio.Lock] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def get_batcher(self, model_name: str) -> _ModelBatcher:
+        """获取模型的请求合并器，模型在首次使用时加载"""
+        if model_name not in self._batchers:
+            async with self._load_lock:
+                if model_name not in self._batchers:
+                    model = await asyncio.to_thread(self.loader, model_name)
+                    self._dimensions[model_name] = len(await asyncio.to_thread(model.embed_query, "dimension probe"))
+                    self._batchers[model_name] = _ModelBatcher(model, self.max_batch, self.max_wait)
+        return self._batchers[model_name]
+
+    async def _handle_request(self, request: Dict[str, Any]) -> Tuple[Dict[str, Any], bytes]:
+        op = request.get("op")
+        if op == "stats":
+            return {"models": {name: batcher.stats() for name, batcher in self._batchers.items()}}, b""
+
+        model_name = request.get("model")
+        batcher = await self.get_batcher(model_name)
+        if op == "load":
+            return {"dimension": self._dimensions[model_name]}, b""
+        if op == "embed":
+            texts = request.get("texts") or []
+            vectors = await batcher.embed(texts) if texts else []
+            dimension, payload = _pack_vectors(vectors)
+            return {"rows": len(vectors), "dimension": dimension}, payload
+        raise ValueError(f"未知的操作: {op}")
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    header_length, payload_length = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+                    request = json.loads(await reader.readexactly(header_length))
+                    if payload_length:
+                        await reader.readexactly(payload_length)
+                except asyncio.IncompleteReadError:
+                    return
+                try:
+                    response, payload = await self._handle_request(request)
+                except Exception as e:
+                    response, payload = {"error": f"{type(e).__name__}: {e}"}, b""
+                writer.write(_encode_frame(response, payload))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, preload: List[str] = ()) -> None:
+        """预加载模型后开始监听"""
+        self._load_lock = asyncio.Lock()
+        for model_name in preload:
+            await self.get_batcher(model_name)
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self._server = await asyncio.start_unix_server(self._handle_connection, path=self.socket_path)
+
+    async def serve_forever(self, preload: List[str] = ()) -> None:
+        await self.start(preload)
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        for batcher in self._batchers.values():
+            batcher.close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+class SidecarEmbeddings(Embeddings):
+    """
+    通过共享嵌入进程编码的嵌入模型，每个线程使用自己的连接
+    """
+
+    def __init__(self, model_name: str, socket_path: str = None, timeout: float = None, connect_timeout: float = None):
+        """
+        Args:
+            model_name: 模型名称
+            socket_path: 嵌入进程的Unix套接字路径
+            timeout: 单次请求的超时（秒）
+            connect_timeout: 创建时等待嵌入进程就绪并加载模型的最长时间（秒）
+        """
+        self.model_name = model_name
+        self.socket_path = socket_path or settings.EMBEDDING_SIDECAR_SOCKET
+        self.timeout = timeout or settings.EMBEDDING_SIDECAR_TIMEOUT
+        self._local = threading.local()
+        self.dimension = self._wait_until_loaded(
+            settings.EMBEDDING_SIDECAR_CONNECT_TIMEOUT if connect_timeout is None else connect_timeout
+        )
+
+    def _wait_until_loaded(self, connect_timeout: float) -> int:
+        """嵌入进程可能晚于工作进程启动，连接失败时重试到超时"""
+        deadline = time.monotonic() + connect_timeout
+        while True:
+            try:
+                header, _ = self._request({"op": "load", "model": self.model_name})
+                return header["dimension"]
+            except (FileNotFoundError, ConnectionRefusedError) as e:
+                if time.monotonic() >= deadline:
+                    raise ConnectionError(f"无法连接嵌入进程 {self.socket_path}: {e}") from e
+                time.sleep(0.5)
+
+    def _connection(self) -> socket.socket:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            conn.settimeout(self.timeout)
+            try:
+                conn.connect(self.socket_path)
+            except OSError:
+                conn.close()
+                raise
+            self._local.conn = conn
+        return conn
+
+    def _reset_connection(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def _request(self, request: Dict[str, Any]) -> Tuple[Dict[str, Any], bytes]:
+        # 嵌入进程重启后已有连接失效，重新连接一次
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                header, payload = _exchange(conn, request)
+                break
+            except SidecarError:
+                raise
+            except (ConnectionResetError, BrokenPipeError):
+                self._reset_connection()
+                if attempt == 1:
+                    raise
+            except Exception:
+                # 超时等错误后连接上可能残留未读的响应，不再复用
+                self._reset_connection()
+                raise
+        return header, payload
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        header, payload = self._request({"op": "embed", "model": self.model_name, "texts": list(texts)})
+        return _unpack_vectors(payload, header["dimension"])
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def get_sidecar_stats(socket_path: str = None) -> Dict[str, Any]:
+    """获取嵌入进程中每个模型的合并编码统计"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        conn.settimeout(5)
+        conn.connect(socket_path or settings.EMBEDDING_SIDECAR_SOCKET)
+        header, _ = _exchange(conn, {"op": "stats"})
+    return header
+
+
+def main():
+    parser = argparse.ArgumentParser(description="供多个工作进程共享的嵌入进程")
+    parser.add_argument("--socket", default=settings.EMBEDDING_SIDECAR_SOCKET, help="Unix套接字路径")
+    parser.add_argument("--models", nargs="*", default=[settings.EMBEDDING_MODEL], help="启动时预加载的模型")
+    parser.add_argument("--max-batch", type=int, default=settings.EMBEDDING_SIDECAR_MAX_BATCH)
+    parser.add_argument("--batch-wait-ms", type=float, default=settings.EMBEDDING_SIDECAR_BATCH_WAIT_MS)
+    args = parser.parse_args()
+
+    if not hasattr(socket, "AF_UNIX"):
+        raise SystemExit("当前平台不支持Unix套接字")
+
+    server = EmbeddingSidecarServer(args.socket, args.max_batch, args.batch_wait_ms)
+    print(f"启动嵌入进程，套接字 {args.socket}，预加载: {', '.join(args.models)}")
+    try:
+        asyncio.run(server.serve_forever(args.models))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if os.path.exists(args.socket):
+            os.unlink(args.socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+嵌入模型注册表
+
+集中管理可用的嵌入模型及其向量维度，三个RAG管道都通过这里获取嵌入模型，
+同一进程内相同模型只加载一次。知识库记录中保存生成其向量的模型名称和维度，
+切换模型需要通过重新嵌入迁移完成（见 reembedding.py）。
+"""
+import threading
+import time
+import warnings
+from typing import Callable, Dict, Optional, Tuple, Any
+
+from .config import settings
+
+# 可用的嵌入模型：模型名称 -> 后端、向量维度、池化方式与最大输入token数
+# （ONNX后端需要按原模型的方式池化和截断，与sentence-transformers的 max_seq_length 一致）
+EMBEDDING_MODELS: Dict[str, Dict[str, Any]] = {
+    "sentence-transformers/all-MiniLM-L6-v2": {
+        "backend": "huggingface", "dimension": 384, "pooling": "mean", "max_seq_length": 256
+    },
+    "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2": {
+        "backend": "huggingface", "dimension": 384, "pooling": "mean", "max_seq_length": 128
+    },
+    "BAAI/bge-small-zh-v1.5": {"backend": "huggingface", "dimension": 512, "pooling": "cls", "max_seq_length": 512},
+    "fake-1024": {"backend": "fake", "dimension": 1024},
+}
+
+# 模型加载失败时使用的不依赖网络的后备模型
+FALLBACK_EMBEDDING_MODEL = "fake-1024"
+
+# 嵌入后端：后端名称 -> 根据模型名称创建嵌入模型的工厂函数
+EMBEDDING_BACKENDS: Dict[str, Callable[[str], Any]] = {}
+
+_model_cache: Dict[str, Any] = {}
+_model_lock = threading.Lock()
+
+# 最近加载失败的模型：模型名称 -> (可以重试的时间, 错误信息)。冷却期内直接报错，
+# 不让每个请求都重新等待（例如连接嵌入进程最多等待 EMBEDDING_SIDECAR_CONNECT_TIMEOUT 秒）
+_load_failures: Dict[str, Tuple[float, str]] = {}
+
+
+class EmbeddingModelUnavailable(RuntimeError):
+    """嵌入模型无法加载，且不能退回到后备模型（例如知识库已记录生成其向量的模型）"""
+
+
+def register_embedding_backend(name: str):
+    """注册嵌入后端的装饰器"""
+    def decorator(factory: Callable[[str], Any]):
+        EMBEDDING_BACKENDS[name] = factory
+        return factory
+    return decorator
+
+
+@register_embedding_backend("huggingface")
+def _create_huggingface_embeddings(model_name: str):
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+    return HuggingFaceEmbeddings(model_name=model_name)
+
+
+@register_embedding_backend("onnx")
+def _create_onnx_embeddings(model_name: str):
+    config = EMBEDDING_MODELS[model_name]
+    try:
+        from .onnx_embeddings import OnnxEmbeddings, get_onnx_model_dir
+        return OnnxEmbeddings(
+            get_onnx_model_dir(model_name),
+            quantized=settings.ONNX_QUANTIZED,
+            pooling=config.get("pooling", "mean"),
+            max_length=config.get("max_seq_length", 256),
+            intra_op_threads=settings.ONNX_THREADS or None
+        )
+    except (ImportError, FileNotFoundError) as e:
+        # ONNX与PyTorch生成的向量兼容，模型未导出或未安装ONNX Runtime时改用PyTorch推理
+        warnings.warn(f"无法使用ONNX后端加载 {model_name}: {e}. 使用PyTorch后端.")
+        return _create_huggingface_embeddings(model_name)
+
+
+@register_embedding_backend("sidecar")
+def _create_sidecar_embeddings(model_name: str):
+    from .embedding_sidecar import SidecarEmbeddings
+    return SidecarEmbeddings(model_name)
+
+
+@register_embedding_backend("fake")
+def _create_fake_embeddings(model_name: str):
+    from langchain_community.embeddings import FakeEmbeddings
+    return FakeEmbeddings(size=EMBEDDING_MODELS[model_name]["dimension"])
+
+
+def resolve_embedding_backend(model_name: str, override: str = None) -> str:
+    """
+    获取模型实际使用的嵌入后端
+
+    Args:
+        model_name: 模型名称
+        override: 替换 huggingface 后端的部署配置，为空时使用 EMBEDDING_BACKEND
+
+    Returns:
+        后端名称
+    """
+    backend = EMBEDDING_MODELS[model_name]["backend"]
+    override = settings.EMBEDDING_BACKEND if override is None else override
+    # ONNX后端与PyTorch后端生成的向量兼容，sidecar 后端由共享的嵌入进程执行推理，均可按部署配置替换
+    if backend == "huggingface" and override in ("onnx", "sidecar"):
+        backend = override
+    return backend
+
+
+def get_embedding_dimension_for(model_name: str) -> int:
+    """获取注册表中模型的向量维度"""
+    if model_name not in EMBEDDING_MODELS:
+        raise ValueError(f"未注册的嵌入模型: {model_name}")
+    return EMBEDDING_MODELS[model_name]["dimension"]
+
+
+def infer_embedding_model(dimension: int) -> Optional[str]:
+    """
+    根据集合的向量维度推断生成它的注册模型，用于补全没有记录模型的早期知识库
+
+    默认模型维度一致时优先认为是默认模型；维度与后备模型一致时认为是加载失败后退回的后备模型
+
+    Returns:
+        模型名称，无法唯一确定时返回None
+    """
+    if EMBEDDING_MODELS.get(settings.EMBEDDING_MODEL, {}).get("dimension") == dimension:
+        return settings.EMBEDDING_MODEL
+    if EMBEDDING_MODELS[FALLBACK_EMBEDDING_MODEL]["dimension"] == dimension:
+        return FALLBACK_EMBEDDING_MODEL
+    candidates = [name for name, config in EMBEDDING_MODELS.items() if config["dimension"] == dimension]
+    return candidates[0] if len(candidates) == 1 else None
+
+
+def _check_recent_failure(model_name: str) -> None:
+    failure = _load_failures.get(model_name)
+    if failure is None:
+        return
+    retry_at, message = failure
+    remaining = retry_at - time.monotonic()
+    if remaining > 0:
+        raise EmbeddingModelUnavailable(f"嵌入模型 {model_name} 加载失败（{message}），{remaining:.0f} 秒后重试")
+
+
+def load_embedding_model(model_name: str):
+    """
+    加载注册表中的嵌入模型，同一模型在进程内只加载一次
+
+    加载失败后 EMBEDDING_LOAD_RETRY_SECONDS 秒内不再尝试，直接抛出 EmbeddingModelUnavailable
+
+    Args:
+        model_name: 模型名称
+
+    Returns:
+        LangChain嵌入模型
+    """
+    if model_name not in EMBEDDING_MODELS:
+        raise ValueError(f"未注册的嵌入模型: {model_name}")
+
+    if model_name in _model_cache:
+        return _model_cache[model_name]
+    _check_recent_failure(model_name)
+
+    with _model_lock:
+        if model_name in _model_cache:
+            return _model_cache[model_name]
+        # 等待锁期间其它线程可能刚加载失败
+        _check_recent_failure(model_name)
+        try:
+            model = EMBEDDING_BACKENDS[resolve_embedding_backend(model_name)](model_name)
+        except Exception as e:
+            _load_failures[model_name] = (time.monotonic() + settings.EMBEDDING_LOAD_RETRY_SECONDS, str(e))
+            raise
+        _load_failures.pop(model_name, None)
+        _model_cache[model_name] = model
+        return model
+
+
+def get_embedding_model(model_name: str = None, allow_fallback: bool = True) -> Tuple[str, Any]:
+    """
+    获取嵌入模型，加载失败时退回到后备模型
+
+    Args:
+        model_name: 模型名称，为空时使用配置中的默认模型
+        allow_fallback: 加载失败时是否退回到后备模型；已有向量的集合必须使用生成它们的模型，
+            此时应为False，后备模型生成的向量与集合不在同一个向量空间
+
+    Returns:
+        (实际使用的模型名称, 嵌入模型)
+
+    Raises:
+        EmbeddingModelUnavailable: allow_fallback 为False且模型加载失败
+    """
+    model_name = model_name or settings.EMBEDDING_MODEL
+    if model_name not in EMBEDDING_MODELS:
+        raise ValueError(f"未注册的嵌入模型: {model_name}")
+
+    try:
+        return model_name, load_embedding_model(model_name)
+    except Exception as e:
+        if not allow_fallback:
+            if isinstance(e, EmbeddingModelUnavailable):
+                raise
+            raise EmbeddingModelUnavailable(f"无法加载嵌入模型 {model_name}: {e}") from e
+        warnings.warn(f"无法加载嵌入模型 {model_name}: {e}. 使用默认嵌入模型.")
+        # 使用不依赖网络的默认嵌入模型
+        return FALLBACK_EMBEDDING_MODEL, load_embedding_model(FALLBACK_EMBEDDING_MODEL)
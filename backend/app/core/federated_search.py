@@ -0,0 +1,115 @@
+"""
+跨知识库检索
+
+前端原来对每个知识库分别调用 /knowledge-bases/{kb_id}/search 再自行合并。这里一次请求
+并发检索用户的多个知识库：各知识库的管道创建（加载嵌入模型、连接Qdrant）和检索在线程中并发执行，
+查询文本对每种嵌入模型只编码一次。每个知识库从创建管道开始就有独立的超时，单个变慢的集合
+或暂时不可用的嵌入模型不会拖住整个响应。
+
+各知识库可能使用不同的嵌入模型，余弦相似度不能直接比较；min-max归一化又会把每个知识库的
+第一名都变成1。合并规则：
+- 所有结果都经过交叉编码器重排时按 rerank_score 排序，该分数只取决于问题和文本，各知识库可比
+- 否则按各结果在其知识库内的排名做倒数排名融合（federated_score = 1 / (RRF_K + 排名)）。
+  知识库内的顺序已经按重排分数、混合检索的 rrf_score 或向量相似度排好，只由词法检索命中的结果
+  同样按其融合后的排名参与合并
+"""
+import asyncio
+from typing import Any, Callable, Dict, List, Optional
+
+from .config import settings
+from ..models.knowledge_base import KnowledgeBase
+
+
+def merge_results(ranked_lists: List[List[Dict[str, Any]]], k: int) -> List[Dict[str, Any]]:
+    """
+    合并多个知识库按各自顺序排好的检索结果
+
+    Args:
+        ranked_lists: 每个知识库的结果列表，按该知识库的检索顺序排列
+        k: 返回的结果数量
+
+    Returns:
+        合并后的前k个结果，每个结果带有 federated_score
+    """
+    # 词法索引模块依赖numpy等，不在路由导入时加载
+    from .lexical_index import RRF_K
+
+    results = [result for ranked in ranked_lists for result in ranked]
+    if results and all(result.get("rerank_score") is not None for result in results):
+        merged = [{**result, "federated_score": result["rerank_score"]} for result in results]
+    else:
+        merged = [
+            {**result, "federated_score": 1.0 / (RRF_K + rank)}
+            for ranked in ranked_lists
+            for rank, result in enumerate(ranked, start=1)
+        ]
+    merged.sort(key=lambda result: result["federated_score"], reverse=True)
+    return merged[:k]
+
+
+async def federated_search(
+    knowledge_bases: List[KnowledgeBase],
+    pipeline_factory: Callable[[KnowledgeBase], Any],
+    query: str,
+    k: int = 4,
+    timeout_ms: Optional[float] = None,
+    search_kwargs: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    并发检索多个知识库并合并结果
+
+    Args:
+        knowledge_bases: 要检索的知识库
+        pipeline_factory: 根据知识库记录创建RAG管道，失败时返回None或抛出异常
+        query: 查询文本
+        k: 合并后返回的结果数量，每个知识库同样取前k个
+        timeout_ms: 每个知识库创建管道和检索的总超时（毫秒），为空时使用配置
+        search_kwargs: 传给各知识库检索的过滤条件、分数阈值等参数
+
+    Returns:
+        results 为合并后的结果，timed_out / failed 为超时和出错的知识库ID
+    """
+    timeout_ms = settings.FEDERATED_SEARCH_TIMEOUT_MS if timeout_ms is None else timeout_ms
+    search_kwargs = search_kwargs or {}
+
+    # 使用同一嵌入模型的知识库共用一次查询编码
+    embeddings: Dict[str, asyncio.Future] = {}
+
+    def query_embedding(pipeline) -> asyncio.Future:
+        if pipeline.embedding_model_name not in embeddings:
+            embeddings[pipeline.embedding_model_name] = asyncio.ensure_future(
+                asyncio.to_thread(pipeline.embedding_model.embed_query, query)
+            )
+        return embeddings[pipeline.embedding_model_name]
+
+    async def search(knowledge_base: KnowledgeBase) -> Optional[List[Dict[str, Any]]]:
+        pipeline = await asyncio.to_thread(pipeline_factory, knowledge_base)
+        if pipeline is None or pipeline.vectorstore is None:
+            return None
+        # 一个知识库超时不取消其它知识库共用的编码
+        embedding = await asyncio.shield(query_embedding(pipeline))
+        return await asyncio.to_thread(pipeline.similarity_search, query, k, embedding, **search_kwargs)
+
+    outcomes = await asyncio.gather(
+        *(asyncio.wait_for(search(knowledge_base), timeout=timeout_ms / 1000) for knowledge_base in knowledge_bases),
+        return_exceptions=True
+    )
+
+    ranked_lists: List[List[Dict[str, Any]]] = []
+    timed_out: List[int] = []
+    failed: List[int] = []
+    for knowledge_base, outcome in zip(knowledge_bases, outcomes):
+        if isinstance(outcome, asyncio.TimeoutError):
+            timed_out.append(knowledge_base.id)
+        elif isinstance(outcome, Exception):
+            print(f"警告: 检索知识库 {knowledge_base.id} 失败: {str(outcome)}")
+            failed.append(knowledge_base.id)
+        elif outcome is None:
+            failed.append(knowledge_base.id)
+        else:
+            ranked_lists.append([
+                {**result, "knowledge_base_id": knowledge_base.id, "knowledge_base_name": knowledge_base.name}
+                for result in outcome
+            ])
+
+    return {"results": merge_results(ranked_lists, k), "timed_out": timed_out, "failed": failed}
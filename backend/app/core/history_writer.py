@@ -0,0 +1,207 @@
+"""
+查询历史的异步批量写入
+
+查询接口原来在生成回答之后同步 add + commit 一条 QueryHistory，每次问答都多一次数据库往返和
+一次提交。这里把查询历史放入进程内的有界队列，由lifespan中启动的后台任务按批量插入，
+并在同一事务中增量更新知识库使用统计：
+- 攒够 HISTORY_BATCH_SIZE 条或距上次写入超过 HISTORY_FLUSH_INTERVAL_MS 时写入一批
+- 队列满时请求等待队列腾出空间，不丢弃记录
+- 应用关闭时写完队列中剩余的记录
+- 连接中断、锁等待超时等可恢复的错误（OperationalError）整批重试；某条记录违反约束
+  （例如所属知识库刚被删除）时改为逐条写入，只丢弃出错的记录
+后台任务未运行时（例如脚本或测试中直接调用接口函数）退回到直接写入。
+"""
+import asyncio
+import warnings
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from .config import settings
+from .kb_stats import apply_query_stats
+from ..database import SessionLocal
+from ..models.query_history import QueryHistory
+
+# 批量写入失败时的重试次数
+FLUSH_RETRIES = 3
+
+# 关闭时放入队列的结束标记，保证此前入队的记录都被写入
+_STOP = None
+
+
+def write_history_batch(records: List[Dict[str, Any]]) -> None:
+    """使用独立的数据库会话批量插入查询历史，并更新知识库使用统计"""
+    db = SessionLocal()
+    try:
+        db.bulk_insert_mappings(
+            QueryHistory, [{key: value for key, value in record.items() if key != "latency_ms"} for record in records]
+        )
+        apply_query_stats(db, records)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def write_history_rows(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    逐条写入查询历史，违反约束的记录丢弃
+
+    Returns:
+        遇到可恢复的错误时尚未写入的记录（从出错的记录开始），全部处理完时为空
+    """
+    for index, record in enumerate(records):
+        try:
+            write_history_batch([record])
+        except IntegrityError as e:
+            warnings.warn(f"丢弃一条无法写入的查询历史（知识库 {record['knowledge_base_id']}）: {e.orig}")
+        except OperationalError:
+            return records[index:]
+    return []
+
+
+class HistoryWriter:
+    """
+    查询历史的批量写入器
+    """
+
+    def __init__(
+        self,
+        max_queue_size: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        flush_interval_ms: Optional[float] = None
+    ):
+        self.max_queue_size = max_queue_size or settings.HISTORY_QUEUE_SIZE
+        self.batch_size = batch_size or settings.HISTORY_BATCH_SIZE
+        self.flush_interval = (flush_interval_ms or settings.HISTORY_FLUSH_INTERVAL_MS) / 1000
+        self.queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """在当前事件循环中启动后台写入任务"""
+        self.queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._task = asyncio.create_task(self._run())
+
+    async def put(self, record: Dict[str, Any]) -> None:
+        """加入一条查询历史，队列满时等待"""
+        await self.queue.put(record)
+
+    async def _next_batch(self) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        等待第一条记录，再在刷新间隔内攒满一批
+
+        Returns:
+            (一批记录, 是否遇到结束标记)
+        """
+        record = await self.queue.get()
+        if record is _STOP:
+            return [], True
+        batch = [record]
+        deadline = asyncio.get_running_loop().time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                record = await asyncio.wait_for(self.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if record is _STOP:
+                return batch, True
+            batch.append(record)
+        return batch, False
+
+    async def _flush(self, batch: List[Dict[str, Any]]) -> None:
+        for attempt in range(1, FLUSH_RETRIES + 1):
+            try:
+                await asyncio.to_thread(write_history_batch, batch)
+                return
+            except IntegrityError:
+                # 整批已回滚，逐条写入以免一条记录连累整批
+                batch = await asyncio.to_thread(write_history_rows, batch)
+                if not batch:
+                    return
+                error = "数据库暂时不可用"
+            except OperationalError as e:
+                error = e
+            except Exception as e:
+                warnings.warn(f"写入 {len(batch)} 条查询历史失败，已放弃: {e}")
+                return
+            if attempt == FLUSH_RETRIES:
+                warnings.warn(f"写入 {len(batch)} 条查询历史失败，已放弃: {error}")
+                return
+            await asyncio.sleep(0.5 * attempt)
+
+    async def _run(self) -> None:
+        stop = False
+        while not stop:
+            batch, stop = await self._next_batch()
+            if batch:
+                await self._flush(batch)
+
+    async def close(self) -> None:
+        """写入队列中的记录后停止后台任务"""
+        if self._task is None:
+            return
+        await self.queue.put(_STOP)
+        await self._task
+        self._task = None
+
+        # 结束标记之后入队的记录
+        remaining = []
+        while not self.queue.empty():
+            remaining.append(self.queue.get_nowait())
+        for start in range(0, len(remaining), self.batch_size):
+            await self._flush(remaining[start:start + self.batch_size])
+
+
+_writer = HistoryWriter()
+
+
+def start_history_writer() -> None:
+    """启动查询历史的后台写入任务，在应用lifespan中调用"""
+    _writer.start()
+
+
+async def close_history_writer() -> None:
+    """写完剩余的查询历史并停止后台任务，在应用关闭时调用"""
+    await _writer.close()
+
+
+async def record_query_history(
+    knowledge_base_id: int,
+    question: str,
+    answer: str,
+    similarity_score: Optional[float] = None,
+    latency_ms: Optional[float] = None
+) -> None:
+    """
+    记录一条查询历史，后台任务运行时只加入队列
+
+    Args:
+        knowledge_base_id: 知识库ID
+        question: 问题
+        answer: 回答
+        similarity_score: 源文档的相似度
+        latency_ms: 查询耗时（毫秒），只计入知识库使用统计
+    """
+    record = {
+        "knowledge_base_id": knowledge_base_id,
+        "question": question,
+        "answer": answer,
+        "similarity_score": similarity_score,
+        "latency_ms": latency_ms,
+        # 记录查询发生的时间，而不是批量写入的时间
+        "created_at": datetime.utcnow(),
+    }
+    if _writer.running:
+        await _writer.put(record)
+    else:
+        await asyncio.to_thread(write_history_batch, [record])
@@ -0,0 +1,77 @@
+"""
+知识库元数据缓存
+
+多知识库接口的每个请求都要先按 (用户, 知识库ID) 查出知识库，校验归属并取得集合名称、激活状态和
+嵌入模型。这里按 (用户ID, 知识库ID) 缓存这些元数据 KB_CACHE_TTL_SECONDS 秒：
+- 缓存命中时不查询数据库；其它进程的修改和删除最多在有效期结束后可见，因此有效期应较短
+- 创建、修改、导入知识库后写入新的元数据，删除和重新嵌入时使本进程的缓存失效
+- 写入文档的接口总是从数据库读取，保证重新嵌入期间的双写能看到最新的影子集合，
+  读到的记录版本号（每次更新记录时加一）比缓存新时替换缓存
+- 检索时元数据过期也不会用错嵌入模型：别名已切换到影子集合时，管道按物理集合改用新模型
+"""
+from typing import NamedTuple, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .config import settings
+from ..models.knowledge_base import KnowledgeBase
+from ..utils.ttl_cache import TTLCache
+
+
+class KnowledgeBaseMeta(NamedTuple):
+    """知识库元数据，字段与 KnowledgeBase 同名，可以代替知识库记录创建RAG管道"""
+    id: int
+    user_id: int
+    collection_name: str
+    is_active: bool
+    embedding_model: Optional[str]
+    migration_collection: Optional[str]
+    migration_embedding_model: Optional[str]
+    version: int
+
+
+_META_COLUMNS = [getattr(KnowledgeBase, field) for field in KnowledgeBaseMeta._fields]
+
+_kb_cache = TTLCache(settings.KB_CACHE_TTL_SECONDS, settings.KB_CACHE_SIZE)
+
+
+def cache_knowledge_base(knowledge_base: KnowledgeBase) -> KnowledgeBaseMeta:
+    """写入从数据库读到的知识库元数据，缓存中已有更新的版本时保留缓存"""
+    meta = KnowledgeBaseMeta(*(getattr(knowledge_base, field) for field in KnowledgeBaseMeta._fields))
+    cached = _kb_cache.get((meta.user_id, meta.id))
+    if cached is not None and cached.version > meta.version:
+        return cached
+    _kb_cache.put((meta.user_id, meta.id), meta)
+    return meta
+
+
+def invalidate_knowledge_base(user_id: int, kb_id: int) -> None:
+    """使知识库的缓存失效"""
+    _kb_cache.invalidate((user_id, kb_id))
+
+
+async def get_knowledge_base_meta(db: AsyncSession, user_id: int, kb_id: int) -> Optional[KnowledgeBaseMeta]:
+    """
+    获取用户的知识库元数据，缓存命中时不查询数据库，未命中或已过期时按 (user_id, id) 索引查询
+
+    Args:
+        db: 异步数据库会话
+        user_id: 当前用户ID
+        kb_id: 知识库ID
+
+    Returns:
+        知识库元数据，知识库不存在或不属于该用户时返回None
+    """
+    meta = _kb_cache.get((user_id, kb_id))
+    if meta is not None:
+        return meta
+
+    row = (await db.execute(
+        select(*_META_COLUMNS).where(KnowledgeBase.user_id == user_id, KnowledgeBase.id == kb_id)
+    )).first()
+    if row is None:
+        return None
+    meta = KnowledgeBaseMeta(*row)
+    _kb_cache.put((user_id, kb_id), meta)
+    return meta
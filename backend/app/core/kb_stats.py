@@ -0,0 +1,178 @@
+"""
+知识库使用统计
+
+每次写入查询历史时在同一事务中增量更新 knowledge_base_stats：查询次数、相似度分数的和与最小值、
+延迟直方图和最后使用时间。统计接口按主键读取一行，不随查询历史的增长变慢；最后使用时间
+也用于找出长期未使用、可以转为冷集合的知识库。
+
+延迟分位数由直方图估算，结果为所在桶的上界。
+
+用法（在 backend 目录下）:
+    python -m app.core.kb_stats --idle-days 30            # 列出长期未使用的知识库
+    python -m app.core.kb_stats --idle-days 30 --apply    # 并将它们的集合转为冷集合
+"""
+import argparse
+import json
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from ..models.knowledge_base import KnowledgeBase
+from ..models.knowledge_base_stats import KnowledgeBaseStats
+
+# 延迟直方图各桶的上界（毫秒），最后一个桶收集所有更慢的查询
+LATENCY_BUCKETS_MS = [50, 100, 200, 500, 1000, 2000, 5000, 10000, 20000, 60000, float("inf")]
+
+
+def bucket_index(latency_ms: float) -> int:
+    """延迟所在的直方图桶"""
+    for i, upper in enumerate(LATENCY_BUCKETS_MS):
+        if latency_ms <= upper:
+            return i
+    return len(LATENCY_BUCKETS_MS) - 1
+
+
+def latency_percentile(histogram: List[int], q: float) -> Optional[float]:
+    """
+    由直方图估算延迟分位数
+
+    Args:
+        histogram: 各桶的查询数
+        q: 分位数（0-100）
+
+    Returns:
+        分位数所在桶的上界（毫秒），没有数据时返回None；落在最后一个桶时返回倒数第二个桶的上界
+    """
+    total = sum(histogram)
+    if not total:
+        return None
+    target = total * q / 100
+    cumulative = 0
+    for i, count in enumerate(histogram):
+        cumulative += count
+        if cumulative >= target and count:
+            return LATENCY_BUCKETS_MS[min(i, len(LATENCY_BUCKETS_MS) - 2)]
+    return LATENCY_BUCKETS_MS[-2]
+
+
+def apply_query_stats(db: Session, records: List[Dict[str, Any]]) -> None:
+    """
+    将一批查询历史合并到知识库统计中，调用方负责提交事务
+
+    Args:
+        db: 数据库会话
+        records: 查询历史，包含 knowledge_base_id、similarity_score、created_at，可选 latency_ms
+    """
+    grouped: Dict[int, List[Dict[str, Any]]] = defaultdict(list)
+    for record in records:
+        grouped[record["knowledge_base_id"]].append(record)
+
+    # 按主键顺序加锁，避免并发批次之间死锁
+    for kb_id in sorted(grouped):
+        stats = db.query(KnowledgeBaseStats).filter(
+            KnowledgeBaseStats.knowledge_base_id == kb_id
+        ).with_for_update().first()
+        if stats is None:
+            stats = KnowledgeBaseStats(
+                knowledge_base_id=kb_id, query_count=0, scored_count=0, score_sum=0.0, latency_count=0
+            )
+            db.add(stats)
+
+        histogram = json.loads(stats.latency_histogram) if stats.latency_histogram else [0] * len(LATENCY_BUCKETS_MS)
+        for record in grouped[kb_id]:
+            stats.query_count += 1
+            score = record.get("similarity_score")
+            if score is not None:
+                stats.scored_count += 1
+                stats.score_sum += score
+                stats.min_score = score if stats.min_score is None else min(stats.min_score, score)
+            if record.get("latency_ms") is not None:
+                stats.latency_count += 1
+                histogram[bucket_index(record["latency_ms"])] += 1
+            if stats.last_used_at is None or record["created_at"] > stats.last_used_at:
+                stats.last_used_at = record["created_at"]
+        stats.latency_histogram = json.dumps(histogram)
+
+
+def stats_to_dict(stats: Optional[KnowledgeBaseStats]) -> Dict[str, Any]:
+    """将统计行转换为接口返回的字段，没有统计时返回空统计"""
+    if stats is None:
+        return {
+            "query_count": 0,
+            "avg_score": None,
+            "min_score": None,
+            "latency_p50_ms": None,
+            "latency_p95_ms": None,
+            "latency_p99_ms": None,
+            "last_used_at": None,
+        }
+    histogram = json.loads(stats.latency_histogram) if stats.latency_histogram else []
+    return {
+        "query_count": stats.query_count,
+        "avg_score": stats.score_sum / stats.scored_count if stats.scored_count else None,
+        "min_score": stats.min_score,
+        "latency_p50_ms": latency_percentile(histogram, 50),
+        "latency_p95_ms": latency_percentile(histogram, 95),
+        "latency_p99_ms": latency_percentile(histogram, 99),
+        "last_used_at": stats.last_used_at,
+    }
+
+
+def find_idle_knowledge_bases(db: Session, idle_days: int) -> List[KnowledgeBase]:
+    """
+    查找激活状态但超过 idle_days 天未被查询的知识库（从未被查询的知识库按创建时间计算）
+
+    Args:
+        db: 数据库会话
+        idle_days: 未使用的天数
+
+    Returns:
+        知识库列表
+    """
+    cutoff = datetime.utcnow() - timedelta(days=idle_days)
+    return db.query(KnowledgeBase).outerjoin(
+        KnowledgeBaseStats, KnowledgeBaseStats.knowledge_base_id == KnowledgeBase.id
+    ).filter(
+        KnowledgeBase.is_active == True,
+        or_(
+            KnowledgeBaseStats.last_used_at < cutoff,
+            (KnowledgeBaseStats.last_used_at == None) & (KnowledgeBase.created_at < cutoff)
+        )
+    ).all()
+
+
+def main():
+    from .config import settings
+    from .qdrant_collections import set_collection_tier
+    from .qdrant_connection import get_qdrant_client
+    from ..database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="查找长期未使用的知识库")
+    parser.add_argument("--idle-days", type=int, default=30)
+    parser.add_argument("--apply", action="store_true", help="将这些知识库的集合转为冷集合")
+    args = parser.parse_args()
+    if args.apply and settings.VECTOR_STORE_BACKEND == "local":
+        # 本地向量索引没有冷热之分，只列出知识库
+        print("使用本地向量索引，不切换集合存储方式")
+        args.apply = False
+
+    db = SessionLocal()
+    try:
+        idle = find_idle_knowledge_bases(db, args.idle_days)
+        for knowledge_base in idle:
+            print(f"{knowledge_base.id}\t{knowledge_base.collection_name}\t{knowledge_base.name}")
+            if args.apply:
+                try:
+                    set_collection_tier(get_qdrant_client(), knowledge_base.collection_name, cold=True)
+                except Exception as e:
+                    print(f"警告: 切换集合 {knowledge_base.collection_name} 的存储方式失败: {str(e)}")
+        print(f"共 {len(idle)} 个知识库超过 {args.idle_days} 天未使用")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,392 @@
+"""
+知识库导出与导入
+
+在环境之间迁移知识库时不再需要重新上传文档和重新嵌入：导出文件是一个不压缩的tar包，包含
+- manifest.json: 格式版本、知识库记录（名称、描述、嵌入模型、维度）、点数和向量类型
+- vectors.npy: float16 或 int8 向量矩阵；int8 时另有 scales.npy 保存每个向量的缩放系数
+- payloads.jsonl: 每行一个点的ID、文本和元数据，顺序与向量矩阵一致
+
+导出时向量通过memmap逐批写入磁盘，导入时以memmap读取、逐批写入Qdrant，
+多GB的导出文件不需要整体载入内存。VECTOR_STORE_BACKEND=local 时从本地向量索引读取和写入，
+导出文件的格式相同，可以在单机部署和Qdrant部署之间迁移。
+
+命令行用法（在 backend 目录下）:
+    python -m app.core.kb_transfer export --kb-id 3 --output kb3.tar
+    python -m app.core.kb_transfer import --user-id 1 --input kb3.tar
+"""
+import argparse
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import uuid
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .embeddings import EMBEDDING_MODELS, get_embedding_dimension_for
+from .lexical_index import drop_lexical_index, get_lexical_index
+from .local_vectorstore import drop_local_collection, open_local_collection
+from .qdrant_collections import drop_collection, ensure_collection, resolve_collection
+from .qdrant_connection import get_qdrant_client
+from ..database import SessionLocal
+from ..models.knowledge_base import KnowledgeBase
+from ..models.user import User
+
+EXPORT_FORMAT = "knowledge-base-export"
+EXPORT_VERSION = 1
+
+MANIFEST_FILE = "manifest.json"
+VECTORS_FILE = "vectors.npy"
+SCALES_FILE = "scales.npy"
+PAYLOADS_FILE = "payloads.jsonl"
+
+VECTOR_DTYPES = ("float16", "int8")
+
+# 每批读取和写入的点数
+TRANSFER_BATCH_SIZE = 512
+
+
+def encode_vectors(vectors: np.ndarray, dtype: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    压缩向量
+
+    Args:
+        vectors: float32向量矩阵
+        dtype: float16 或 int8
+
+    Returns:
+        (压缩后的向量, int8时每个向量的缩放系数)
+    """
+    if dtype == "float16":
+        return vectors.astype(np.float16), None
+    # 按每个向量的最大绝对值对称量化，还原时乘以缩放系数
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    return np.round(vectors / scales[:, np.newaxis]).astype(np.int8), scales.astype(np.float32)
+
+
+def decode_vectors(vectors: np.ndarray, scales: Optional[np.ndarray]) -> np.ndarray:
+    """还原压缩的向量"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if scales is not None:
+        vectors = vectors * np.asarray(scales, dtype=np.float32)[:, np.newaxis]
+    return vectors
+
+
+# 导出时每批读出的点：(ID列表, float32向量矩阵, payload列表)
+PointBatch = Tuple[List[Any], np.ndarray, List[Dict[str, Any]]]
+
+
+def _scroll_points(client: QdrantClient, collection_name: str) -> Iterator[PointBatch]:
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection_name,
+            limit=TRANSFER_BATCH_SIZE,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True,
+        )
+        if points:
+            yield (
+                [point.id for point in points],
+                np.array([point.vector for point in points], dtype=np.float32),
+                [point.payload or {} for point in points],
+            )
+        if offset is None:
+            return
+
+
+def _read_qdrant_points(client: QdrantClient, collection_name: str) -> Tuple[int, Iterator[PointBatch]]:
+    """返回Qdrant集合的点数和逐批读取的迭代器"""
+    collection_name = resolve_collection(client, collection_name)
+    total = client.count(collection_name=collection_name, exact=True).count
+    return total, _scroll_points(client, collection_name)
+
+
+def _read_local_points(collection_name: str) -> Tuple[int, Iterator[PointBatch]]:
+    """返回本地集合当前有效的点数和逐批读取的迭代器，读取的是调用时的快照"""
+    collection = open_local_collection(collection_name)
+    with collection.lock:
+        collection.refresh()
+        rows = sorted(collection.rows.values())
+        ids, vectors, payloads = collection.ids, collection.vectors, collection.payloads
+
+    def batches() -> Iterator[PointBatch]:
+        for start in range(0, len(rows), TRANSFER_BATCH_SIZE):
+            batch = rows[start:start + TRANSFER_BATCH_SIZE]
+            yield [ids[row] for row in batch], np.asarray(vectors[batch], dtype=np.float32), [payloads[row] for row in batch]
+
+    return len(rows), batches()
+
+
+def export_knowledge_base(
+    knowledge_base: KnowledgeBase,
+    output_path: str,
+    vector_dtype: str = "float16",
+    client: Optional[QdrantClient] = None
+) -> Dict[str, Any]:
+    """
+    将知识库记录、向量和payload导出为tar文件
+
+    导出期间写入的点可能不会包含在导出文件中。
+
+    Args:
+        knowledge_base: 知识库记录
+        output_path: 导出文件路径
+        vector_dtype: 向量存储类型，float16 或 int8
+        client: Qdrant客户端，使用本地向量索引时不需要
+
+    Returns:
+        导出文件的manifest
+    """
+    if vector_dtype not in VECTOR_DTYPES:
+        raise ValueError(f"不支持的向量类型: {vector_dtype}")
+    if knowledge_base.migration_collection:
+        raise ValueError("知识库正在重新嵌入，迁移完成后再导出")
+
+    if settings.VECTOR_STORE_BACKEND == "local":
+        total, batches = _read_local_points(knowledge_base.collection_name)
+    else:
+        total, batches = _read_qdrant_points(client or get_qdrant_client(), knowledge_base.collection_name)
+    dimension = knowledge_base.embedding_dimension or get_embedding_dimension_for(knowledge_base.embedding_model)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        vectors = np.lib.format.open_memmap(
+            os.path.join(workdir, VECTORS_FILE), mode="w+", dtype=vector_dtype, shape=(total, dimension)
+        )
+        scales = None
+        if vector_dtype == "int8":
+            scales = np.lib.format.open_memmap(
+                os.path.join(workdir, SCALES_FILE), mode="w+", dtype=np.float32, shape=(total,)
+            )
+
+        written = 0
+        with open(os.path.join(workdir, PAYLOADS_FILE), "w", encoding="utf-8") as payloads:
+            for point_ids, point_vectors, point_payloads in batches:
+                # 计数之后新增的点超出了预先分配的矩阵，留给下一次导出
+                count = min(len(point_ids), total - written)
+                if count <= 0:
+                    break
+                encoded, point_scales = encode_vectors(point_vectors[:count], vector_dtype)
+                vectors[written:written + count] = encoded
+                if scales is not None:
+                    scales[written:written + count] = point_scales
+                for point_id, payload in zip(point_ids[:count], point_payloads):
+                    payloads.write(json.dumps({
+                        "id": point_id,
+                        "page_content": payload.get("page_content", ""),
+                        "metadata": payload.get("metadata") or {},
+                    }, ensure_ascii=False) + "\n")
+                written += count
+
+        vectors.flush()
+        del vectors
+        if scales is not None:
+            scales.flush()
+            del scales
+
+        manifest = {
+            "format": EXPORT_FORMAT,
+            "version": EXPORT_VERSION,
+            "knowledge_base": {
+                "name": knowledge_base.name,
+                "description": knowledge_base.description,
+                "embedding_model": knowledge_base.embedding_model,
+                "embedding_dimension": dimension,
+                "is_active": knowledge_base.is_active,
+            },
+            # 导出期间删除的点会使实际写入的点数少于矩阵行数，导入时只读取前 points 行
+            "points": written,
+            "vector_dtype": vector_dtype,
+        }
+        with open(os.path.join(workdir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+        with tarfile.open(output_path, "w") as archive:
+            for name in (MANIFEST_FILE, VECTORS_FILE, SCALES_FILE, PAYLOADS_FILE):
+                if os.path.exists(os.path.join(workdir, name)):
+                    archive.add(os.path.join(workdir, name), arcname=name)
+
+    return manifest
+
+
+def _extract_archive(archive_path: str, workdir: str) -> Dict[str, Any]:
+    """解包导出文件并校验manifest，只解出已知的文件名"""
+    try:
+        with tarfile.open(archive_path, "r") as archive:
+            for member in archive.getmembers():
+                if member.name not in (MANIFEST_FILE, VECTORS_FILE, SCALES_FILE, PAYLOADS_FILE) or not member.isfile():
+                    continue
+                with archive.extractfile(member) as source, open(os.path.join(workdir, member.name), "wb") as target:
+                    shutil.copyfileobj(source, target)
+    except tarfile.TarError as e:
+        raise ValueError(f"无法读取导出文件: {e}")
+
+    manifest_path = os.path.join(workdir, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        raise ValueError("导出文件缺少manifest")
+    with open(manifest_path, encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    if manifest.get("format") != EXPORT_FORMAT or manifest.get("version") != EXPORT_VERSION:
+        raise ValueError("不支持的导出文件格式或版本")
+    if manifest.get("vector_dtype") not in VECTOR_DTYPES:
+        raise ValueError(f"不支持的向量类型: {manifest.get('vector_dtype')}")
+
+    embedding_model = manifest["knowledge_base"]["embedding_model"]
+    if embedding_model not in EMBEDDING_MODELS:
+        raise ValueError(f"未注册的嵌入模型: {embedding_model}")
+    if manifest["knowledge_base"]["embedding_dimension"] != get_embedding_dimension_for(embedding_model):
+        raise ValueError("导出文件的向量维度与嵌入模型不一致")
+    return manifest
+
+
+def _iter_batches(workdir: str, manifest: Dict[str, Any]) -> Iterator[Tuple[List[Dict[str, Any]], np.ndarray]]:
+    total = manifest["points"]
+    vectors = np.load(os.path.join(workdir, VECTORS_FILE), mmap_mode="r")
+    scales = None
+    if manifest["vector_dtype"] == "int8":
+        scales = np.load(os.path.join(workdir, SCALES_FILE), mmap_mode="r")
+
+    start = 0
+    records: List[Dict[str, Any]] = []
+    with open(os.path.join(workdir, PAYLOADS_FILE), encoding="utf-8") as payloads:
+        for line in payloads:
+            if start + len(records) >= total:
+                break
+            records.append(json.loads(line))
+            if len(records) == TRANSFER_BATCH_SIZE:
+                end = start + len(records)
+                yield records, decode_vectors(vectors[start:end], None if scales is None else scales[start:end])
+                start, records = end, []
+    if records:
+        end = start + len(records)
+        yield records, decode_vectors(vectors[start:end], None if scales is None else scales[start:end])
+
+
+def import_knowledge_base(
+    db: Session,
+    user_id: int,
+    archive_path: str,
+    name: Optional[str] = None,
+    client: Optional[QdrantClient] = None
+) -> KnowledgeBase:
+    """
+    从导出文件创建新的知识库，向量直接写入Qdrant或本地向量索引，不重新嵌入
+
+    Args:
+        db: 数据库会话
+        user_id: 知识库所属用户
+        archive_path: 导出文件路径
+        name: 新知识库名称，为空时使用导出时的名称
+        client: Qdrant客户端，使用本地向量索引时不需要
+
+    Returns:
+        新的知识库记录
+    """
+    local = settings.VECTOR_STORE_BACKEND == "local"
+    if not local:
+        client = client or get_qdrant_client()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        manifest = _extract_archive(archive_path, workdir)
+        source = manifest["knowledge_base"]
+
+        knowledge_base = KnowledgeBase(
+            user_id=user_id,
+            name=name or source["name"],
+            description=source.get("description"),
+            collection_name=f"user_{user_id}_kb_{uuid.uuid4().hex[:8]}",
+            embedding_model=source["embedding_model"],
+            embedding_dimension=source["embedding_dimension"],
+            is_active=source.get("is_active", True),
+        )
+        db.add(knowledge_base)
+        db.commit()
+        db.refresh(knowledge_base)
+
+        try:
+            if local:
+                collection = open_local_collection(knowledge_base.collection_name)
+                collection.ensure_dimension(knowledge_base.embedding_dimension)
+            else:
+                ensure_collection(
+                    client,
+                    knowledge_base.collection_name,
+                    knowledge_base.embedding_dimension,
+                    cold=not knowledge_base.is_active
+                )
+            # 未启用混合检索时不建词法索引
+            lexical_index = get_lexical_index(knowledge_base.collection_name) if settings.HYBRID_SEARCH else None
+            for records, vectors in _iter_batches(workdir, manifest):
+                payloads = [{"page_content": record["page_content"], "metadata": record["metadata"]} for record in records]
+                if local:
+                    collection.upsert([str(record["id"]) for record in records], vectors, payloads)
+                else:
+                    client.upsert(
+                        collection_name=knowledge_base.collection_name,
+                        points=[
+                            models.PointStruct(id=record["id"], vector=vector.tolist(), payload=payload)
+                            for record, vector, payload in zip(records, vectors, payloads)
+                        ],
+                    )
+                if lexical_index is not None:
+                    lexical_index.add(
+                        [record["id"] for record in records],
+                        [record["page_content"] for record in records],
+                        [record["metadata"] for record in records],
+                    )
+            if lexical_index is not None:
+                lexical_index.mark_ready()
+        except Exception:
+            # 导入失败时删除已创建的集合和记录，不留下只导入了一部分的知识库
+            try:
+                if local:
+                    drop_local_collection(knowledge_base.collection_name)
+                else:
+                    drop_collection(client, knowledge_base.collection_name)
+            except Exception:
+                pass
+            drop_lexical_index(knowledge_base.collection_name)
+            db.delete(knowledge_base)
+            db.commit()
+            raise
+
+    return knowledge_base
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="导出或导入知识库")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="导出知识库")
+    export_parser.add_argument("--kb-id", type=int, required=True)
+    export_parser.add_argument("--output", required=True)
+    export_parser.add_argument("--vector-dtype", choices=VECTOR_DTYPES, default="float16")
+    import_parser = subparsers.add_parser("import", help="导入知识库")
+    import_parser.add_argument("--user-id", type=int, required=True)
+    import_parser.add_argument("--input", required=True)
+    import_parser.add_argument("--name", default=None)
+    args = parser.parse_args()
+
+    session = SessionLocal()
+    try:
+        if args.command == "export":
+            kb = session.query(KnowledgeBase).filter(KnowledgeBase.id == args.kb_id).first()
+            if not kb:
+                raise SystemExit(f"知识库 {args.kb_id} 不存在")
+            result = export_knowledge_base(kb, args.output, args.vector_dtype)
+            print(f"已导出 {result['points']} 个点到 {args.output}")
+        else:
+            if not session.query(User).filter(User.id == args.user_id).first():
+                raise SystemExit(f"用户 {args.user_id} 不存在")
+            kb = import_knowledge_base(session, args.user_id, args.input, args.name)
+            print(f"已导入为知识库 {kb.id}（集合 {kb.collection_name}）")
+    finally:
+        session.close()
@@ -1,9 +1,9 @@
-from langchain_community.llms import Tongyi
 from langchain.prompts import PromptTemplate
 from langchain.chains import LLMChain
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 from typing import List, Dict, Any
 import os
+from .llm import get_tongyi_llm
 
 class LangChainIntegration:
     def __init__(self, tongyi_api_key: str = None):
@@ -15,10 +15,7 @@ class LangChainIntegration:
             raise ValueError("需要阿里云API密钥")
         
         # 初始化语言模型（使用阿里云Qwen）
-        self.llm = Tongyi(
-            dashscope_api_key=api_key,
-            model_name="qwen-plus"  # 可以根据需要更换为 qwen-turbo 或 qwen-max
-        )
+        self.llm = get_tongyi_llm(api_key, "qwen-plus")  # 可以根据需要更换为 qwen-turbo 或 qwen-max
         
         # 定义面试助手的系统提示
         self.system_prompt = """你是一个专业的技术面试官和职业顾问。你的任务是：
@@ -0,0 +1,491 @@
+"""
+BM25词法索引与混合检索
+
+MiniLM向量检索容易漏掉精确的技术术语（库名、错误码、命令等）。每个集合在向量之外
+维护一个BM25倒排索引：英文和数字按完整词切分，中文按字符二元组切分。检索时向量检索与
+词法检索并行执行，用倒数排名融合（RRF）合并结果；词法检索超出延迟预算时直接返回向量结果。
+
+索引以追加写入的 docs.jsonl 持久化在 LEXICAL_INDEX_DIR 下，每个进程在检索前读取其它进程
+追加的内容。多个worker写同一个索引时，追加、压缩和重建都持有目录旁的锁文件（<目录>.lock），
+写入前先读入其它进程追加的内容，写入后的读取偏移量取文件的实际大小；文件被压缩或重建替换后
+（inode变化）其它进程重新加载整个文件。
+
+删除和替换只追加记录，已失效的文档超过有效文档数（且不少于 COMPACT_MIN_DEAD）时重写文件压缩。
+"""
+import json
+import logging
+import math
+import os
+import re
+import shutil
+import threading
+import time
+import warnings
+from collections import Counter, OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .config import settings
+from .qdrant_collections import get_collection_dimension
+from .search_filters import matches_filters
+from ..utils.file_lock import file_lock
+
+logger = logging.getLogger(__name__)
+
+DOCS_FILE = "docs.jsonl"
+# 索引包含集合全部文档的标记：新建集合时或从Qdrant重建完成后写入
+READY_FILE = "ready"
+
+# 已删除或被替换的文档达到该数量且超过有效文档数时压缩索引
+COMPACT_MIN_DEAD = 1000
+
+# BM25参数
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# 倒数排名融合的平滑常数
+RRF_K = 60
+
+# 英文、数字及常见技术术语中的连接符（如 std::vector、ERR_CONNECTION_RESET、C++、node.js）
+_TERM = re.compile(r"[a-z0-9][a-z0-9_+#.:\-]*[a-z0-9+#]|[a-z0-9]")
+_CJK_RUN = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+")
+
+# 词法检索在后台线程中执行，与向量检索并行
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="lexical")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    切分检索词：英文和数字按词，中文按相邻两个字符
+
+    Args:
+        text: 文本
+
+    Returns:
+        检索词列表
+    """
+    text = text.lower()
+    terms = _TERM.findall(text)
+    for run in _CJK_RUN.findall(text):
+        if len(run) == 1:
+            terms.append(run)
+        else:
+            terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return terms
+
+
+class LexicalIndex:
+    """
+    一个集合的BM25倒排索引，persist_directory为空时只保存在内存中
+    """
+
+    def __init__(self, persist_directory: Optional[str] = None):
+        self.persist_directory = persist_directory
+        self.lock = threading.RLock()
+        self.postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self.doc_ids: List[str] = []
+        self.doc_lengths: List[int] = []
+        self.documents: List[Dict[str, Any]] = []
+        self.positions: Dict[str, int] = {}
+        self.total_length = 0
+        self._file_offset = 0
+        self._file_inode: Optional[int] = None
+        self.refresh()
+
+    @property
+    def ready(self) -> bool:
+        """索引是否包含集合的全部文档"""
+        return self.persist_directory is None or os.path.exists(os.path.join(self.persist_directory, READY_FILE))
+
+    def mark_ready(self) -> None:
+        """标记索引已包含集合的全部文档"""
+        if self.persist_directory:
+            os.makedirs(self.persist_directory, exist_ok=True)
+            open(os.path.join(self.persist_directory, READY_FILE), "w").close()
+
+    def _docs_path(self) -> str:
+        return os.path.join(self.persist_directory, DOCS_FILE)
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def _reset(self) -> None:
+        self.postings = defaultdict(dict)
+        self.doc_ids = []
+        self.doc_lengths = []
+        self.documents = []
+        self.positions = {}
+        self.total_length = 0
+        self._file_offset = 0
+        self._file_inode = None
+
+    def refresh(self) -> None:
+        """读取其它进程追加到索引文件中的内容，文件被压缩或重建替换后重新加载"""
+        if self.persist_directory is None:
+            return
+        with self.lock:
+            try:
+                f = open(self._docs_path(), "rb")
+            except FileNotFoundError:
+                # 索引被删除
+                if self._file_inode is not None:
+                    self._reset()
+                return
+            with f:
+                stat = os.fstat(f.fileno())
+                if stat.st_ino != self._file_inode or stat.st_size < self._file_offset:
+                    # 文件被替换，原来的读取偏移量已失效
+                    self._reset()
+                    self._file_inode = stat.st_ino
+                if stat.st_size <= self._file_offset:
+                    return
+                f.seek(self._file_offset)
+                for line in f:
+                    # 只处理完整写入的行，未写完的行留到下次读取
+                    if not line.endswith(b"\n"):
+                        break
+                    self._file_offset += len(line)
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        warnings.warn(f"词法索引 {self.persist_directory} 中有无法解析的记录，已跳过")
+                        continue
+                    self._apply(record)
+
+    def _apply(self, record: Dict[str, Any]) -> None:
+        if record.get("deleted"):
+            self._remove(record["id"])
+            return
+        if record["id"] in self.positions:
+            self._remove(record["id"])
+
+        position = len(self.doc_ids)
+        terms = Counter(tokenize(record["page_content"]))
+        for term, frequency in terms.items():
+            self.postings[term][position] = frequency
+        length = sum(terms.values())
+        self.doc_ids.append(record["id"])
+        self.doc_lengths.append(length)
+        self.documents.append({"page_content": record["page_content"], "metadata": record.get("metadata") or {}})
+        self.positions[record["id"]] = position
+        self.total_length += length
+
+    def _remove(self, doc_id: str) -> None:
+        position = self.positions.pop(doc_id, None)
+        if position is None:
+            return
+        for term in set(tokenize(self.documents[position]["page_content"])):
+            self.postings[term].pop(position, None)
+        self.total_length -= self.doc_lengths[position]
+
+    def _append(self, records: List[Dict[str, Any]]) -> None:
+        with self.lock:
+            if self.persist_directory:
+                os.makedirs(self.persist_directory, exist_ok=True)
+                data = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records).encode("utf-8")
+                with file_lock(_lock_path(self.persist_directory)):
+                    # 持有锁时先读入其它进程追加的内容，写入后读取偏移量即为文件的实际大小
+                    self.refresh()
+                    with open(self._docs_path(), "ab") as f:
+                        f.write(data)
+                        f.flush()
+                        stat = os.fstat(f.fileno())
+                    self._file_inode = stat.st_ino
+                    self._file_offset = stat.st_size
+            for record in records:
+                self._apply(record)
+            self._maybe_compact()
+
+    def _live_records(self) -> List[Dict[str, Any]]:
+        return [
+            {"id": doc_id, **self.documents[position]}
+            for doc_id, position in sorted(self.positions.items(), key=lambda item: item[1])
+        ]
+
+    def _maybe_compact(self) -> None:
+        dead = len(self.doc_ids) - len(self.positions)
+        if dead >= COMPACT_MIN_DEAD and dead > len(self.positions):
+            self.compact()
+
+    def compact(self) -> None:
+        """丢弃已删除和被替换的文档，持久化的索引同时重写文件"""
+        with self.lock:
+            if self.persist_directory is None:
+                records = self._live_records()
+                self._reset()
+                for record in records:
+                    self._apply(record)
+                return
+
+            with file_lock(_lock_path(self.persist_directory)):
+                self.refresh()
+                records = self._live_records()
+                temporary = self._docs_path() + ".compact"
+                with open(temporary, "wb") as f:
+                    f.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records).encode("utf-8"))
+                # 替换后其它进程按inode变化重新加载
+                os.replace(temporary, self._docs_path())
+                self._reset()
+                self.refresh()
+
+    def add(self, ids: List[str], texts: List[str], metadatas: Optional[List[Dict[str, Any]]] = None) -> None:
+        """添加文档，已有ID的文档被替换"""
+        metadatas = metadatas or [{} for _ in texts]
+        self._append([
+            {"id": str(doc_id), "page_content": text, "metadata": metadata}
+            for doc_id, text, metadata in zip(ids, texts, metadatas)
+        ])
+
+    def delete(self, ids: List[str]) -> None:
+        """删除文档"""
+        self._append([{"id": str(doc_id), "deleted": True} for doc_id in ids])
+
+    def search(
+        self, query: str, k: int = 4, filters: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        BM25检索
+
+        Args:
+            query: 查询文本
+            k: 返回结果数量
+            filters: 元数据过滤条件
+
+        Returns:
+            (文档, BM25分数) 列表，按分数降序
+        """
+        self.refresh()
+        with self.lock:
+            count = len(self.positions)
+            if not count:
+                return []
+            average_length = self.total_length / count
+
+            scores: Dict[int, float] = defaultdict(float)
+            for term in set(tokenize(query)):
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for position, frequency in postings.items():
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[position] / average_length)
+                    scores[position] += idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+
+            if filters:
+                scores = {
+                    position: score for position, score in scores.items()
+                    if matches_filters(self.documents[position]["metadata"], filters)
+                }
+            top = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+            return [(self.documents[position], score) for position, score in top]
+
+
+# 每个目录只打开一次，同一进程中的多个管道实例共享索引；最多保留 LEXICAL_INDEX_CACHE_SIZE 个，
+# 超出时淘汰最久未使用的索引（仍持有它的管道可以继续使用）
+_indexes: "OrderedDict[str, LexicalIndex]" = OrderedDict()
+_indexes_lock = threading.Lock()
+_rebuilding = set()
+
+
+def _lock_path(directory: str) -> str:
+    """索引目录的锁文件，放在目录之外，重建替换目录时锁不随目录一起被替换"""
+    return directory.rstrip(os.sep) + ".lock"
+
+
+def get_lexical_index_dir(collection_name: str) -> str:
+    """获取集合词法索引的持久化目录"""
+    return os.path.join(settings.LEXICAL_INDEX_DIR, collection_name)
+
+
+def get_lexical_index(collection_name: str) -> LexicalIndex:
+    """打开集合的词法索引"""
+    path = get_lexical_index_dir(collection_name)
+    with _indexes_lock:
+        if path in _indexes:
+            _indexes.move_to_end(path)
+            return _indexes[path]
+        index = _indexes[path] = LexicalIndex(path)
+        while len(_indexes) > settings.LEXICAL_INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+        return index
+
+
+def drop_lexical_index(collection_name: str) -> None:
+    """删除集合的词法索引"""
+    path = get_lexical_index_dir(collection_name)
+    with _indexes_lock:
+        _indexes.pop(path, None)
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def rebuild_from_qdrant(client, collection_name: str, batch_size: int = 512) -> int:
+    """
+    从Qdrant集合的payload重建词法索引，用于启用混合检索之前创建的集合
+
+    Returns:
+        索引的文档数
+    """
+    if get_collection_dimension(client, collection_name) is None:
+        # 集合尚未创建，空索引即完整
+        get_lexical_index(collection_name).mark_ready()
+        return 0
+
+    path = get_lexical_index_dir(collection_name)
+    building = path + ".building"
+    shutil.rmtree(building, ignore_errors=True)
+    index = LexicalIndex(building)
+
+    offset = None
+    indexed = 0
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection_name,
+            limit=batch_size,
+            offset=offset,
+            with_payload=True,
+            with_vectors=False,
+        )
+        if points:
+            index.add(
+                [str(point.id) for point in points],
+                [(point.payload or {}).get("page_content") or "" for point in points],
+                [(point.payload or {}).get("metadata") or {} for point in points],
+            )
+            indexed += len(points)
+        if offset is None:
+            break
+
+    # 重建期间新写入的文档追加在原目录的文件中，持有原索引的锁（包括其它进程共用的锁文件）将其并入后再替换目录
+    current = get_lexical_index(collection_name)
+    with current.lock, file_lock(_lock_path(path)), _indexes_lock:
+        if os.path.exists(os.path.join(path, DOCS_FILE)):
+            with open(os.path.join(path, DOCS_FILE), "rb") as source, open(os.path.join(building, DOCS_FILE), "ab") as target:
+                shutil.copyfileobj(source, target)
+        index.mark_ready()
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(building, path)
+        _indexes.pop(path, None)
+    # 重建用的临时目录只在本函数中写入，它的锁文件不再需要
+    if os.path.exists(_lock_path(building)):
+        os.remove(_lock_path(building))
+    return indexed
+
+
+def ensure_lexical_index(client, collection_name: str) -> LexicalIndex:
+    """
+    获取集合的词法索引，索引不存在且集合在Qdrant中时在后台重建，重建完成前索引不可用
+
+    Args:
+        client: Qdrant客户端，为空时不重建
+        collection_name: 集合名称
+    """
+    index = get_lexical_index(collection_name)
+    if index.ready or client is None:
+        return index
+
+    with _indexes_lock:
+        if collection_name in _rebuilding:
+            return index
+        _rebuilding.add(collection_name)
+
+    def rebuild():
+        try:
+            rebuild_from_qdrant(client, collection_name)
+        except Exception as e:
+            logger.warning("重建集合 %s 的词法索引失败: %s", collection_name, e)
+        finally:
+            with _indexes_lock:
+                _rebuilding.discard(collection_name)
+
+    threading.Thread(target=rebuild, name=f"lexical-rebuild-{collection_name}", daemon=True).start()
+    return index
+
+
+def reciprocal_rank_fusion(result_lists: List[List[Dict[str, Any]]], k: int = RRF_K) -> List[Dict[str, Any]]:
+    """
+    倒数排名融合：每个结果的融合分数为它在各列表中 1 / (k + 排名) 之和，以文本内容去重
+
+    Args:
+        result_lists: 按相关度降序的结果列表，每个结果包含 content 和 metadata
+        k: 平滑常数
+
+    Returns:
+        融合后按 rrf_score 降序的结果，原列表中的字段保留；score 仍为向量相似度，
+        只由词法检索命中的结果没有向量相似度，score 为None
+    """
+    fused: Dict[str, Dict[str, Any]] = {}
+    for results in result_lists:
+        for rank, result in enumerate(results, start=1):
+            entry = fused.get(result["content"])
+            if entry is None:
+                entry = fused[result["content"]] = {"score": None, **result, "rrf_score": 0.0}
+            else:
+                for key, value in result.items():
+                    if entry.get(key) is None:
+                        entry[key] = value
+            entry["rrf_score"] += 1.0 / (k + rank)
+    return sorted(fused.values(), key=lambda entry: entry["rrf_score"], reverse=True)
+
+
+def hybrid_search(
+    vector_search: Callable[[str, int], List[Dict[str, Any]]],
+    index: LexicalIndex,
+    query: str,
+    k: int = 4,
+    budget_ms: Optional[float] = None,
+    filters: Optional[Dict[str, Any]] = None,
+    score_threshold: Optional[float] = None
+) -> List[Dict[str, Any]]:
+    """
+    并行执行向量检索和词法检索并用RRF融合
+
+    向量检索完成后最多再等待词法检索 budget_ms 毫秒，超时、出错或词法索引不可用时只返回向量结果。
+
+    Args:
+        vector_search: 向量检索函数，返回包含 content、metadata、score 的结果
+        index: 词法索引
+        query: 查询文本
+        k: 返回结果数量
+        budget_ms: 词法检索的延迟预算（毫秒），为空时使用配置
+        filters: 词法检索的元数据过滤条件，向量检索的过滤由 vector_search 自行处理
+        score_threshold: 向量相似度阈值，由 vector_search 过滤；设置时不返回只由词法检索命中、
+            没有向量相似度的结果
+
+    Returns:
+        检索结果，按 rrf_score 排序；score 为向量相似度（只由词法检索命中时为None），
+        lexical_score 为BM25分数
+    """
+    budget_ms = settings.HYBRID_LEXICAL_BUDGET_MS if budget_ms is None else budget_ms
+    # 两路各多取一些候选，融合后再截断
+    candidates = k * 2
+
+    lexical_future = None
+    if index.ready:
+        lexical_future = _executor.submit(index.search, query, candidates, filters)
+
+    vector_results = vector_search(query, candidates)
+    if lexical_future is None:
+        return vector_results[:k]
+
+    started = time.perf_counter()
+    try:
+        lexical_hits = lexical_future.result(timeout=budget_ms / 1000)
+    except TimeoutError:
+        logger.warning(
+            "词法检索超出 %sms 预算（已等待 %.1fms），仅返回向量结果",
+            budget_ms,
+            (time.perf_counter() - started) * 1000
+        )
+        return vector_results[:k]
+    except Exception as e:
+        logger.warning("词法检索失败，仅返回向量结果: %s", e)
+        return vector_results[:k]
+
+    lexical_results = [
+        {"content": document["page_content"], "metadata": document["metadata"], "lexical_score": score}
+        for document, score in lexical_hits
+    ]
+    fused = reciprocal_rank_fusion([vector_results, lexical_results])
+    if score_threshold is not None:
+        fused = [result for result in fused if result["score"] is not None]
+    return fused[:k]
@@ -0,0 +1,26 @@
+"""
+语言模型客户端
+
+Tongyi客户端在进程内按 (API密钥, 模型) 复用，避免每个请求重复创建。
+"""
+from functools import lru_cache
+
+from langchain_community.llms import Tongyi
+
+
+@lru_cache(maxsize=8)
+def get_tongyi_llm(api_key: str, model_name: str = "qwen-plus") -> Tongyi:
+    """
+    获取Tongyi语言模型客户端
+
+    Args:
+        api_key: 阿里云API密钥
+        model_name: 模型名称
+
+    Returns:
+        Tongyi客户端
+    """
+    return Tongyi(
+        dashscope_api_key=api_key,
+        model_name=model_name
+    )
@@ -0,0 +1,583 @@
+"""
+进程内向量索引
+
+Qdrant不可用时管道原本直接把 vectorstore 置为None，所有查询都返回"知识库不可用"。
+这里实现一个与LangChain Qdrant封装接口一致的本地向量库：
+- 向量归一化后以float32追加写入 vectors.f32，读取时以memmap映射，不需要整体载入内存
+- 点数较少时直接暴力计算余弦相似度；超过 LOCAL_IVF_MIN_POINTS 后构建IVF倒排索引，
+  检索时只扫描距离查询最近的 nprobe 个聚类
+- 文本和元数据保存在 payloads.jsonl，删除的点记录在 deleted.json 中
+
+可用于Qdrant不可用时的后备、单机部署以及离线测试和基准测试。
+已有Qdrant集合可以通过以下命令同步到本地（在 backend 目录下）:
+    python -m app.core.local_vectorstore --sync global_knowledge
+"""
+import argparse
+import json
+import os
+import shutil
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
+
+from .config import settings
+from .search_filters import matches_filters
+from ..utils.file_lock import file_lock
+
+VECTORS_FILE = "vectors.f32"
+PAYLOADS_FILE = "payloads.jsonl"
+DELETED_FILE = "deleted.json"
+META_FILE = "meta.json"
+IVF_FILE = "ivf.npz"
+
+# IVF聚类时k-means的迭代次数和每个聚类的训练样本数
+IVF_KMEANS_ITERATIONS = 10
+IVF_SAMPLES_PER_LIST = 64
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+
+def train_ivf(vectors: np.ndarray, n_lists: int, seed: int = 0) -> np.ndarray:
+    """
+    用球面k-means训练IVF聚类中心
+
+    Args:
+        vectors: 归一化后的向量
+        n_lists: 聚类数
+        seed: 随机种子
+
+    Returns:
+        归一化后的聚类中心
+    """
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), n_lists * IVF_SAMPLES_PER_LIST)
+    sample = np.asarray(vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))])
+    centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+
+    for _ in range(IVF_KMEANS_ITERATIONS):
+        assignments = np.argmax(sample @ centroids.T, axis=1)
+        for list_id in range(n_lists):
+            members = sample[assignments == list_id]
+            if len(members):
+                centroids[list_id] = members.mean(axis=0)
+        centroids = _normalize(centroids)
+    return centroids.astype(np.float32)
+
+
+def _signature(path: str) -> Optional[Tuple[int, int]]:
+    """文件的 (inode, 修改时间)，用于判断其它进程是否替换了文件"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
+
+
+class ReadOnlyVectorStoreError(RuntimeError):
+    """向量库只读时写入"""
+
+
+class LocalCollection:
+    """
+    一个本地集合的向量、payload和IVF索引，persist_directory为空时只保存在内存中
+
+    多个worker共享同一个目录时，写入和删除都持有目录旁的锁文件（<目录>.lock），修改前先读入
+    其它进程写入的点和删除标记；检索前同样读入其它进程的修改。deleted.json 和 ivf.npz
+    写入临时文件后整体替换，读取时不会读到写了一半的文件。
+    """
+
+    def __init__(self, persist_directory: Optional[str] = None):
+        self.persist_directory = persist_directory
+        self.lock = threading.RLock()
+        self._reset()
+        self.refresh()
+
+    def _reset(self) -> None:
+        self.dimension: Optional[int] = None
+        self.ids: List[str] = []
+        self.payloads: List[Dict[str, Any]] = []
+        # 每个ID当前有效的点下标
+        self.rows: Dict[str, int] = {}
+        self.deleted = set()
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        self.centroids: Optional[np.ndarray] = None
+        self.assignments = np.zeros(0, dtype=np.int32)
+        self._ivf_size = 0
+        self._payload_offset = 0
+        self._payload_inode: Optional[int] = None
+        self._deleted_signature = None
+        self._ivf_signature = None
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.persist_directory, name)
+
+    def _lock_path(self) -> str:
+        # 放在目录之外，同步时删除重建目录不影响锁
+        return self.persist_directory.rstrip(os.sep) + ".lock"
+
+    def _replace_file(self, name: str, write: Callable[[Any], None]) -> None:
+        temporary = self._path(name + ".tmp")
+        with open(temporary, "wb") as f:
+            write(f)
+        os.replace(temporary, self._path(name))
+
+    def refresh(self) -> None:
+        """读取其它进程写入的点、删除标记和IVF索引"""
+        if not self.persist_directory:
+            return
+        with self.lock:
+            try:
+                payloads = open(self._path(PAYLOADS_FILE), "rb")
+            except FileNotFoundError:
+                # 集合被删除
+                if self._payload_inode is not None:
+                    self._reset()
+                return
+            with payloads:
+                stat = os.fstat(payloads.fileno())
+                if stat.st_ino != self._payload_inode or stat.st_size < self._payload_offset:
+                    # 集合被删除后重新创建
+                    self._reset()
+                    self._payload_inode = stat.st_ino
+                if self.dimension is None:
+                    with open(self._path(META_FILE), encoding="utf-8") as f:
+                        self.dimension = json.load(f)["dimension"]
+                payloads.seek(self._payload_offset)
+                for line in payloads:
+                    # 只读取完整写入的行
+                    if not line.endswith(b"\n"):
+                        break
+                    self._payload_offset += len(line)
+                    record = json.loads(line)
+                    self.ids.append(record["id"])
+                    self.payloads.append({"page_content": record["page_content"], "metadata": record["metadata"]})
+
+            # 进程意外退出或其它进程正在写入时两个文件的点数可能不同，只使用两者都已写入的点
+            previous = len(self._vectors)
+            count = min(len(self.ids), os.path.getsize(self._path(VECTORS_FILE)) // (4 * self.dimension))
+            if count != previous:
+                self._map_vectors(count)
+            for row in range(previous, count):
+                if row not in self.deleted:
+                    self.rows[self.ids[row]] = row
+
+            deleted_signature = _signature(self._path(DELETED_FILE))
+            if deleted_signature is not None and deleted_signature != self._deleted_signature:
+                with open(self._path(DELETED_FILE), encoding="utf-8") as f:
+                    deleted = set(json.load(f))
+                for row in deleted - self.deleted:
+                    if row < count and self.rows.get(self.ids[row]) == row:
+                        del self.rows[self.ids[row]]
+                self.deleted = deleted
+                self._deleted_signature = deleted_signature
+
+            ivf_signature = _signature(self._path(IVF_FILE))
+            if ivf_signature is not None and ivf_signature != self._ivf_signature:
+                ivf = np.load(self._path(IVF_FILE))
+                self.centroids = ivf["centroids"]
+                self._ivf_size = int(ivf["size"])
+                self._ivf_signature = ivf_signature
+                self.assignments = self._assign(self.vectors) if count else np.zeros(0, dtype=np.int32)
+            elif self.centroids is not None and len(self.assignments) < count:
+                self.assignments = np.concatenate(
+                    [self.assignments, self._assign(self.vectors[len(self.assignments):])]
+                )
+
+    def _discard_partial_writes(self) -> None:
+        """截掉只写入了payload或只写入了向量的点，之后追加的点两个文件的下标一致"""
+        count = len(self._vectors)
+        if len(self.ids) > count or os.path.getsize(self._path(PAYLOADS_FILE)) > self._payload_offset:
+            with open(self._path(PAYLOADS_FILE), "rb") as f:
+                offset = sum(len(line) for _, line in zip(range(count), f))
+            os.truncate(self._path(PAYLOADS_FILE), offset)
+            self._payload_offset = offset
+            del self.ids[count:], self.payloads[count:]
+        if os.path.getsize(self._path(VECTORS_FILE)) > count * 4 * self.dimension:
+            os.truncate(self._path(VECTORS_FILE), count * 4 * self.dimension)
+
+    @contextmanager
+    def _mutation(self) -> Iterator[None]:
+        """修改集合：持有锁并先读入其它进程的修改"""
+        with self.lock:
+            if not self.persist_directory:
+                yield
+                return
+            os.makedirs(os.path.dirname(self._lock_path()) or ".", exist_ok=True)
+            with file_lock(self._lock_path()):
+                self.refresh()
+                if self.dimension is not None:
+                    self._discard_partial_writes()
+                yield
+
+    def _map_vectors(self, count: int) -> None:
+        if count:
+            self._vectors = np.memmap(self._path(VECTORS_FILE), dtype=np.float32, mode="r", shape=(count, self.dimension))
+        else:
+            self._vectors = np.zeros((0, self.dimension), dtype=np.float32)
+
+    @property
+    def vectors(self) -> np.ndarray:
+        return self._vectors
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def ensure_dimension(self, dimension: int) -> bool:
+        """
+        设置集合的向量维度
+
+        Returns:
+            本次是否新建了集合
+        """
+        with self._mutation():
+            return self._ensure_dimension(dimension)
+
+    def _ensure_dimension(self, dimension: int) -> bool:
+        if self.dimension is not None:
+            if self.dimension != dimension:
+                raise ValueError(f"本地集合的向量维度为 {self.dimension}，与当前嵌入模型的维度 {dimension} 不一致")
+            return False
+
+        self.dimension = dimension
+        self._vectors = np.zeros((0, dimension), dtype=np.float32)
+        if self.persist_directory:
+            os.makedirs(self.persist_directory, exist_ok=True)
+            # 先写维度，其它进程看到payload文件时总能读到维度
+            with open(self._path(META_FILE), "w", encoding="utf-8") as f:
+                json.dump({"dimension": dimension}, f)
+            open(self._path(VECTORS_FILE), "wb").close()
+            open(self._path(PAYLOADS_FILE), "wb").close()
+            self._payload_inode = os.stat(self._path(PAYLOADS_FILE)).st_ino
+        return True
+
+    def upsert(self, ids: List[str], vectors: np.ndarray, payloads: List[Dict[str, Any]]) -> None:
+        """
+        追加写入点，已有ID的旧点标记为删除
+        """
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+        with self._mutation():
+            self._ensure_dimension(vectors.shape[1])
+            self._mark_deleted(ids)
+
+            start = len(self.ids)
+            if self.persist_directory:
+                data = "".join(
+                    json.dumps({"id": point_id, **payload}, ensure_ascii=False) + "\n"
+                    for point_id, payload in zip(ids, payloads)
+                ).encode("utf-8")
+                # 先写payload再写向量，读取时以两者中较少的点数为准
+                with open(self._path(PAYLOADS_FILE), "ab") as f:
+                    f.write(data)
+                with open(self._path(VECTORS_FILE), "ab") as f:
+                    f.write(vectors.tobytes())
+                self._payload_offset += len(data)
+                self._map_vectors(start + len(ids))
+            else:
+                self._vectors = np.concatenate([self._vectors, vectors])
+
+            self.ids.extend(ids)
+            self.payloads.extend(payloads)
+            for row, point_id in enumerate(ids, start=start):
+                self.rows[point_id] = row
+            if self.centroids is not None:
+                self.assignments = np.concatenate([self.assignments, self._assign(vectors)])
+            self._maybe_build_ivf()
+
+    def _mark_deleted(self, ids: Iterable[str]) -> None:
+        rows = [self.rows.pop(point_id) for point_id in set(ids) if point_id in self.rows]
+        if not rows:
+            return
+        self.deleted.update(rows)
+        if self.persist_directory:
+            self._replace_file(DELETED_FILE, lambda f: f.write(json.dumps(sorted(self.deleted)).encode("utf-8")))
+            self._deleted_signature = _signature(self._path(DELETED_FILE))
+
+    def delete(self, ids: List[str]) -> None:
+        with self._mutation():
+            self._mark_deleted(ids)
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        return np.argmax(np.asarray(vectors) @ self.centroids.T, axis=1).astype(np.int32)
+
+    def _maybe_build_ivf(self) -> None:
+        """点数超过阈值后构建IVF索引，点数翻倍后重新训练聚类中心"""
+        count = len(self.ids)
+        if count < settings.LOCAL_IVF_MIN_POINTS or (self.centroids is not None and count < 2 * self._ivf_size):
+            return
+        n_lists = max(int(np.sqrt(count)), 1)
+        self.centroids = train_ivf(self.vectors, n_lists)
+        self.assignments = self._assign(self.vectors)
+        self._ivf_size = count
+        if self.persist_directory:
+            self._replace_file(IVF_FILE, lambda f: np.savez(f, centroids=self.centroids, size=count))
+            self._ivf_signature = _signature(self._path(IVF_FILE))
+
+    def search(
+        self,
+        vector: List[float],
+        k: int,
+        nprobe: Optional[int] = None,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        检索余弦相似度最高的点
+
+        Args:
+            vector: 查询向量
+            k: 返回结果数量
+            nprobe: IVF检索时扫描的聚类数，为空时使用配置
+            filters: 元数据过滤条件，在计算相似度之前筛选候选点
+
+        Returns:
+            (点下标, 相似度) 列表，按相似度降序
+        """
+        query = _normalize(np.asarray([vector], dtype=np.float32))[0]
+        self.refresh()
+        with self.lock:
+            vectors = self.vectors
+            if not len(vectors):
+                return []
+
+            if self.centroids is not None:
+                nprobe = min(nprobe or settings.LOCAL_IVF_NPROBE, len(self.centroids))
+                probes = np.argsort(-(self.centroids @ query))[:nprobe]
+                candidates = np.flatnonzero(np.isin(self.assignments, probes))
+            else:
+                candidates = np.arange(len(vectors))
+            if self.deleted:
+                candidates = candidates[~np.isin(candidates, list(self.deleted))]
+            if filters:
+                candidates = np.array(
+                    [i for i in candidates if matches_filters(self.payloads[i]["metadata"], filters)], dtype=np.int64
+                )
+            if not len(candidates):
+                return []
+
+            scores = np.asarray(vectors[candidates]) @ query
+            top = np.argsort(-scores)[:k]
+            return [(int(candidates[i]), float(scores[i])) for i in top]
+
+
+# 每个目录只打开一次，同一进程中的多个管道实例共享集合
+_collections: Dict[str, LocalCollection] = {}
+_collections_lock = threading.Lock()
+
+
+def get_local_collection_dir(collection_name: str) -> str:
+    """获取本地集合的持久化目录"""
+    return os.path.join(settings.LOCAL_VECTOR_DIR, collection_name)
+
+
+def open_local_collection(collection_name: str) -> LocalCollection:
+    """打开本地集合，不存在时在首次写入时创建"""
+    path = get_local_collection_dir(collection_name)
+    with _collections_lock:
+        if path not in _collections:
+            _collections[path] = LocalCollection(path)
+        return _collections[path]
+
+
+def drop_local_collection(collection_name: str) -> None:
+    """删除本地集合及其文件"""
+    path = get_local_collection_dir(collection_name)
+    with _collections_lock, file_lock(path.rstrip(os.sep) + ".lock"):
+        _collections.pop(path, None)
+        shutil.rmtree(path, ignore_errors=True)
+
+
+class LocalVectorStore(VectorStore):
+    """
+    基于本地集合的LangChain向量库，检索接口和返回的分数与Qdrant封装一致
+    """
+
+    def __init__(
+        self,
+        collection_name: str,
+        embeddings: Embeddings,
+        collection: Optional[LocalCollection] = None,
+        read_only: bool = False
+    ):
+        """
+        Args:
+            collection_name: 集合名称
+            embeddings: 嵌入模型
+            collection: 本地集合，为空时打开 LOCAL_VECTOR_DIR 下的同名集合
+            read_only: 为True时拒绝写入和删除。作为Qdrant不可用时的后备只提供检索，
+                写入本地的文档不会回到Qdrant，两边的数据会不一致
+        """
+        self.collection_name = collection_name
+        self._embeddings = embeddings
+        self.collection = collection if collection is not None else open_local_collection(collection_name)
+        self.read_only = read_only
+
+    def _check_writable(self) -> None:
+        if self.read_only:
+            raise ReadOnlyVectorStoreError(f"Qdrant不可用，集合 {self.collection_name} 的本地后备索引只读，请稍后重试")
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embeddings
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        batch_size: int = 64,
+        **kwargs: Any
+    ) -> List[str]:
+        self._check_writable()
+        texts = list(texts)
+        ids = list(ids) if ids else [uuid.uuid4().hex for _ in texts]
+        metadatas = metadatas or [{} for _ in texts]
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            self.collection.upsert(
+                ids[start:start + batch_size],
+                np.array(self._embeddings.embed_documents(batch), dtype=np.float32),
+                [
+                    {"page_content": text, "metadata": metadata}
+                    for text, metadata in zip(batch, metadatas[start:start + batch_size])
+                ],
+            )
+        return ids
+
+    def _search(
+        self,
+        embedding: List[float],
+        k: int,
+        filter: Optional[Dict[str, Any]] = None,
+        score_threshold: Optional[float] = None,
+        nprobe: Optional[int] = None
+    ) -> List[Tuple[int, float]]:
+        hits = self.collection.search(embedding, k, nprobe=nprobe, filters=filter)
+        if score_threshold is not None:
+            hits = [(index, score) for index, score in hits if score >= score_threshold]
+        return hits
+
+    def _to_document(self, index: int) -> Document:
+        payload = self.collection.payloads[index]
+        return Document(page_content=payload["page_content"], metadata=payload["metadata"])
+
+    def similarity_search_with_score_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        filter: Optional[Dict[str, Any]] = None,
+        score_threshold: Optional[float] = None,
+        **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        # filter 为 search_filters 中的元数据过滤条件（字典），而不是Qdrant的Filter
+        hits = self._search(embedding, k, filter, score_threshold, kwargs.get("nprobe"))
+        return [(self._to_document(index), score) for index, score in hits]
+
+    def max_marginal_relevance_search_with_score_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        filter: Optional[Dict[str, Any]] = None,
+        score_threshold: Optional[float] = None,
+        **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        hits = self._search(embedding, fetch_k, filter, score_threshold, kwargs.get("nprobe"))
+        if not hits:
+            return []
+        vectors = np.asarray(self.collection.vectors[[index for index, _ in hits]])
+        selected = maximal_marginal_relevance(np.asarray(embedding), vectors, k=k, lambda_mult=lambda_mult)
+        return [(self._to_document(hits[i][0]), hits[i][1]) for i in selected]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        # search_params等Qdrant专用参数在本地检索时忽略
+        return self.similarity_search_with_score_by_vector(self._embeddings.embed_query(query), k, **kwargs)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        self._check_writable()
+        if ids:
+            self.collection.delete(ids)
+        return True
+
+    def _select_relevance_score_fn(self):
+        return self._cosine_relevance_score_fn
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        collection_name: str = "local",
+        persist_directory: Optional[str] = None,
+        **kwargs: Any
+    ) -> "LocalVectorStore":
+        """创建本地向量库并写入文本，persist_directory为空时只保存在内存中"""
+        store = cls(collection_name, embedding, collection=LocalCollection(persist_directory))
+        store.add_texts(texts, metadatas=metadatas, **kwargs)
+        return store
+
+
+def sync_from_qdrant(client, collection_name: str, batch_size: int = 256) -> int:
+    """
+    将Qdrant集合中的向量和payload复制到本地集合，不重新编码
+
+    Args:
+        client: Qdrant客户端
+        collection_name: 集合名称
+        batch_size: 每次滚动读取的点数
+
+    Returns:
+        复制的点数
+    """
+    drop_local_collection(collection_name)
+    collection = open_local_collection(collection_name)
+
+    copied = 0
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection_name,
+            limit=batch_size,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True,
+        )
+        if points:
+            collection.upsert(
+                [str(point.id) for point in points],
+                np.array([point.vector for point in points], dtype=np.float32),
+                [
+                    {
+                        "page_content": (point.payload or {}).get("page_content", ""),
+                        "metadata": (point.payload or {}).get("metadata") or {},
+                    }
+                    for point in points
+                ],
+            )
+            copied += len(points)
+        if offset is None:
+            return copied
+
+
+if __name__ == "__main__":
+    from .qdrant_connection import get_qdrant_client
+
+    parser = argparse.ArgumentParser(description="将Qdrant集合同步到本地向量索引")
+    parser.add_argument("--sync", nargs="+", required=True, help="集合名称")
+    args = parser.parse_args()
+
+    qdrant = get_qdrant_client()
+    for name in args.sync:
+        print(f"{name}: 已同步 {sync_from_qdrant(qdrant, name)} 个点")
@@ -1,18 +1,34 @@
 from langchain_community.vectorstores import Qdrant
-try:
-    from langchain_community.embeddings import HuggingFaceEmbeddings
-    SENTENCE_TRANSFORMERS_AVAILABLE = True
-except ImportError:
-    SENTENCE_TRANSFORMERS_AVAILABLE = False
-    from langchain_community.embeddings import FakeEmbeddings
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.chains import RetrievalQA
-from langchain_community.llms import Tongyi
 from langchain.prompts import PromptTemplate
-from typing import List, Dict, Any
+from functools import partial
+from typing import List, Dict, Any, Tuple
 import os
+import time
+import uuid
 import warnings
-from qdrant_client import QdrantClient
+from .config import settings
+from .context_compression import with_context_compression
+from .embeddings import get_embedding_model, load_embedding_model
+from .lexical_index import drop_lexical_index, ensure_lexical_index, hybrid_search
+from .llm import get_tongyi_llm
+from .local_vectorstore import LocalVectorStore, drop_local_collection
+from .parallel_embeddings import get_ingestion_embeddings
+from .qdrant_collections import (
+    INGESTED_AT_FIELD,
+    check_qdrant_available,
+    drop_collection,
+    ensure_collection,
+    forget_collection,
+    get_embedding_dimension,
+    get_search_params,
+    resolve_collection,
+)
+from .qdrant_connection import get_qdrant_client
+from .reranker import rerank_search
+from .retrievers import PipelineRetriever
+from .search_filters import build_qdrant_filter
+from .text_splitter import build_text_splitter
 
 
 class MultiRAGPipeline:
@@ -20,54 +36,59 @@ class MultiRAGPipeline:
     支持多知识库的RAG管道
     """
 
-    def __init__(self, collection_name: str, tongyi_api_key: str = None):
+    def __init__(
+        self,
+        collection_name: str,
+        tongyi_api_key: str = None,
+        embedding_model_name: str = None,
+        migration_collection: str = None,
+        migration_embedding_model: str = None
+    ):
         """
         初始化多知识库RAG管道
+
+        Args:
+            collection_name: 集合名称
+            tongyi_api_key: 阿里云API密钥
+            embedding_model_name: 生成该集合向量的嵌入模型，为空时使用默认模型
+            migration_collection: 重新嵌入迁移中的影子集合，非空时双写
+            migration_embedding_model: 影子集合使用的嵌入模型
         """
         # 初始化语言模型
         api_key = tongyi_api_key or os.getenv("TONGYI_API_KEY")
         if not api_key:
             raise ValueError("需要阿里云API密钥")
 
-        self.llm = Tongyi(
-            dashscope_api_key=api_key,
-            model_name="qwen-plus"
+        self.llm = get_tongyi_llm(api_key, "qwen-plus")
+
+        # 初始化嵌入模型，加载失败时报错：不退回到向量空间不同的后备模型，新建的知识库也不会把后备模型记录下来
+        self.embedding_model_name, self.embedding_model = get_embedding_model(
+            embedding_model_name, allow_fallback=False
         )
 
-        # 初始化嵌入模型
-        if SENTENCE_TRANSFORMERS_AVAILABLE:
-            try:
-                self.embedding_model = HuggingFaceEmbeddings(
-                    model_name="sentence-transformers/all-MiniLM-L6-v2"
-                )
-            except Exception as e:
-                warnings.warn(f"无法从HuggingFace加载嵌入模型: {e}. 使用默认嵌入模型.")
-                # 使用不依赖网络的默认嵌入模型
-                self.embedding_model = FakeEmbeddings(size=1024)
-        else:
-            warnings.warn("SentenceTransformer不可用，使用FakeEmbeddings作为后备方案.")
-            self.embedding_model = FakeEmbeddings(size=1024)
+        self.collection_name = collection_name
+        self.client = None
+        self.vectorstore = None
+        self.migration_vectorstore = None
 
         # 初始化向量数据库
-        try:
-            qdrant_host = os.getenv("QDRANT_HOST", "localhost")
-            qdrant_port = int(os.getenv("QDRANT_PORT", "6333"))
-            client = QdrantClient(host=qdrant_host, port=qdrant_port)
-            self.vectorstore = Qdrant(
-                client=client,
-                collection_name=collection_name,
-                embeddings=self.embedding_model,
+        if settings.VECTOR_STORE_BACKEND != "local":
+            self._init_qdrant(migration_collection, migration_embedding_model)
+        if self.vectorstore is None and (settings.VECTOR_STORE_BACKEND == "local" or settings.LOCAL_VECTOR_FALLBACK):
+            # 单机部署或Qdrant不可用时使用本地向量索引；作为Qdrant的后备时只读，写入会与Qdrant不一致
+            self.vectorstore = LocalVectorStore(
+                self.collection_name,
+                get_ingestion_embeddings(self.embedding_model_name, self.embedding_model),
+                read_only=settings.VECTOR_STORE_BACKEND != "local"
             )
-        except Exception as e:
-            warnings.warn(f"无法初始化Qdrant向量数据库: {e}")
-            # 创建一个空的向量存储作为后备
-            self.vectorstore = None
 
-        # 初始化文本分割器
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200
-        )
+        # 混合检索使用的词法索引，与向量共用集合名称
+        self.lexical_index = None
+        if settings.HYBRID_SEARCH and self.vectorstore is not None:
+            self.lexical_index = ensure_lexical_index(self.client, self.collection_name)
+
+        # 初始化文本分割器，按句子和嵌入模型的token数切分
+        self.text_splitter = build_text_splitter(self.embedding_model)
 
         # 定义QA提示模板
         self.qa_template = """你是一个专业的技术面试官。基于以下已知信息，回答用户的问题。
@@ -87,6 +108,71 @@ class MultiRAGPipeline:
             input_variables=["context", "question"]
         )
 
+    def _init_qdrant(self, migration_collection: str = None, migration_embedding_model: str = None) -> None:
+        """
+        连接Qdrant并创建向量库，失败时 vectorstore 保持为None
+        """
+        try:
+            self.client = get_qdrant_client()
+            check_qdrant_available(self.client)
+            # 迁移期间读写都指向当前的物理集合，别名切换后进行中的请求仍使用旧集合和旧模型
+            target_collection = self.collection_name
+            if migration_collection:
+                target_collection = resolve_collection(self.client, self.collection_name)
+                if target_collection == migration_collection:
+                    # 别名已切换、新模型尚未提交：按物理集合使用新模型，不再双写
+                    self.embedding_model_name, self.embedding_model = get_embedding_model(
+                        migration_embedding_model, allow_fallback=False
+                    )
+                    migration_collection = None
+            self.vectorstore = Qdrant(
+                client=self.client,
+                collection_name=target_collection,
+                embeddings=get_ingestion_embeddings(self.embedding_model_name, self.embedding_model),
+            )
+            if migration_collection:
+                self.migration_vectorstore = Qdrant(
+                    client=self.client,
+                    collection_name=migration_collection,
+                    embeddings=get_ingestion_embeddings(
+                        migration_embedding_model, load_embedding_model(migration_embedding_model)
+                    ),
+                )
+        except Exception as e:
+            warnings.warn(f"无法初始化Qdrant向量数据库: {e}")
+            self.client = None
+            self.vectorstore = None
+
+    def ensure_collection(self, cold: bool = False) -> bool:
+        """
+        按当前部署档位显式创建向量数据库集合
+
+        Args:
+            cold: 是否为冷数据集合
+
+        Returns:
+            本次是否新建了集合
+        """
+        if self.vectorstore is None:
+            warnings.warn("向量数据库未初始化，无法创建集合")
+            return False
+        dimension = get_embedding_dimension(self.embedding_model_name, self.embedding_model)
+        if self.client is None:
+            if self.vectorstore.read_only:
+                return False
+            created = self.vectorstore.collection.ensure_dimension(dimension)
+        else:
+            created = ensure_collection(
+                self.client,
+                self.collection_name,
+                dimension,
+                cold=cold
+            )
+        if created and self.lexical_index is not None:
+            # 新集合的词法索引从空开始即完整，不需要从Qdrant重建
+            self.lexical_index.mark_ready()
+        return created
+
     def add_documents(self, documents: List[str], metadatas: List[Dict] = None) -> None:
         """
         向知识库中添加文档
@@ -99,66 +185,182 @@ class MultiRAGPipeline:
             warnings.warn("向量数据库未初始化，无法添加文档")
             return
             
-        # 分割文档
+        # 分割文档，为每个分割的文档添加元数据
         split_docs = []
-        split_metadatas = []
 
         for i, doc in enumerate(documents):
-            splits = self.text_splitter.create_documents([doc])
-            split_docs.extend(splits)
+            metadata = metadatas[i] if metadatas and i < len(metadatas) else {}
+            split_docs.extend(self.text_splitter.create_documents([doc], metadatas=[metadata]))
 
-            # 为每个分割的文档添加元数据
-            if metadatas and i < len(metadatas):
-                for _ in splits:
-                    split_metadatas.append(metadatas[i])
-            else:
-                for _ in splits:
-                    split_metadatas.append({})
+        # 记录写入时间，重新嵌入迁移时只需补齐复制开始后写入的点
+        written_at = time.time()
+        for split_doc in split_docs:
+            split_doc.metadata[INGESTED_AT_FIELD] = written_at
 
         # 添加到向量数据库
-        self.vectorstore.add_documents(split_docs, metadatas=split_metadatas)
+        self.ensure_collection()
+        ids = [uuid.uuid4().hex for _ in split_docs]
+        try:
+            self._add_vectors(split_docs, ids)
+        except Exception:
+            if self.client is None:
+                raise
+            # 集合可能已被其它工作进程删除或重建，本进程的已创建缓存已过期：重新确认集合后重试一次
+            forget_collection(self.collection_name)
+            self.ensure_collection()
+            self._add_vectors(split_docs, ids)
+        if self.lexical_index is not None:
+            self.lexical_index.add(
+                ids, [doc.page_content for doc in split_docs], [doc.metadata for doc in split_docs]
+            )
+
+    def _add_vectors(self, split_docs: List, ids: List[str]) -> None:
+        """写入向量库，点ID相同的点被覆盖，重试不会产生重复"""
+        if self.migration_vectorstore is not None:
+            # 重新嵌入迁移期间双写，影子集合使用新模型生成向量，点ID与原集合保持一致
+            self.migration_vectorstore.add_documents(
+                split_docs, ids=ids, batch_size=settings.EMBEDDING_INGEST_BATCH_SIZE
+            )
+        # 加大每批编码的文本数，大批量导入时由多进程编码器并行处理
+        self.vectorstore.add_documents(
+            split_docs, ids=ids, batch_size=settings.EMBEDDING_INGEST_BATCH_SIZE
+        )
+
+    def query(
+        self,
+        question: str,
+        filters: Dict[str, Any] = None,
+        score_threshold: float = None,
+        mmr_lambda: float = None,
+        deadline: float = None
+    ) -> str:
+        """
+        查询知识库并生成回答，参数同 query_with_sources
+
+        Returns:
+            生成的回答
+        """
+        return self.query_with_sources(question, filters, score_threshold, mmr_lambda, deadline)[0]
 
-    def query(self, question: str) -> str:
+    def query_with_sources(
+        self,
+        question: str,
+        filters: Dict[str, Any] = None,
+        score_threshold: float = None,
+        mmr_lambda: float = None,
+        deadline: float = None
+    ) -> Tuple[str, List[Dict[str, Any]]]:
         """
-        查询知识库并生成回答
+        查询知识库并生成回答，同时返回检索到的文本块，调用方不需要再检索一次
 
         Args:
             question: 用户问题
+            filters: 元数据过滤条件，检索的文本块只来自满足条件的文档
+            score_threshold: 向量相似度阈值，低于阈值的文本块不交给语言模型
+            mmr_lambda: 非空时使用MMR选择文本块，取值越小结果越多样
+            deadline: 请求的截止时间（time.perf_counter()），决定重排的剩余预算
 
         Returns:
-            生成的回答
+            (生成的回答, 检索到的文本块)
         """
         if self.vectorstore is None:
-            return "知识库不可用"
-            
-        # 创建检索QA链
+            return "知识库不可用", []
+
+        retrieved: List[Dict[str, Any]] = []
+
+        def search(query: str, k: int) -> List[Dict[str, Any]]:
+            results = self.similarity_search(
+                query,
+                k,
+                filters=filters,
+                score_threshold=score_threshold,
+                mmr_lambda=mmr_lambda,
+                deadline=deadline
+            )
+            retrieved.extend(results)
+            return results
+
+        retriever = PipelineRetriever(search=search, k=3)
+
+        # 创建检索QA链，检索到的文本块压缩后再交给语言模型
         qa_chain = RetrievalQA.from_chain_type(
             llm=self.llm,
             chain_type="stuff",
-            retriever=self.vectorstore.as_retriever(search_kwargs={"k": 3}),
+            retriever=with_context_compression(retriever, getattr(self.llm, "model_name", None)),
             chain_type_kwargs={"prompt": self.qa_prompt},
             return_source_documents=True
         )
 
         # 执行查询
         result = qa_chain({"query": question})
-        return result["result"]
+        return result["result"], retrieved
 
-    def similarity_search(self, query: str, k: int = 4) -> List[Dict[str, Any]]:
+    def similarity_search(
+        self,
+        query: str,
+        k: int = 4,
+        embedding: List[float] = None,
+        filters: Dict[str, Any] = None,
+        score_threshold: float = None,
+        mmr_lambda: float = None,
+        deadline: float = None
+    ) -> List[Dict[str, Any]]:
         """
         在向量数据库中进行相似性搜索
 
         Args:
             query: 查询文本
             k: 返回结果数量
+            embedding: 已编码的查询向量，跨知识库检索时由调用方统一编码一次
+            filters: 元数据过滤条件，在Qdrant服务端按payload索引过滤
+            score_threshold: 向量相似度阈值，在Qdrant服务端过滤；设置时混合检索不返回只由词法检索命中的结果
+            mmr_lambda: 非空时向量检索使用MMR兼顾相关性与多样性，取值越小结果越多样
+            deadline: 请求的截止时间（time.perf_counter()），为空时重排使用 RERANK_BUDGET_MS
 
         Returns:
             相似文档列表
         """
         if self.vectorstore is None:
             return []
-            
-        docs = self.vectorstore.similarity_search_with_score(query, k=k)
+
+        vector_search = partial(
+            self._vector_search,
+            embedding=embedding,
+            filters=filters,
+            score_threshold=score_threshold,
+            mmr_lambda=mmr_lambda
+        )
+        # 启用重排时多取候选，由交叉编码器在请求剩余的延迟预算内重排
+        return rerank_search(
+            partial(self._retrieve, vector_search, filters=filters, score_threshold=score_threshold),
+            query,
+            k,
+            deadline=deadline
+        )
+
+    def _retrieve(
+        self, vector_search, query: str, k: int, filters: Dict[str, Any] = None, score_threshold: float = None
+    ) -> List[Dict[str, Any]]:
+        """向量检索，启用混合检索时与BM25词法检索并行执行，以倒数排名融合合并"""
+        if self.lexical_index is not None:
+            return hybrid_search(
+                vector_search, self.lexical_index, query, k, filters=filters, score_threshold=score_threshold
+            )
+        return vector_search(query, k)
+
+    def _vector_search(
+        self,
+        query: str,
+        k: int,
+        embedding: List[float] = None,
+        filters: Dict[str, Any] = None,
+        score_threshold: float = None,
+        mmr_lambda: float = None
+    ) -> List[Dict[str, Any]]:
+        """向量相似性搜索"""
+        if embedding is None:
+            embedding = self.embedding_model.embed_query(query)
+        docs = self._search_vectors(embedding, k, filters, score_threshold, mmr_lambda)
         results = []
         for doc, score in docs:
             results.append({
@@ -168,6 +370,32 @@ class MultiRAGPipeline:
             })
         return results
 
+    def _search_vectors(
+        self,
+        embedding: List[float],
+        k: int,
+        filters: Dict[str, Any] = None,
+        score_threshold: float = None,
+        mmr_lambda: float = None
+    ) -> List:
+        """在向量库中检索，返回 (文档, 相似度) 列表"""
+        search_kwargs = {
+            # Qdrant使用payload过滤，本地向量索引直接使用过滤条件字典
+            "filter": build_qdrant_filter(filters) if self.client is not None else filters,
+            "score_threshold": score_threshold,
+            "search_params": get_search_params(),
+        }
+        if mmr_lambda is None:
+            return self.vectorstore.similarity_search_with_score_by_vector(embedding, k=k, **search_kwargs)
+        # 在 k * MMR_FETCH_FACTOR 个候选中按MMR选出k个
+        return self.vectorstore.max_marginal_relevance_search_with_score_by_vector(
+            embedding,
+            k=k,
+            fetch_k=k * settings.MMR_FETCH_FACTOR,
+            lambda_mult=mmr_lambda,
+            **search_kwargs
+        )
+
     def delete_collection(self) -> None:
         """
         删除整个向量数据库集合
@@ -175,4 +403,17 @@ class MultiRAGPipeline:
         if self.vectorstore is None:
             warnings.warn("向量数据库未初始化，无法删除集合")
             return
-        # Qdrant不需要显式删除集合，当需要清空时可以过滤查询
\ No newline at end of file
+        if self.client is None and self.vectorstore.read_only:
+            # 只删除本地后备会与Qdrant中的集合不一致，Qdrant不可用时不删除
+            warnings.warn(f"Qdrant不可用，未删除集合 {self.collection_name}")
+            return
+        if self.lexical_index is not None:
+            drop_lexical_index(self.collection_name)
+        if self.client is None:
+            drop_local_collection(self.collection_name)
+            return
+        try:
+            drop_collection(self.client, self.collection_name)
+        except Exception as e:
+            # 删除失败时保留SQL侧的操作，残留集合由孤立集合回收任务清理
+            warnings.warn(f"删除Qdrant集合 {self.collection_name} 失败: {e}")
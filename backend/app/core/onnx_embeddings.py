@@ -0,0 +1,200 @@
+"""
+ONNX Runtime CPU嵌入后端
+
+用导出的ONNX模型（可选int8动态量化）替代PyTorch版sentence-transformers做推理，
+池化方式与原模型一致（mean或CLS pooling + L2归一化），生成的向量与已有集合兼容，
+可通过 check_compatibility 验证两者的余弦相似度在容差范围内。
+
+导出模型（在 backend 目录下）:
+    python -m app.core.onnx_embeddings --model sentence-transformers/all-MiniLM-L6-v2
+"""
+import argparse
+import os
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from .config import settings
+
+ONNX_MODEL_FILE = "model.onnx"
+ONNX_QUANTIZED_MODEL_FILE = "model-int8.onnx"
+
+
+def get_onnx_model_dir(model_name: str) -> str:
+    """获取模型导出目录"""
+    return os.path.join(settings.ONNX_MODEL_DIR, model_name.replace("/", "__"))
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    基于ONNX Runtime的句向量模型
+    """
+
+    def __init__(
+        self,
+        model_dir: str,
+        quantized: bool = True,
+        pooling: str = "mean",
+        max_length: int = 256,
+        batch_size: int = 32,
+        intra_op_threads: Optional[int] = None
+    ):
+        """
+        Args:
+            model_dir: 导出目录，包含ONNX模型和分词器
+            quantized: 是否使用int8量化模型
+            pooling: 池化方式，mean 为平均池化，cls 取首个token
+            max_length: 最大输入token数，应与原模型的 max_seq_length 一致，否则长文本的向量不同
+            batch_size: 每批编码的文本数
+            intra_op_threads: ONNX Runtime算子内线程数，为空时由ONNX Runtime决定
+        """
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        model_file = ONNX_QUANTIZED_MODEL_FILE if quantized else ONNX_MODEL_FILE
+        model_path = os.path.join(model_dir, model_file)
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"ONNX模型不存在: {model_path}，请先导出模型")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.pooling = pooling
+        self.max_length = max_length
+        self.batch_size = batch_size
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        encoded = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=self.max_length,
+            return_tensors="np",
+        )
+        inputs = {name: encoded[name].astype(np.int64) for name in encoded if name in self.input_names}
+        token_embeddings = self.session.run(None, inputs)[0]
+
+        if self.pooling == "cls":
+            embeddings = token_embeddings[:, 0]
+        else:
+            # mean pooling，只对非padding位置取平均
+            mask = encoded["attention_mask"][..., np.newaxis].astype(np.float32)
+            summed = (token_embeddings * mask).sum(axis=1)
+            embeddings = summed / np.clip(mask.sum(axis=1), 1e-9, None)
+        return embeddings / np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """
+        编码文本，按长度排序分批以减少padding
+
+        Returns:
+            与输入顺序一致的向量矩阵
+        """
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        order = np.argsort([len(text) for text in texts], kind="stable")
+        batches = []
+        for start in range(0, len(texts), self.batch_size):
+            batch_indices = order[start:start + self.batch_size]
+            batches.append(self._encode_batch([texts[i] for i in batch_indices]))
+
+        embeddings = np.empty((len(texts), batches[0].shape[1]), dtype=np.float32)
+        embeddings[order] = np.concatenate(batches)
+        return embeddings
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.encode(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.encode([text])[0].tolist()
+
+
+def check_compatibility(reference: Embeddings, candidate: Embeddings, texts: List[str]) -> float:
+    """
+    比较两个嵌入模型对同一批文本生成的向量
+
+    Args:
+        reference: 参考模型（生成已有集合的模型）
+        candidate: 待验证的模型
+        texts: 样例文本
+
+    Returns:
+        最小余弦相似度
+    """
+    a = np.array(reference.embed_documents(texts), dtype=np.float32)
+    b = np.array(candidate.embed_documents(texts), dtype=np.float32)
+    a /= np.linalg.norm(a, axis=1, keepdims=True)
+    b /= np.linalg.norm(b, axis=1, keepdims=True)
+    return float((a * b).sum(axis=1).min())
+
+
+def export_onnx_model(model_name: str, output_dir: str, quantize: bool = True, opset: int = 14) -> str:
+    """
+    将HuggingFace上的句向量模型导出为ONNX，并可选生成int8动态量化版本
+
+    Args:
+        model_name: 模型名称或本地模型目录
+        output_dir: 导出目录
+        quantize: 是否同时导出int8量化模型
+        opset: ONNX算子集版本
+
+    Returns:
+        导出目录
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name)
+    model.eval()
+
+    sample = tokenizer(["导出样例 export sample"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    model_path = os.path.join(output_dir, ONNX_MODEL_FILE)
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            model_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+        )
+    tokenizer.save_pretrained(output_dir)
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(
+            model_path,
+            os.path.join(output_dir, ONNX_QUANTIZED_MODEL_FILE),
+            weight_type=QuantType.QInt8,
+        )
+
+    return output_dir
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="导出ONNX嵌入模型")
+    parser.add_argument("--model", default=settings.EMBEDDING_MODEL, help="HuggingFace模型名称")
+    parser.add_argument("--output", default=None, help="导出目录，默认为 ONNX_MODEL_DIR 下的模型目录")
+    parser.add_argument("--no-quantize", action="store_true", help="不导出int8量化模型")
+    args = parser.parse_args()
+
+    output = export_onnx_model(
+        args.model,
+        args.output or get_onnx_model_dir(args.model),
+        quantize=not args.no_quantize
+    )
+    print(f"已导出到 {output}")
@@ -0,0 +1,202 @@
+"""
+多进程嵌入编码
+
+HuggingFaceEmbeddings 在单个Python进程中编码，批量导入文档时只能用到少量CPU核心。
+这里把大批量文本按长度排序后切成分片，交给进程池并行编码：
+- 进程池通过forkserver（不支持时用spawn）创建，每个子进程按模型名称自行加载模型。uvicorn工作进程
+  中已有线程池和Qdrant/HTTP客户端的线程，直接fork可能复制到被其它线程持有的锁而死锁
+- 按长度排序后同一分片内文本长度接近，减少padding带来的无效计算
+- 小批量（例如查询）直接在当前进程编码，不经过进程池
+"""
+import multiprocessing
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+from .config import settings
+from .embedding_sidecar import SidecarEmbeddings
+
+# 子进程中加载的嵌入模型
+_worker_model = None
+
+
+def _get_start_context():
+    """获取进程池的启动方式，优先使用forkserver"""
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+
+def _init_worker(model_name: str, threads_per_worker: int) -> None:
+    """子进程初始化：限制每个进程的计算线程数，避免进程间争抢CPU，然后加载嵌入模型"""
+    global _worker_model
+    try:
+        import torch
+        torch.set_num_threads(threads_per_worker)
+    except ImportError:
+        pass
+    from .embeddings import load_embedding_model
+    _worker_model = load_embedding_model(model_name)
+
+
+def _encode_shard(shard: Tuple[int, List[str]]) -> Tuple[int, List[List[float]], int, float]:
+    """在子进程中编码一个分片"""
+    shard_id, texts = shard
+    started = time.perf_counter()
+    vectors = _worker_model.embed_documents(texts)
+    return shard_id, vectors, os.getpid(), time.perf_counter() - started
+
+
+class ParallelEmbeddings(Embeddings):
+    """
+    导入模式的嵌入编码器，大批量文本分片到多个进程并行编码
+    """
+
+    def __init__(
+        self,
+        base: Embeddings,
+        model_name: str,
+        workers: int = None,
+        min_batch: int = None,
+        shard_size: int = None,
+        threads_per_worker: int = None
+    ):
+        """
+        Args:
+            base: 实际执行编码的嵌入模型，小批量时在当前进程使用
+            model_name: 注册表中的模型名称，工作进程按名称加载同一模型
+            workers: 工作进程数
+            min_batch: 文本数不少于该值时才使用进程池
+            shard_size: 每个分片的文本数
+            threads_per_worker: 每个工作进程的计算线程数
+        """
+        self.base = base
+        self.model_name = model_name
+        self.workers = workers or settings.EMBEDDING_WORKERS
+        self.min_batch = min_batch or settings.EMBEDDING_PARALLEL_MIN_BATCH
+        self.shard_size = shard_size or settings.EMBEDDING_SHARD_SIZE
+        self.threads_per_worker = threads_per_worker or settings.EMBEDDING_THREADS_PER_WORKER
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._stats: Dict[int, Dict[str, float]] = {}
+        self._stats_lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = _get_start_context().Pool(
+                    processes=self.workers,
+                    initializer=_init_worker,
+                    initargs=(self.model_name, self.threads_per_worker),
+                )
+            return self._pool
+
+    def _use_pool(self, texts: List[str]) -> bool:
+        return self.workers > 1 and len(texts) >= self.min_batch
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        编码文档，大批量时分片并行
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            与输入顺序一致的向量列表
+        """
+        if not self._use_pool(texts):
+            return self.base.embed_documents(texts)
+
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        shards = [order[start:start + self.shard_size] for start in range(0, len(order), self.shard_size)]
+
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+        pool = self._get_pool()
+        for shard_id, shard_vectors, pid, seconds in pool.imap_unordered(
+            _encode_shard,
+            [(shard_id, [texts[i] for i in shard]) for shard_id, shard in enumerate(shards)]
+        ):
+            for index, vector in zip(shards[shard_id], shard_vectors):
+                vectors[index] = vector
+
+            with self._stats_lock:
+                stats = self._stats.setdefault(pid, {"texts": 0, "seconds": 0.0})
+                stats["texts"] += len(shard_vectors)
+                stats["seconds"] += seconds
+
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.base.embed_query(text)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取每个工作进程的编码统计
+
+        Returns:
+            工作进程数及每个进程的文本数、耗时和吞吐量（条/秒）
+        """
+        with self._stats_lock:
+            snapshot = {pid: dict(stats) for pid, stats in self._stats.items()}
+        return {
+            "model": self.model_name,
+            "workers": self.workers,
+            "per_worker": {
+                pid: {
+                    "texts": int(stats["texts"]),
+                    "seconds": round(stats["seconds"], 3),
+                    "throughput": round(stats["texts"] / stats["seconds"], 1) if stats["seconds"] else 0.0,
+                }
+                for pid, stats in snapshot.items()
+            },
+        }
+
+    def close(self) -> None:
+        """关闭进程池"""
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool.join()
+                self._pool = None
+
+
+# 每个嵌入模型共享一个导入模式编码器，键为模型名称
+_ingestion_encoders: Dict[str, ParallelEmbeddings] = {}
+_ingestion_lock = threading.Lock()
+
+
+def get_ingestion_embeddings(model_name: str, embedding_model: Embeddings) -> Embeddings:
+    """
+    获取嵌入模型对应的导入模式编码器，未启用多进程时返回原模型
+
+    Args:
+        model_name: 注册表中的模型名称
+        embedding_model: 该名称加载的嵌入模型
+
+    Returns:
+        嵌入模型
+    """
+    if settings.EMBEDDING_WORKERS <= 1:
+        return embedding_model
+    # 共享嵌入进程自行合并批量，不再分片到本进程的进程池
+    if isinstance(embedding_model, SidecarEmbeddings):
+        return embedding_model
+
+    with _ingestion_lock:
+        if model_name not in _ingestion_encoders:
+            _ingestion_encoders[model_name] = ParallelEmbeddings(embedding_model, model_name)
+        return _ingestion_encoders[model_name]
+
+
+def get_ingestion_stats() -> List[Dict[str, Any]]:
+    """获取所有导入模式编码器的统计"""
+    return [encoder.stats() for encoder in _ingestion_encoders.values()]
+
+
+def close_ingestion_pools() -> None:
+    """关闭所有导入模式编码器的进程池"""
+    for encoder in _ingestion_encoders.values():
+        encoder.close()
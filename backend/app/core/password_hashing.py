@@ -0,0 +1,126 @@
+"""
+密码哈希
+
+bcrypt每次哈希或校验都要几十到几百毫秒的CPU时间。注册、登录和修改密码原来在请求中同步执行
+bcrypt，一波集中登录就会占满工作线程，拖慢所有其它接口。这里把哈希放到专用的有界线程池中：
+- 同时执行的哈希数不超过 PASSWORD_HASH_WORKERS，不占用事件循环和默认线程池
+- 排队和执行中的请求超过 PASSWORD_HASH_MAX_PENDING 时直接拒绝，由接口返回503
+- 代价因子由 BCRYPT_ROUNDS 配置，代价因子变化后，用户下次登录时透明地重新哈希
+- 记录排队深度、拒绝数和耗时，供监控查看
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from passlib.context import CryptContext
+
+from .config import settings
+
+# 创建密码加密上下文，哈希的代价因子与配置不同时 needs_update 为真
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
+
+
+class PasswordHashingBusy(RuntimeError):
+    """排队的哈希请求过多"""
+
+
+class PasswordHasher:
+    """
+    在专用的有界线程池中执行bcrypt
+    """
+
+    def __init__(self, workers: Optional[int] = None, max_pending: Optional[int] = None):
+        self.workers = max(1, workers or settings.PASSWORD_HASH_WORKERS)
+        self.max_pending = max(self.workers, max_pending or settings.PASSWORD_HASH_MAX_PENDING)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self._max_pending_seen = 0
+        self._completed = 0
+        self._rejected = 0
+        self._wait_seconds = 0.0
+        self._hash_seconds = 0.0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+            return self._executor
+
+    def _timed(self, submitted: float, func: Callable, *args) -> Any:
+        started = time.perf_counter()
+        with self._stats_lock:
+            self._running += 1
+            self._wait_seconds += started - submitted
+        try:
+            return func(*args)
+        finally:
+            with self._stats_lock:
+                self._running -= 1
+                self._hash_seconds += time.perf_counter() - started
+
+    async def _run(self, func: Callable, *args) -> Any:
+        with self._stats_lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                raise PasswordHashingBusy(f"排队的密码哈希请求超过 {self.max_pending} 个")
+            self._pending += 1
+            self._max_pending_seen = max(self._max_pending_seen, self._pending)
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._get_executor(), self._timed, time.perf_counter(), func, *args
+            )
+        finally:
+            with self._stats_lock:
+                self._pending -= 1
+                self._completed += 1
+
+    async def hash(self, password: str) -> str:
+        """哈希密码"""
+        return await self._run(pwd_context.hash, password)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """
+        校验密码
+
+        Returns:
+            (是否正确, 新的哈希)，密码正确且哈希的代价因子与配置不同时返回新的哈希，否则为None
+        """
+        return await self._run(pwd_context.verify_and_update, password, hashed_password)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取线程池的排队深度和耗时统计"""
+        with self._stats_lock:
+            completed = self._completed
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": self._pending,
+                "queued": self._pending - self._running,
+                "running": self._running,
+                "max_pending_seen": self._max_pending_seen,
+                "completed": completed,
+                "rejected": self._rejected,
+                "avg_wait_ms": round(self._wait_seconds * 1000 / completed, 2) if completed else 0.0,
+                "avg_hash_ms": round(self._hash_seconds * 1000 / completed, 2) if completed else 0.0,
+                "bcrypt_rounds": settings.BCRYPT_ROUNDS,
+            }
+
+    def close(self) -> None:
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+
+password_hasher = PasswordHasher()
+
+
+def close_password_hasher() -> None:
+    """关闭密码哈希线程池，在应用关闭时调用"""
+    password_hasher.close()
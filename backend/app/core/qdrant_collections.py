@@ -0,0 +1,390 @@
+"""
+Qdrant集合的显式创建与配置
+
+集合不再由LangChain的Qdrant封装隐式创建，而是在创建知识库（或首次写入）时
+按部署档位显式创建：HNSW参数、int8标量量化、向量是否落盘以及payload索引都在这里统一配置。
+"""
+import threading
+import time
+import uuid
+import warnings
+from typing import Any, Dict, Optional, Tuple
+
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+from .config import settings
+
+# 部署档位
+# default: Qdrant默认参数，全部向量常驻内存
+# balanced: 原始向量常驻内存，额外保留int8量化副本加速检索（搜索时用原始向量重排）
+# memory: 原始向量落盘，仅int8量化副本常驻内存，适合内存紧张或冷数据较多的部署
+COLLECTION_PROFILES: Dict[str, Dict[str, Any]] = {
+    "default": {
+        "hnsw_m": 16,
+        "hnsw_ef_construct": 100,
+        "search_hnsw_ef": 64,
+        "scalar_quantization": False,
+        "on_disk": False,
+    },
+    "balanced": {
+        "hnsw_m": 16,
+        "hnsw_ef_construct": 128,
+        "search_hnsw_ef": 96,
+        "scalar_quantization": True,
+        "on_disk": False,
+    },
+    "memory": {
+        "hnsw_m": 12,
+        "hnsw_ef_construct": 100,
+        "search_hnsw_ef": 128,
+        "scalar_quantization": True,
+        "on_disk": True,
+    },
+}
+
+# 需要建立payload索引的元数据字段，LangChain将元数据保存在payload的metadata键下
+PAYLOAD_INDEXES = {
+    "metadata.source": models.PayloadSchemaType.KEYWORD,
+    "metadata.filename": models.PayloadSchemaType.KEYWORD,
+}
+
+# 知识库文本块的写入时间（Unix时间戳），重新嵌入迁移时只需补齐复制开始后写入的点；
+# 只在内部使用，不作为检索的过滤字段
+INGESTED_AT_FIELD = "ingested_at"
+INTERNAL_PAYLOAD_INDEXES = {
+    f"metadata.{INGESTED_AT_FIELD}": models.PayloadSchemaType.FLOAT,
+}
+
+# 当前进程中已确认存在的集合，避免每次写入都请求Qdrant
+_provisioned_collections = set()
+_provisioned_lock = threading.Lock()
+
+# 嵌入模型维度缓存，键为模型名称
+_dimension_cache: Dict[str, int] = {}
+
+# Qdrant可用性检查结果的缓存时间（秒），不可用期间每个请求不必各自等待连接超时
+QDRANT_HEALTH_TTL_SECONDS = 30
+_qdrant_health: Dict[str, Tuple[Optional[Exception], float]] = {}
+
+
+def _parse_bool(value: str) -> bool:
+    return value.lower() in ("1", "true", "yes", "on")
+
+
+def get_collection_profile(name: Optional[str] = None) -> Dict[str, Any]:
+    """
+    获取集合配置档位，环境变量中的单项配置优先于档位
+
+    Args:
+        name: 档位名称，为空时使用配置中的档位
+
+    Returns:
+        档位参数
+    """
+    name = name or settings.QDRANT_COLLECTION_PROFILE
+    if name not in COLLECTION_PROFILES:
+        raise ValueError(f"未知的集合配置档位: {name}")
+
+    profile = dict(COLLECTION_PROFILES[name])
+    if settings.QDRANT_HNSW_M:
+        profile["hnsw_m"] = int(settings.QDRANT_HNSW_M)
+    if settings.QDRANT_HNSW_EF_CONSTRUCT:
+        profile["hnsw_ef_construct"] = int(settings.QDRANT_HNSW_EF_CONSTRUCT)
+    if settings.QDRANT_SEARCH_HNSW_EF:
+        profile["search_hnsw_ef"] = int(settings.QDRANT_SEARCH_HNSW_EF)
+    if settings.QDRANT_SCALAR_QUANTIZATION:
+        profile["scalar_quantization"] = _parse_bool(settings.QDRANT_SCALAR_QUANTIZATION)
+    if settings.QDRANT_ON_DISK:
+        profile["on_disk"] = _parse_bool(settings.QDRANT_ON_DISK)
+    return profile
+
+
+def get_search_params(profile: Optional[Dict[str, Any]] = None) -> models.SearchParams:
+    """
+    根据档位生成检索参数
+
+    Args:
+        profile: 档位参数，为空时使用当前配置
+
+    Returns:
+        Qdrant检索参数
+    """
+    profile = profile or get_collection_profile()
+    quantization = None
+    if profile["scalar_quantization"]:
+        # 先在量化向量上粗排，再用原始向量重排，保证分数与未量化时一致
+        quantization = models.QuantizationSearchParams(rescore=True, oversampling=2.0)
+    return models.SearchParams(hnsw_ef=profile["search_hnsw_ef"], quantization=quantization)
+
+
+def get_embedding_dimension(model_name: str, embedding_model) -> int:
+    """
+    获取嵌入模型输出的向量维度
+
+    Args:
+        model_name: 模型名称
+        embedding_model: 该名称对应的LangChain嵌入模型
+
+    Returns:
+        向量维度
+    """
+    if model_name not in _dimension_cache:
+        _dimension_cache[model_name] = len(embedding_model.embed_query("dimension probe"))
+    return _dimension_cache[model_name]
+
+
+def check_qdrant_available(client: QdrantClient) -> None:
+    """
+    检查Qdrant是否可用，结果按配置的服务地址（QDRANT_HOST、QDRANT_PORT）缓存 QDRANT_HEALTH_TTL_SECONDS 秒
+
+    Raises:
+        Exception: Qdrant不可用时抛出最近一次检查的异常
+    """
+    key = f"{settings.QDRANT_HOST}:{settings.QDRANT_PORT}"
+    error, checked_at = _qdrant_health.get(key, (None, 0.0))
+    if time.monotonic() - checked_at > QDRANT_HEALTH_TTL_SECONDS:
+        try:
+            client.get_collections()
+            error = None
+        except Exception as e:
+            error = e
+        _qdrant_health[key] = (error, time.monotonic())
+    if error is not None:
+        raise error
+
+
+def resolve_collection(client: QdrantClient, collection_name: str) -> str:
+    """
+    将集合别名解析为实际的物理集合名称
+
+    知识库记录中保存的集合名称是别名，重新嵌入迁移时通过切换别名完成原子替换；
+    早期创建的集合没有别名，此时直接返回原名称。
+    """
+    for alias in client.get_aliases().aliases:
+        if alias.alias_name == collection_name:
+            return alias.collection_name
+    return collection_name
+
+
+def new_physical_collection_name(collection_name: str) -> str:
+    """为别名生成新的物理集合名称"""
+    return f"{collection_name}__{uuid.uuid4().hex[:8]}"
+
+
+def new_alias_name(collection_name: str) -> str:
+    """为早期没有别名的集合生成新的别名"""
+    return f"{collection_name}_{uuid.uuid4().hex[:8]}"
+
+
+def get_collection_dimension(client: QdrantClient, collection_name: str) -> Optional[int]:
+    """
+    获取已有集合的向量维度
+
+    Returns:
+        向量维度，集合不存在时返回None
+    """
+    try:
+        info = client.get_collection(collection_name=resolve_collection(client, collection_name))
+    except Exception:
+        return None
+    vectors = info.config.params.vectors
+    if isinstance(vectors, dict):
+        vectors = next(iter(vectors.values()))
+    return vectors.size
+
+
+def create_physical_collection(
+    client: QdrantClient,
+    collection_name: str,
+    dimension: int,
+    profile: Optional[Dict[str, Any]] = None,
+    cold: bool = False
+) -> None:
+    """
+    按档位创建物理集合并建立payload索引
+
+    Args:
+        client: Qdrant客户端
+        collection_name: 物理集合名称
+        dimension: 向量维度
+        profile: 档位参数，为空时使用当前配置
+        cold: 是否为冷数据集合，冷集合的向量和HNSW图都落盘
+    """
+    profile = profile or get_collection_profile()
+    on_disk = profile["on_disk"] or cold
+
+    quantization_config = None
+    if profile["scalar_quantization"]:
+        quantization_config = models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8,
+                quantile=0.99,
+                always_ram=True,
+            )
+        )
+
+    client.create_collection(
+        collection_name=collection_name,
+        vectors_config=models.VectorParams(
+            size=dimension,
+            distance=models.Distance.COSINE,
+            on_disk=on_disk,
+        ),
+        hnsw_config=models.HnswConfigDiff(
+            m=profile["hnsw_m"],
+            ef_construct=profile["hnsw_ef_construct"],
+            on_disk=cold,
+        ),
+        quantization_config=quantization_config,
+        on_disk_payload=on_disk,
+    )
+
+    ensure_payload_indexes(client, collection_name)
+
+
+def ensure_payload_indexes(client: QdrantClient, collection_name: str, wait: bool = True) -> None:
+    """
+    为集合建立可过滤字段的payload索引，索引已存在时Qdrant不做任何操作
+
+    Args:
+        client: Qdrant客户端
+        collection_name: 集合名称
+        wait: 是否等待索引建立完成，已有数据的集合在后台建立索引
+    """
+    for field_name, field_schema in {**PAYLOAD_INDEXES, **INTERNAL_PAYLOAD_INDEXES}.items():
+        try:
+            client.create_payload_index(
+                collection_name=collection_name,
+                field_name=field_name,
+                field_schema=field_schema,
+                wait=wait,
+            )
+        except Exception as e:
+            warnings.warn(f"为集合 {collection_name} 创建payload索引 {field_name} 失败: {e}")
+
+
+def ensure_collection(
+    client: QdrantClient,
+    collection_name: str,
+    dimension: int,
+    profile: Optional[Dict[str, Any]] = None,
+    cold: bool = False
+) -> bool:
+    """
+    确保集合存在，不存在时按档位显式创建物理集合，并以集合名称作为指向它的别名
+
+    Args:
+        client: Qdrant客户端
+        collection_name: 集合名称（别名）
+        dimension: 向量维度
+        profile: 档位参数，为空时使用当前配置
+        cold: 是否为冷数据集合，冷集合的向量和HNSW图都落盘
+
+    Returns:
+        本次是否新建了集合
+    """
+    if collection_name in _provisioned_collections:
+        return False
+
+    with _provisioned_lock:
+        if collection_name in _provisioned_collections:
+            return False
+
+        existing_dimension = get_collection_dimension(client, collection_name)
+        if existing_dimension is not None:
+            if existing_dimension != dimension:
+                raise ValueError(
+                    f"集合 {collection_name} 的向量维度为 {existing_dimension}，"
+                    f"与当前嵌入模型的维度 {dimension} 不一致"
+                )
+            # 早于payload索引创建的集合在这里补建，过滤检索不必全量扫描payload
+            ensure_payload_indexes(client, resolve_collection(client, collection_name), wait=False)
+            _provisioned_collections.add(collection_name)
+            return False
+
+        physical_name = new_physical_collection_name(collection_name)
+        create_physical_collection(client, physical_name, dimension, profile=profile, cold=cold)
+        client.update_collection_aliases(
+            change_aliases_operations=[
+                models.CreateAliasOperation(
+                    create_alias=models.CreateAlias(
+                        collection_name=physical_name,
+                        alias_name=collection_name,
+                    )
+                )
+            ]
+        )
+
+        _provisioned_collections.add(collection_name)
+        return True
+
+
+def swap_collection_alias(client: QdrantClient, collection_name: str, physical_name: str) -> Tuple[str, str]:
+    """
+    将别名原子地切换到新的物理集合
+
+    早期创建的集合没有别名，而别名不能与已有集合同名。这时不删除仍在使用的原集合，而是为新的
+    物理集合创建一个新别名，由调用方把知识库记录的集合名称改为新别名；提交之前的请求继续使用
+    原集合，原集合之后与其它切换前的物理集合一样回收。
+
+    Args:
+        client: Qdrant客户端
+        collection_name: 集合名称（别名，或早期没有别名的物理集合）
+        physical_name: 新的物理集合名称
+
+    Returns:
+        (切换前的物理集合名称, 之后应使用的集合名称)
+    """
+    previous = resolve_collection(client, collection_name)
+    operations = []
+    alias_name = collection_name
+    if previous != collection_name:
+        operations.append(
+            models.DeleteAliasOperation(delete_alias=models.DeleteAlias(alias_name=collection_name))
+        )
+    else:
+        alias_name = new_alias_name(collection_name)
+    operations.append(
+        models.CreateAliasOperation(
+            create_alias=models.CreateAlias(collection_name=physical_name, alias_name=alias_name)
+        )
+    )
+    client.update_collection_aliases(change_aliases_operations=operations)
+    forget_collection(collection_name)
+    return previous, alias_name
+
+
+def drop_collection(client: QdrantClient, collection_name: str) -> None:
+    """
+    删除集合名称（别名）对应的物理集合，别名随物理集合一起删除
+
+    Args:
+        client: Qdrant客户端
+        collection_name: 集合名称（别名）
+    """
+    client.delete_collection(collection_name=resolve_collection(client, collection_name))
+    forget_collection(collection_name)
+
+
+def set_collection_tier(client: QdrantClient, collection_name: str, cold: bool) -> None:
+    """
+    切换集合的冷热存储方式，冷集合的原始向量和HNSW图落盘以释放内存
+
+    Args:
+        client: Qdrant客户端
+        collection_name: 集合名称
+        cold: 是否切换为冷集合
+    """
+    profile = get_collection_profile()
+    client.update_collection(
+        collection_name=resolve_collection(client, collection_name),
+        vectors_config={"": models.VectorParamsDiff(on_disk=profile["on_disk"] or cold)},
+        hnsw_config=models.HnswConfigDiff(on_disk=cold),
+    )
+
+
+def forget_collection(collection_name: str) -> None:
+    """集合被删除后从已创建缓存中移除"""
+    with _provisioned_lock:
+        _provisioned_collections.discard(collection_name)
@@ -0,0 +1,191 @@
+"""
+Qdrant客户端工厂
+
+原来每个管道实例都各自创建 QdrantClient(host, port)：走REST、使用默认超时、每次请求重新建立连接，
+Qdrant响应变慢时请求会一直挂起。这里统一创建进程内共享的客户端：
+- 可选gRPC传输（QDRANT_PREFER_GRPC），gRPC通道和REST连接池都开启keep-alive并在请求间复用
+- 客户端级超时之外，检索和集合管理操作分别使用各自的超时
+- 连接失败、超时、429和5xx等瞬时错误按指数退避重试，写入都带点ID，重试是幂等的
+"""
+import random
+import threading
+import time
+import warnings
+from functools import wraps
+from typing import Any, Callable, Dict, Optional
+
+import grpc
+import httpx
+from qdrant_client import QdrantClient
+from qdrant_client.http.exceptions import ResponseHandlingException, UnexpectedResponse
+
+from .config import settings
+
+# 可重试的gRPC状态码和HTTP状态码
+RETRYABLE_GRPC_CODES = {
+    grpc.StatusCode.UNAVAILABLE,
+    grpc.StatusCode.DEADLINE_EXCEEDED,
+    grpc.StatusCode.RESOURCE_EXHAUSTED,
+}
+RETRYABLE_HTTP_STATUS = {429, 502, 503, 504}
+
+# 失败时重试的操作，均为只读或带ID的幂等写入
+RETRYABLE_METHODS = (
+    "get_collections",
+    "get_collection",
+    "get_aliases",
+    "search",
+    "search_batch",
+    "scroll",
+    "retrieve",
+    "count",
+    "upsert",
+    "delete",
+)
+
+# 使用检索超时的操作和使用集合管理超时的操作
+SEARCH_METHODS = ("search", "search_batch")
+ADMIN_METHODS = (
+    "create_collection",
+    "update_collection",
+    "delete_collection",
+    "update_collection_aliases",
+)
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """判断Qdrant请求的异常是否为可重试的瞬时错误"""
+    if isinstance(error, (ResponseHandlingException, httpx.TransportError)):
+        return True
+    if isinstance(error, UnexpectedResponse):
+        return error.status_code in RETRYABLE_HTTP_STATUS
+    if isinstance(error, grpc.RpcError):
+        return error.code() in RETRYABLE_GRPC_CODES
+    return False
+
+
+def _with_retry(method: Callable) -> Callable:
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        attempt = 0
+        while True:
+            try:
+                return method(self, *args, **kwargs)
+            except Exception as e:
+                if attempt >= self.retries or not is_retryable_error(e):
+                    raise
+                # 指数退避并加入随机抖动，避免多个请求同时重试
+                delay = self.retry_backoff * (2 ** attempt) * (0.5 + random.random())
+                warnings.warn(f"Qdrant请求 {method.__name__} 失败，{delay:.2f} 秒后重试: {e}")
+                time.sleep(delay)
+                attempt += 1
+    return wrapper
+
+
+def _with_timeout(method: Callable, setting: str) -> Callable:
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = getattr(self, setting)
+        return method(self, *args, **kwargs)
+    return wrapper
+
+
+class ResilientQdrantClient(QdrantClient):
+    """
+    带操作级超时和瞬时错误重试的Qdrant客户端
+
+    继承 QdrantClient，可以直接传给LangChain的Qdrant封装。
+    """
+
+    def __init__(
+        self,
+        retries: int = 0,
+        retry_backoff: float = 0.2,
+        search_timeout: Optional[int] = None,
+        admin_timeout: Optional[int] = None,
+        **kwargs: Any
+    ):
+        """
+        Args:
+            retries: 瞬时错误的最大重试次数
+            retry_backoff: 首次重试前的等待时间（秒），之后每次翻倍
+            search_timeout: 检索操作的超时（秒）
+            admin_timeout: 创建、修改、删除集合和切换别名的超时（秒）
+            **kwargs: QdrantClient的参数
+        """
+        super().__init__(**kwargs)
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.search_timeout = search_timeout
+        self.admin_timeout = admin_timeout
+
+
+for _name in SEARCH_METHODS:
+    setattr(ResilientQdrantClient, _name, _with_timeout(getattr(QdrantClient, _name), "search_timeout"))
+for _name in ADMIN_METHODS:
+    setattr(ResilientQdrantClient, _name, _with_timeout(getattr(QdrantClient, _name), "admin_timeout"))
+for _name in RETRYABLE_METHODS:
+    setattr(ResilientQdrantClient, _name, _with_retry(getattr(ResilientQdrantClient, _name)))
+
+
+def build_qdrant_client(**overrides: Any) -> ResilientQdrantClient:
+    """
+    按配置创建Qdrant客户端
+
+    Args:
+        **overrides: 覆盖配置的QdrantClient参数
+
+    Returns:
+        Qdrant客户端
+    """
+    options: Dict[str, Any] = {
+        "host": settings.QDRANT_HOST,
+        "port": settings.QDRANT_PORT,
+        "grpc_port": settings.QDRANT_GRPC_PORT,
+        "prefer_grpc": settings.QDRANT_PREFER_GRPC,
+        "timeout": settings.QDRANT_TIMEOUT,
+        "retries": settings.QDRANT_RETRIES,
+        "retry_backoff": settings.QDRANT_RETRY_BACKOFF,
+        "search_timeout": settings.QDRANT_SEARCH_TIMEOUT,
+        "admin_timeout": settings.QDRANT_ADMIN_TIMEOUT,
+        # REST连接池：Qdrant客户端默认对localhost关闭keep-alive，这里统一开启以复用连接
+        "limits": httpx.Limits(
+            max_connections=settings.QDRANT_POOL_SIZE,
+            max_keepalive_connections=settings.QDRANT_POOL_SIZE,
+            keepalive_expiry=settings.QDRANT_KEEPALIVE_SECONDS,
+        ),
+        # gRPC通道keep-alive，空闲时定期探测，避免被中间网络设备断开
+        "grpc_options": {
+            "grpc.keepalive_time_ms": settings.QDRANT_KEEPALIVE_SECONDS * 1000,
+            "grpc.keepalive_timeout_ms": 10000,
+            "grpc.keepalive_permit_without_calls": 1,
+        },
+    }
+    options.update(overrides)
+    return ResilientQdrantClient(**options)
+
+
+_client: Optional[ResilientQdrantClient] = None
+_client_lock = threading.Lock()
+
+
+def get_qdrant_client() -> ResilientQdrantClient:
+    """
+    获取进程内共享的Qdrant客户端，连接在请求和管道实例之间复用
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = build_qdrant_client()
+    return _client
+
+
+def close_qdrant_client() -> None:
+    """关闭共享的Qdrant客户端"""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
@@ -0,0 +1,300 @@
+"""
+知识库重新嵌入迁移
+
+切换嵌入模型时不能直接复用旧集合（向量空间和维度都不同），迁移过程如下：
+1. 提交影子集合和目标模型后再创建影子集合（孤立集合回收只会看到已被记录引用的影子集合），
+   之后新建的管道同时写入原集合和影子集合（双写）
+2. 分页读取原集合的全部点，用新模型重新生成向量后以相同ID写入影子集合；复制期间写入原集合、
+   没有双写的点（例如迁移开始前创建的管道写入的点）按payload中的写入时间补齐，不再扫描整个集合
+3. 通过Qdrant别名将知识库的集合名称原子地切换到影子集合，再提交新的嵌入模型；
+   两步之间仍带迁移字段的管道按别名实际指向的物理集合选择模型（见 MultiRAGPipeline._init_qdrant），
+   不会用旧模型的向量读写新集合。早期没有别名的集合不删除，而是为影子集合创建新别名并改写记录
+4. 等待进行中的请求结束（不占用线程和数据库会话），再按写入时间把这段时间内写入旧集合的点
+   补齐到新集合，然后删除旧的物理集合
+
+写入影子集合使用与原集合相同的点ID，复制与双写之间的重复写入是幂等的。
+"""
+import asyncio
+import time
+import warnings
+from typing import Optional, Tuple
+
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+from sqlalchemy.orm import Session
+
+from .embeddings import get_embedding_dimension_for, infer_embedding_model, load_embedding_model
+from .kb_cache import invalidate_knowledge_base
+from .lexical_index import drop_lexical_index
+from .parallel_embeddings import get_ingestion_embeddings
+from .qdrant_collections import (
+    INGESTED_AT_FIELD,
+    create_physical_collection,
+    get_collection_dimension,
+    new_physical_collection_name,
+    resolve_collection,
+    swap_collection_alias,
+)
+from .qdrant_connection import get_qdrant_client
+from ..database import SessionLocal
+from ..models.knowledge_base import KnowledgeBase
+
+# 每批重新嵌入的点数
+REEMBED_BATCH_SIZE = 256
+
+# 切换别名后等待进行中的请求结束的时间（秒），之后删除旧集合
+OLD_COLLECTION_GRACE_SECONDS = 30
+
+# 补齐时向前多取的时间（秒）：写入时间在编码之前记录，大批量写入在记录之后才到达Qdrant
+REEMBED_CATCHUP_MARGIN_SECONDS = 600
+
+
+def start_reembedding(
+    db: Session,
+    knowledge_base: KnowledgeBase,
+    embedding_model: str,
+    client: Optional[QdrantClient] = None
+) -> KnowledgeBase:
+    """
+    开始重新嵌入迁移：创建影子集合并开启双写
+
+    Args:
+        db: 数据库会话
+        knowledge_base: 知识库记录
+        embedding_model: 目标嵌入模型名称
+        client: Qdrant客户端
+
+    Returns:
+        更新后的知识库记录
+    """
+    if knowledge_base.migration_collection:
+        if knowledge_base.migration_embedding_model != embedding_model:
+            raise ValueError("知识库正在迁移到其它嵌入模型")
+        # 重复提交同一目标时继续未完成的迁移
+        return knowledge_base
+
+    if embedding_model == knowledge_base.embedding_model:
+        raise ValueError("知识库已在使用该嵌入模型")
+
+    client = client or get_qdrant_client()
+    migration_collection = new_physical_collection_name(knowledge_base.collection_name)
+
+    # 先提交记录再创建集合，回收任务不会把刚创建的影子集合当作孤立集合删除
+    knowledge_base.migration_collection = migration_collection
+    knowledge_base.migration_embedding_model = embedding_model
+    db.commit()
+
+    try:
+        create_physical_collection(
+            client,
+            migration_collection,
+            get_embedding_dimension_for(embedding_model),
+            cold=not knowledge_base.is_active
+        )
+    except Exception:
+        knowledge_base.migration_collection = None
+        knowledge_base.migration_embedding_model = None
+        db.commit()
+        raise
+
+    db.refresh(knowledge_base)
+    return knowledge_base
+
+
+def copy_points(
+    client: QdrantClient,
+    source_collection: str,
+    target_collection: str,
+    embedding_model,
+    skip_existing: bool = False,
+    written_since: Optional[float] = None
+) -> int:
+    """
+    分页读取原集合的点，重新嵌入后写入目标集合
+
+    Args:
+        client: Qdrant客户端
+        source_collection: 原物理集合
+        target_collection: 影子集合
+        embedding_model: 目标嵌入模型
+        skip_existing: 为True时只复制目标集合中不存在的点
+        written_since: 非空时只读取写入时间不早于该时间戳的点
+
+    Returns:
+        复制的点数
+    """
+    scroll_filter = None
+    if written_since is not None:
+        scroll_filter = models.Filter(must=[
+            models.FieldCondition(key=f"metadata.{INGESTED_AT_FIELD}", range=models.Range(gte=written_since))
+        ])
+    copied = 0
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=source_collection,
+            scroll_filter=scroll_filter,
+            limit=REEMBED_BATCH_SIZE,
+            offset=offset,
+            with_payload=True,
+            with_vectors=False,
+        )
+        if points and skip_existing:
+            existing = client.retrieve(
+                collection_name=target_collection,
+                ids=[point.id for point in points],
+                with_payload=False,
+                with_vectors=False,
+            )
+            existing_ids = {point.id for point in existing}
+            points = [point for point in points if point.id not in existing_ids]
+        if points:
+            texts = [(point.payload or {}).get("page_content") or "" for point in points]
+            vectors = embedding_model.embed_documents(texts)
+            client.upsert(
+                collection_name=target_collection,
+                points=[
+                    models.PointStruct(id=point.id, vector=vector, payload=point.payload)
+                    for point, vector in zip(points, vectors)
+                ],
+            )
+            copied += len(points)
+        if offset is None:
+            return copied
+
+
+def cut_over(kb_id: int) -> Optional[Tuple[str, str, str, float]]:
+    """
+    复制全部点后切换到影子集合，使用独立的数据库会话，返回前关闭会话
+
+    Args:
+        kb_id: 知识库ID
+
+    Returns:
+        (切换前的物理集合, 新的物理集合, 新的嵌入模型, 需要补齐的写入时间起点)，
+        没有进行中的迁移或复制失败时返回None
+    """
+    db = SessionLocal()
+    try:
+        knowledge_base = db.query(KnowledgeBase).filter(KnowledgeBase.id == kb_id).first()
+        if not knowledge_base or not knowledge_base.migration_collection:
+            return None
+
+        client = get_qdrant_client()
+        model_name = knowledge_base.migration_embedding_model
+        new_collection = knowledge_base.migration_collection
+        embedding_model = get_ingestion_embeddings(model_name, load_embedding_model(model_name))
+        source_collection = resolve_collection(client, knowledge_base.collection_name)
+
+        # 复制开始前已写入Qdrant的点都会被全量复制读到，之后写入、没有双写的点按写入时间补齐
+        written_since = time.time() - REEMBED_CATCHUP_MARGIN_SECONDS
+        try:
+            copied = copy_points(client, source_collection, new_collection, embedding_model)
+            copied += copy_points(
+                client, source_collection, new_collection, embedding_model,
+                skip_existing=True, written_since=written_since
+            )
+        except Exception as e:
+            warnings.warn(f"知识库 {kb_id} 重新嵌入失败，可重新提交迁移继续: {e}")
+            return None
+
+        # 先切换别名再提交新模型：提交前仍带迁移字段的管道会按别名指向的集合改用新模型
+        previous, alias_name = swap_collection_alias(client, knowledge_base.collection_name, new_collection)
+
+        knowledge_base.collection_name = alias_name
+        knowledge_base.embedding_model = model_name
+        knowledge_base.embedding_dimension = get_embedding_dimension_for(model_name)
+        knowledge_base.migration_collection = None
+        knowledge_base.migration_embedding_model = None
+        db.commit()
+        invalidate_knowledge_base(knowledge_base.user_id, knowledge_base.id)
+        print(f"知识库 {kb_id} 已切换到嵌入模型 {model_name}，重新嵌入 {copied} 个点")
+        return previous, new_collection, model_name, written_since
+    finally:
+        db.close()
+
+
+def retire_collection(previous: str, new_collection: str, model_name: str, written_since: float) -> None:
+    """
+    把切换前后写入旧集合的点补齐到新集合，然后删除旧集合
+
+    Args:
+        previous: 切换前的物理集合
+        new_collection: 新的物理集合
+        model_name: 新的嵌入模型
+        written_since: 只补齐写入时间不早于该时间戳的点
+    """
+    client = get_qdrant_client()
+    try:
+        copied = copy_points(
+            client,
+            previous,
+            new_collection,
+            get_ingestion_embeddings(model_name, load_embedding_model(model_name)),
+            skip_existing=True,
+            written_since=written_since
+        )
+        if copied:
+            print(f"已将切换期间写入旧集合 {previous} 的 {copied} 个点补齐到 {new_collection}")
+    except Exception as e:
+        # 补齐失败时保留旧集合，可以重新执行补齐，旧集合之后由孤立集合回收任务清理
+        warnings.warn(f"补齐旧集合 {previous} 中的点失败，暂不删除: {e}")
+        return
+
+    try:
+        client.delete_collection(collection_name=previous)
+    except Exception as e:
+        # 删除失败的旧集合由孤立集合回收任务清理
+        warnings.warn(f"删除旧集合 {previous} 失败: {e}")
+        return
+    # 早期没有别名的集合切换后记录改用新别名，按原名称建立的词法索引不再使用
+    drop_lexical_index(previous)
+
+
+async def run_reembedding(kb_id: int, grace_seconds: int = OLD_COLLECTION_GRACE_SECONDS) -> None:
+    """
+    执行重新嵌入迁移，作为后台任务运行
+
+    复制和删除在线程中执行，等待进行中的请求结束时不占用线程和数据库会话
+
+    Args:
+        kb_id: 知识库ID
+        grace_seconds: 切换后删除旧集合前的等待时间（秒）
+    """
+    result = await asyncio.to_thread(cut_over, kb_id)
+    if result is None:
+        return
+    previous, new_collection, model_name, written_since = result
+    await asyncio.sleep(grace_seconds)
+    await asyncio.to_thread(retire_collection, previous, new_collection, model_name, written_since)
+
+
+def backfill_embedding_models(db: Session, client: Optional[QdrantClient] = None) -> int:
+    """
+    按Qdrant集合的实际向量维度补全或修正知识库记录的嵌入模型
+
+    早期知识库没有记录嵌入模型；加载默认模型失败时它们的向量由后备模型生成，
+    记录的维度与集合不一致时同样按集合修正。迁移中的知识库不处理。
+
+    Returns:
+        更新的知识库数
+    """
+    client = client or get_qdrant_client()
+    updated = 0
+    knowledge_bases = db.query(KnowledgeBase).filter(KnowledgeBase.migration_collection == None).all()
+    for knowledge_base in knowledge_bases:
+        dimension = get_collection_dimension(client, knowledge_base.collection_name)
+        if dimension is None:
+            continue
+        if knowledge_base.embedding_model and knowledge_base.embedding_dimension == dimension:
+            continue
+        model_name = infer_embedding_model(dimension)
+        if model_name is None:
+            warnings.warn(f"无法根据维度 {dimension} 确定知识库 {knowledge_base.id} 的嵌入模型")
+            continue
+        knowledge_base.embedding_model = model_name
+        knowledge_base.embedding_dimension = dimension
+        updated += 1
+    if updated:
+        db.commit()
+    return updated
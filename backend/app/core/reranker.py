@@ -0,0 +1,183 @@
+"""
+交叉编码器重排
+
+"stuff" 链只把前3个文本块交给语言模型，排序精度直接影响回答质量。可选的重排阶段在检索时
+多取一些候选，用小型交叉编码器对 (问题, 文本块) 成批打分后重新排序：
+- 打分结果按 (模型, 问题, 文本块) 缓存，重复的问题不再计算
+- 记录每对打分的平均耗时，预计超出请求剩余的延迟预算时跳过重排，直接返回检索顺序；
+  截止时间由接口在收到请求时计算（request_deadline），管道创建和检索的耗时同样计入预算
+"""
+import hashlib
+import threading
+import time
+import warnings
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional
+
+from .config import settings
+
+
+@lru_cache(maxsize=4)
+def load_cross_encoder(model_name: str):
+    """加载交叉编码器，同一模型只加载一次"""
+    from sentence_transformers import CrossEncoder
+    return CrossEncoder(model_name, max_length=settings.RERANK_MAX_LENGTH, device="cpu")
+
+
+class ScoreCache:
+    """
+    线程安全的LRU打分缓存
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._scores: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(model_name: str, query: str, content: str) -> str:
+        return hashlib.sha1(f"{model_name}\0{query}\0{content}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[float]:
+        with self._lock:
+            score = self._scores.get(key)
+            if score is not None:
+                self._scores.move_to_end(key)
+            return score
+
+    def put(self, key: str, score: float) -> None:
+        with self._lock:
+            self._scores[key] = score
+            self._scores.move_to_end(key)
+            while len(self._scores) > self.max_size:
+                self._scores.popitem(last=False)
+
+
+class Reranker:
+    """
+    带缓存和延迟预算的交叉编码器重排器
+    """
+
+    def __init__(self, model_name: str = None, batch_size: int = None, cache_size: int = None):
+        """
+        Args:
+            model_name: 交叉编码器模型名称
+            batch_size: 每批打分的 (问题, 文本块) 对数
+            cache_size: 打分缓存条数
+        """
+        self.model_name = model_name or settings.RERANK_MODEL
+        self.batch_size = batch_size or settings.RERANK_BATCH_SIZE
+        self.cache = ScoreCache(cache_size or settings.RERANK_CACHE_SIZE)
+        # 每对打分的平均耗时（秒），首次打分前未知
+        self.seconds_per_pair: Optional[float] = None
+        # 打分失败后在该时间（time.monotonic()）之前跳过重排
+        self._retry_at = 0.0
+
+    def _predict(self, query: str, contents: List[str]) -> List[float]:
+        model = load_cross_encoder(self.model_name)
+        started = time.perf_counter()
+        scores = model.predict([(query, content) for content in contents], batch_size=self.batch_size)
+        elapsed = (time.perf_counter() - started) / len(contents)
+        # 指数滑动平均，适应负载变化
+        self.seconds_per_pair = elapsed if self.seconds_per_pair is None else 0.8 * self.seconds_per_pair + 0.2 * elapsed
+        return [float(score) for score in scores]
+
+    def rerank(
+        self,
+        query: str,
+        results: List[Dict[str, Any]],
+        k: int,
+        deadline: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        重排检索结果
+
+        Args:
+            query: 查询文本
+            results: 检索结果，每个结果包含 content
+            k: 返回结果数量
+            deadline: 请求的截止时间（time.perf_counter()），为空时不限制
+
+        Returns:
+            按重排分数降序的前k个结果，rerank_score 为交叉编码器分数；跳过重排时保持检索顺序
+        """
+        if len(results) <= 1 or time.monotonic() < self._retry_at:
+            return results[:k]
+
+        keys = [ScoreCache.key(self.model_name, query, result["content"]) for result in results]
+        scores = [self.cache.get(key) for key in keys]
+        missing = [i for i, score in enumerate(scores) if score is None]
+
+        if missing and deadline is not None:
+            remaining = deadline - time.perf_counter()
+            # 首次打分前没有耗时估计，只要还有剩余预算就尝试
+            estimated = len(missing) * self.seconds_per_pair if self.seconds_per_pair is not None else 0.0
+            if remaining <= 0 or estimated > remaining:
+                return results[:k]
+
+        if missing:
+            try:
+                predicted = self._predict(query, [results[i]["content"] for i in missing])
+            except Exception as e:
+                # 模型无法加载（例如未安装sentence-transformers）或打分出错时跳过重排，不影响检索；
+                # RERANK_RETRY_SECONDS 秒后再尝试，暂时性的错误不会永久关闭重排
+                warnings.warn(f"交叉编码器重排不可用，{settings.RERANK_RETRY_SECONDS:.0f} 秒内跳过: {e}")
+                self._retry_at = time.monotonic() + settings.RERANK_RETRY_SECONDS
+                return results[:k]
+            for i, score in zip(missing, predicted):
+                scores[i] = score
+                self.cache.put(keys[i], score)
+
+        reranked = [{**result, "rerank_score": score} for result, score in zip(results, scores)]
+        reranked.sort(key=lambda result: result["rerank_score"], reverse=True)
+        return reranked[:k]
+
+
+_reranker: Optional[Reranker] = None
+_reranker_lock = threading.Lock()
+
+
+def get_reranker() -> Optional[Reranker]:
+    """获取进程内共享的重排器，未启用重排时返回None"""
+    global _reranker
+    if not settings.RERANK_ENABLED:
+        return None
+    with _reranker_lock:
+        if _reranker is None:
+            _reranker = Reranker()
+        return _reranker
+
+
+def request_deadline() -> float:
+    """在收到请求时计算重排的截止时间（time.perf_counter()），请求的延迟预算为 RERANK_BUDGET_MS"""
+    return time.perf_counter() + settings.RERANK_BUDGET_MS / 1000
+
+
+def rerank_search(
+    search: Callable[[str, int], List[Dict[str, Any]]],
+    query: str,
+    k: int,
+    deadline: Optional[float] = None
+) -> List[Dict[str, Any]]:
+    """
+    检索并按需重排：启用重排时多取候选，在请求剩余的延迟预算内重排后取前k个
+
+    Args:
+        search: 检索函数，参数为查询文本和结果数量
+        query: 查询文本
+        k: 返回结果数量
+        deadline: 请求的截止时间（time.perf_counter()），为空时从本次调用开始计算 RERANK_BUDGET_MS
+
+    Returns:
+        检索结果
+    """
+    reranker = get_reranker()
+    if reranker is None:
+        return search(query, k)
+
+    if deadline is None:
+        deadline = request_deadline()
+    fetch_k = max(k, min(k * settings.RERANK_OVERFETCH, settings.RERANK_MAX_CANDIDATES))
+    results = search(query, fetch_k)
+    return reranker.rerank(query, results, k, deadline=deadline)
@@ -0,0 +1,34 @@
+"""
+基于RAG管道检索结果的LangChain检索器
+
+RetrievalQA 原来直接使用向量库的检索器，只做向量检索。这里把管道的 similarity_search
+（混合检索、重排）包装成检索器，问答与搜索接口使用同一套检索流程。
+"""
+from typing import Any, Callable, Dict, List
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+# 检索结果的向量相似度写入Document元数据的键，供上下文压缩判断是否整块保留
+SCORE_METADATA_KEY = "_retrieval_score"
+
+
+class PipelineRetriever(BaseRetriever):
+    """
+    调用检索函数并将结果转换为Document
+    """
+
+    search: Callable[[str, int], List[Dict[str, Any]]]
+    k: int = 3
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return [
+            Document(
+                page_content=result["content"],
+                metadata={**result["metadata"], SCORE_METADATA_KEY: result.get("score")}
+            )
+            for result in self.search(query, self.k)
+        ]
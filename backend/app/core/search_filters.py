@@ -0,0 +1,74 @@
+"""
+检索的元数据过滤条件
+
+检索和问答请求可以按元数据过滤，例如 {"source": "resume"} 或 {"filename": ["a.pdf", "b.pdf"]}，
+列表表示匹配其中任意一个值，多个字段之间为“且”。过滤条件转换为Qdrant的payload过滤在服务端执行，
+只允许按建有payload索引的字段过滤，大集合上的过滤检索仍然走索引；本地向量索引和词法索引使用
+相同的匹配规则。
+"""
+from typing import Any, Dict, Optional
+
+from qdrant_client.http import models
+
+from .qdrant_collections import PAYLOAD_INDEXES
+
+# 可过滤的元数据字段，即建有payload索引的字段（去掉payload中的 metadata. 前缀）
+FILTERABLE_FIELDS = tuple(field_name.split(".", 1)[1] for field_name in PAYLOAD_INDEXES)
+
+
+def validate_filters(filters: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    校验过滤条件
+
+    Args:
+        filters: 字段到值（或值列表）的映射
+
+    Returns:
+        过滤条件，为空时返回None
+
+    Raises:
+        ValueError: 字段不可过滤或值的类型不支持
+    """
+    if not filters:
+        return None
+    for key, value in filters.items():
+        if key not in FILTERABLE_FIELDS:
+            raise ValueError(f"不支持按字段 {key} 过滤，可过滤的字段: {', '.join(FILTERABLE_FIELDS)}")
+        values = value if isinstance(value, list) else [value]
+        # payload索引是KEYWORD类型，只能按字符串匹配
+        if not values or not all(isinstance(item, str) for item in values):
+            raise ValueError(f"过滤字段 {key} 的值必须是字符串或字符串的非空列表")
+    return filters
+
+
+def build_qdrant_filter(filters: Optional[Dict[str, Any]]) -> Optional[models.Filter]:
+    """
+    将过滤条件转换为Qdrant的payload过滤
+
+    Args:
+        filters: 已校验的过滤条件
+
+    Returns:
+        Qdrant过滤条件，没有过滤条件时返回None
+    """
+    if not filters:
+        return None
+    conditions = []
+    for key, value in filters.items():
+        match = models.MatchAny(any=value) if isinstance(value, list) else models.MatchValue(value=value)
+        # LangChain将元数据保存在payload的metadata键下
+        conditions.append(models.FieldCondition(key=f"metadata.{key}", match=match))
+    return models.Filter(must=conditions)
+
+
+def matches_filters(metadata: Dict[str, Any], filters: Optional[Dict[str, Any]]) -> bool:
+    """
+    判断元数据是否满足过滤条件，供本地向量索引和词法索引使用
+    """
+    if not filters:
+        return True
+    for key, value in filters.items():
+        allowed = value if isinstance(value, list) else [value]
+        if metadata.get(key) not in allowed:
+            return False
+    return True
@@ -1,5 +1,5 @@
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from jose import JWTError, jwt
 import os
 from dotenv import load_dotenv
@@ -23,13 +23,23 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def verify_token(token: str, credentials_exception):
-    """验证令牌"""
+def verify_token_claims(token: str, credentials_exception) -> Tuple[str, Optional[int]]:
+    """
+    验证令牌并返回用户名和用户ID
+
+    早期签发的令牌不包含用户ID，此时用户ID为None
+    """
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
-        return username
-    except JWTError:
-        raise credentials_exception
\ No newline at end of file
+        user_id = payload.get("uid")
+        return username, int(user_id) if user_id is not None else None
+    except (JWTError, TypeError, ValueError):
+        raise credentials_exception
+
+def verify_token(token: str, credentials_exception):
+    """验证令牌"""
+    username, _ = verify_token_claims(token, credentials_exception)
+    return username
@@ -0,0 +1,208 @@
+"""
+按句子和模型token切分文本
+
+RecursiveCharacterTextSplitter 按字符计长，中文文本1000个字符远超MiniLM的256 token窗口，
+超出部分在编码时被静默截断。这里先按中英文句末标点切分句子，再按嵌入模型的token数
+把句子合并成块，块间只重叠少量完整句子。
+"""
+import re
+from typing import Callable, List, Optional
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter, TextSplitter
+
+from .config import settings
+
+# 句子边界：中英文句末标点（可跟随引号括号）、后接空白的英文句点、换行
+SENTENCE_BOUNDARY = re.compile(r"[。！？；!?;]+[”’」』)）\"']*|\.(?=\s|$)|\n+")
+
+# 单个句子超过块大小时的次级分隔符
+CLAUSE_SEPARATORS = ["，", "、", ",", "：", ":", " ", ""]
+
+_CJK_CHAR = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]")
+_LATIN_WORD = re.compile(r"[A-Za-z]+")
+_OTHER_TOKEN = re.compile(r"\d|[^\sA-Za-z\d\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]")
+
+# 编码时自动添加的 [CLS] / [SEP]
+SPECIAL_TOKENS = 2
+
+
+def split_sentences(text: str) -> List[str]:
+    """
+    按中英文句末标点切分句子，保留标点
+
+    Args:
+        text: 原始文本
+
+    Returns:
+        去除首尾空白后的句子列表
+    """
+    sentences = []
+    start = 0
+    for match in SENTENCE_BOUNDARY.finditer(text):
+        sentence = text[start:match.end()].strip()
+        if sentence:
+            sentences.append(sentence)
+        start = match.end()
+    tail = text[start:].strip()
+    if tail:
+        sentences.append(tail)
+    return sentences
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    在没有分词器时估算token数：每个汉字、数字和标点约1个token，英文单词约1.3个token
+    """
+    cjk = len(_CJK_CHAR.findall(text))
+    words = len(_LATIN_WORD.findall(text))
+    others = len(_OTHER_TOKEN.findall(text))
+    return cjk + int(words * 1.3 + 0.5) + others
+
+
+def get_token_counter(embedding_model) -> Callable[[str], int]:
+    """
+    获取嵌入模型的token计数函数，模型没有暴露分词器时使用估算
+
+    Args:
+        embedding_model: LangChain嵌入模型
+
+    Returns:
+        token计数函数
+    """
+    # sentence-transformers模型的分词器在client上，ONNX后端直接暴露tokenizer
+    tokenizer = getattr(embedding_model, "tokenizer", None) or getattr(
+        getattr(embedding_model, "client", None), "tokenizer", None
+    )
+    if tokenizer is None:
+        return estimate_tokens
+
+    def count_tokens(text: str) -> int:
+        return len(tokenizer.encode(text, add_special_tokens=False))
+
+    return count_tokens
+
+
+def get_max_tokens(embedding_model, default: int = 256) -> int:
+    """获取嵌入模型的输入窗口（token数）"""
+    return (
+        getattr(getattr(embedding_model, "client", None), "max_seq_length", None)
+        or getattr(embedding_model, "max_length", None)
+        or default
+    )
+
+
+def join_sentences(sentences: List[str]) -> str:
+    """拼接句子，中文句子直接拼接，英文句子之间补空格"""
+    text = ""
+    for sentence in sentences:
+        if text and text[-1].isascii() and sentence[0].isascii():
+            text += " "
+        text += sentence
+    return text
+
+
+class TokenSentenceTextSplitter(TextSplitter):
+    """
+    以句子为单位、以模型token数计长的文本分割器
+    """
+
+    def __init__(
+        self,
+        chunk_size: int = 254,
+        chunk_overlap: int = 32,
+        token_counter: Optional[Callable[[str], int]] = None,
+        **kwargs
+    ):
+        """
+        Args:
+            chunk_size: 每块最大token数（不含特殊token）
+            chunk_overlap: 相邻块之间重叠的最大token数，只重叠完整句子
+            token_counter: token计数函数，为空时使用估算
+        """
+        super().__init__(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            length_function=token_counter or estimate_tokens,
+            **kwargs
+        )
+        self._clause_splitter = RecursiveCharacterTextSplitter(
+            separators=CLAUSE_SEPARATORS,
+            chunk_size=chunk_size,
+            chunk_overlap=0,
+            length_function=self._length_function,
+            keep_separator=True,
+        )
+
+    def _sentence_units(self, text: str) -> List[str]:
+        """切分句子，超长句子再按子句切开"""
+        units = []
+        for sentence in split_sentences(text):
+            if self._length_function(sentence) <= self._chunk_size:
+                units.append(sentence)
+            else:
+                units.extend(piece.strip() for piece in self._clause_splitter.split_text(sentence) if piece.strip())
+        return units
+
+    def split_text(self, text: str) -> List[str]:
+        """
+        分割文本
+
+        Args:
+            text: 原始文本
+
+        Returns:
+            文本块列表
+        """
+        chunks = []
+        current: List[str] = []
+        current_tokens = 0
+
+        for unit in self._sentence_units(text):
+            unit_tokens = self._length_function(unit)
+            if current and current_tokens + unit_tokens > self._chunk_size:
+                chunks.append(join_sentences(current))
+
+                # 从当前块末尾保留不超过重叠上限的完整句子
+                overlap: List[str] = []
+                overlap_tokens = 0
+                for sentence in reversed(current):
+                    sentence_tokens = self._length_function(sentence)
+                    if overlap_tokens + sentence_tokens > self._chunk_overlap:
+                        break
+                    overlap.insert(0, sentence)
+                    overlap_tokens += sentence_tokens
+                if overlap_tokens + unit_tokens > self._chunk_size:
+                    overlap, overlap_tokens = [], 0
+
+                current, current_tokens = overlap, overlap_tokens
+
+            current.append(unit)
+            current_tokens += unit_tokens
+
+        if current:
+            chunks.append(join_sentences(current))
+        return chunks
+
+
+def build_text_splitter(embedding_model) -> TextSplitter:
+    """
+    根据配置创建文本分割器
+
+    Args:
+        embedding_model: LangChain嵌入模型，用于计算token数和输入窗口
+
+    Returns:
+        文本分割器
+    """
+    if settings.TEXT_SPLITTER == "character":
+        return RecursiveCharacterTextSplitter(
+            chunk_size=1000,
+            chunk_overlap=200
+        )
+
+    chunk_size = settings.CHUNK_SIZE_TOKENS or get_max_tokens(embedding_model) - SPECIAL_TOKENS
+    return TokenSentenceTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=min(settings.CHUNK_OVERLAP_TOKENS, chunk_size // 2),
+        token_counter=get_token_counter(embedding_model)
+    )
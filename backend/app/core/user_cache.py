@@ -0,0 +1,13 @@
+"""
+已认证用户的进程内缓存
+
+每个需要登录的请求（包括每一轮对话）都要由令牌解析出当前用户。令牌中带有用户ID，解析出的用户
+按令牌主体（用户名）缓存 USER_CACHE_TTL_SECONDS 秒，缓存命中时不访问数据库。修改密码时使缓存
+失效；多进程部署时其它进程的缓存最多在有效期后更新。
+
+缓存的是已脱离会话的用户对象，只用于读取；需要修改用户时应在当前会话中重新加载。
+"""
+from .config import settings
+from ..utils.ttl_cache import TTLCache
+
+user_cache = TTLCache(settings.USER_CACHE_TTL_SECONDS, settings.USER_CACHE_SIZE)
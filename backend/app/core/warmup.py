@@ -0,0 +1,165 @@
+"""
+启动预热与就绪状态
+
+部署后的第一个请求不应承担模型下载/加载、Qdrant连接和Tongyi客户端创建的开销。
+应用启动时在后台依次预热这些依赖，全部完成后就绪检查才返回成功，
+滚动发布时负载均衡只会把流量切到已经预热完成的实例上。
+
+嵌入模型、Qdrant客户端和语言模型依赖的模块也在预热时才导入，不计入进程启动时间。
+"""
+import asyncio
+import threading
+import time
+from typing import Any, Callable, Dict
+
+from .config import settings
+from ..database import SessionLocal
+from ..models.knowledge_base import KnowledgeBase
+
+# 预热失败后重试的间隔（秒）
+WARMUP_RETRY_SECONDS = 10
+
+
+class ReadinessState:
+    """
+    记录每项预热检查的结果
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._checks: Dict[str, Dict[str, Any]] = {}
+
+    def record(self, name: str, ready: bool, detail: str = "", seconds: float = 0.0) -> None:
+        with self._lock:
+            self._checks[name] = {"ready": ready, "detail": detail, "seconds": round(seconds, 3)}
+
+    def is_check_ready(self, name: str) -> bool:
+        with self._lock:
+            return self._checks.get(name, {}).get("ready", False)
+
+    @property
+    def ready(self) -> bool:
+        with self._lock:
+            return bool(self._checks) and all(check["ready"] for check in self._checks.values())
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {name: dict(check) for name, check in self._checks.items()}
+
+
+readiness = ReadinessState()
+
+
+def warm_embedding_models() -> str:
+    """
+    加载默认嵌入模型及已有知识库使用的模型，并各执行一次编码
+
+    任一模型加载失败时报错、不退回到后备模型：后备模型加载成功不代表请求用到的模型可用，
+    检查保持未就绪并在之后重试
+    """
+    from .embeddings import EMBEDDING_MODELS, get_embedding_model
+
+    model_names = {settings.EMBEDDING_MODEL}
+    db = SessionLocal()
+    try:
+        model_names.update(
+            name for (name,) in db.query(KnowledgeBase.embedding_model).distinct() if name
+        )
+    finally:
+        db.close()
+
+    # 未注册的模型无法通过等待恢复，只报告不阻塞就绪
+    unknown = sorted(name for name in model_names if name not in EMBEDDING_MODELS)
+    loaded = []
+    for model_name in sorted(model_names - set(unknown)):
+        _, model = get_embedding_model(model_name, allow_fallback=False)
+        model.embed_documents(["预热 warm up"])
+        model.embed_query("预热 warm up")
+        loaded.append(model_name)
+    detail = f"已加载: {', '.join(loaded)}"
+    if unknown:
+        detail += f"；未注册的模型: {', '.join(unknown)}"
+    return detail
+
+
+def warm_qdrant() -> str:
+    """连接Qdrant，确认全局知识库集合存在，并检查知识库记录对应的集合"""
+    if settings.VECTOR_STORE_BACKEND == "local":
+        return "使用本地向量索引"
+    from .embeddings import get_embedding_model
+    from .qdrant_collections import ensure_collection, get_embedding_dimension
+    from .qdrant_connection import get_qdrant_client
+
+    client = get_qdrant_client()
+    existing = {collection.name for collection in client.get_collections().collections}
+    existing.update(alias.alias_name for alias in client.get_aliases().aliases)
+
+    model_name, model = get_embedding_model()
+    ensure_collection(client, "global_knowledge", get_embedding_dimension(model_name, model))
+
+    from .reembedding import backfill_embedding_models
+
+    db = SessionLocal()
+    try:
+        expected = {name for (name,) in db.query(KnowledgeBase.collection_name)}
+        # 补全早期知识库记录的嵌入模型，查询时按记录加载生成其向量的模型
+        backfilled = backfill_embedding_models(db, client)
+    finally:
+        db.close()
+    if backfilled:
+        print(f"已按集合维度补全 {backfilled} 个知识库的嵌入模型")
+
+    missing = sorted(expected - existing)
+    if missing:
+        # 缺失的集合无法通过等待恢复，只报告不阻塞就绪
+        return f"{len(missing)} 个知识库集合缺失: {', '.join(missing[:10])}"
+    return f"{len(expected)} 个知识库集合均存在"
+
+
+def warm_llm() -> str:
+    """创建Tongyi客户端"""
+    if not settings.TONGYI_API_KEY:
+        return "未配置API密钥，使用模拟回答"
+    from .llm import get_tongyi_llm
+
+    get_tongyi_llm(settings.TONGYI_API_KEY, "qwen-plus")
+    return "Tongyi客户端已创建"
+
+
+WARMUP_CHECKS: Dict[str, Callable[[], str]] = {
+    "embedding": warm_embedding_models,
+    "qdrant": warm_qdrant,
+    "llm": warm_llm,
+}
+
+
+def run_warmup_checks() -> bool:
+    """
+    执行尚未通过的预热检查
+
+    Returns:
+        是否全部就绪
+    """
+    for name, check in WARMUP_CHECKS.items():
+        if readiness.is_check_ready(name):
+            continue
+        started = time.perf_counter()
+        try:
+            detail = check()
+            readiness.record(name, True, detail, time.perf_counter() - started)
+        except Exception as e:
+            readiness.record(name, False, str(e), time.perf_counter() - started)
+    return readiness.ready
+
+
+async def warm_up_until_ready(retry_seconds: int = WARMUP_RETRY_SECONDS) -> None:
+    """
+    后台预热，失败的检查定期重试直到全部就绪，在应用lifespan中启动
+    """
+    for name in WARMUP_CHECKS:
+        readiness.record(name, False, "预热中")
+
+    while not await asyncio.to_thread(run_warmup_checks):
+        failed = [name for name, check in readiness.snapshot().items() if not check["ready"]]
+        print(f"警告: 预热未完成 ({', '.join(failed)})，{retry_seconds} 秒后重试")
+        await asyncio.sleep(retry_seconds)
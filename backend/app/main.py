@@ -8,18 +8,40 @@ from app.core.config import settings
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+import asyncio
 
-from app.api import resume, chat, knowledge, auth, multi_knowledge
-from app.database import engine, Base
-
-# 创建数据库表
-Base.metadata.create_all(bind=engine)
+from app.api import resume, chat, knowledge, auth, multi_knowledge, health
+from app.database import close_async_engine, prepare_schema
+from app.core.history_writer import close_history_writer, start_history_writer
+from app.core.password_hashing import close_password_hasher
+from app.core.warmup import warm_up_until_ready
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # 启动时的代码
+    # 数据库结构由Alembic迁移维护，启动时只检查版本（SQLite开发环境按模型建表）
+    prepare_schema()
+    # 后台预热嵌入模型、Qdrant连接和语言模型客户端，完成后 /health/ready 才返回成功
+    warmup_task = asyncio.create_task(warm_up_until_ready())
+    # 查询历史由后台任务批量写入
+    start_history_writer()
+    gc_task = None
+    if settings.COLLECTION_GC_INTERVAL_SECONDS > 0:
+        from app.core.collection_gc import collection_gc_loop
+        gc_task = asyncio.create_task(collection_gc_loop(settings.COLLECTION_GC_INTERVAL_SECONDS))
     yield
     # 关闭时的代码
+    warmup_task.cancel()
+    if gc_task:
+        gc_task.cancel()
+    await close_history_writer()
+    # 嵌入进程池和Qdrant客户端所在的模块在首次使用时才导入，关闭时再导入
+    from app.core.parallel_embeddings import close_ingestion_pools
+    from app.core.qdrant_connection import close_qdrant_client
+    close_ingestion_pools()
+    close_password_hasher()
+    close_qdrant_client()
+    await close_async_engine()
 
 app = FastAPI(lifespan=lifespan, title="AI Interview Assistant API")
 
@@ -38,6 +60,7 @@ app.include_router(chat.router, prefix="/chat", tags=["chat"])
 app.include_router(knowledge.router, prefix="/knowledge", tags=["knowledge"])
 app.include_router(auth.router, prefix="/auth", tags=["auth"])
 app.include_router(multi_knowledge.router, tags=["multi_knowledge"])
+app.include_router(health.router, prefix="/health", tags=["health"])
 
 @app.get("/")
 async def root():
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Index, text
 from sqlalchemy.orm import relationship
 from datetime import datetime
 # 从 database.py 导入 Base
@@ -7,15 +7,27 @@ from ..database import Base
 
 class KnowledgeBase(Base):
     __tablename__ = "knowledge_bases"
+    # 按用户列出知识库和按 (用户, ID) 校验归属都走该索引
+    __table_args__ = (
+        Index("ix_knowledge_bases_user_id_id", "user_id", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     name = Column(String(100), nullable=False)
     description = Column(String(500))
     collection_name = Column(String(200), unique=True, nullable=False)
+    # 生成该知识库向量的嵌入模型及维度
+    embedding_model = Column(String(200), nullable=True)
+    embedding_dimension = Column(Integer, nullable=True)
+    # 重新嵌入迁移中的影子集合及其嵌入模型，迁移完成后清空
+    migration_collection = Column(String(200), nullable=True)
+    migration_embedding_model = Column(String(200), nullable=True)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # 每次更新记录时加一，其它进程缓存的元数据按版本号判断是否过期
+    version = Column(Integer, nullable=False, default=1, server_default="1", onupdate=text("version + 1"))
     
     # 关联关系
     user = relationship("User", back_populates="knowledge_bases")
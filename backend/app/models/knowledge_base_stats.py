@@ -0,0 +1,28 @@
+from sqlalchemy import Column, Integer, Float, Text, DateTime, ForeignKey
+from sqlalchemy.orm import relationship, backref
+# 从 database.py 导入 Base
+from ..database import Base
+
+
+class KnowledgeBaseStats(Base):
+    """
+    知识库的使用统计，写入查询历史时增量更新，读取时不需要扫描 query_histories
+    """
+    __tablename__ = "knowledge_base_stats"
+
+    knowledge_base_id = Column(Integer, ForeignKey("knowledge_bases.id", ondelete="CASCADE"), primary_key=True)
+    query_count = Column(Integer, nullable=False, default=0)
+    # 有相似度分数的查询数及分数之和，用于计算平均分
+    scored_count = Column(Integer, nullable=False, default=0)
+    score_sum = Column(Float, nullable=False, default=0.0)
+    min_score = Column(Float, nullable=True)
+    # 延迟直方图：JSON数组，第i项为落在第i个桶（见 kb_stats.LATENCY_BUCKETS_MS）的查询数
+    latency_count = Column(Integer, nullable=False, default=0)
+    latency_histogram = Column(Text, nullable=True)
+    last_used_at = Column(DateTime, nullable=True, index=True)
+
+    # 关联关系，删除知识库时一并删除统计
+    knowledge_base = relationship(
+        "KnowledgeBase",
+        backref=backref("stats", uselist=False, cascade="all, delete-orphan")
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Float
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Float, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 # 从 database.py 导入 Base
@@ -7,6 +7,10 @@ from ..database import Base
 
 class QueryHistory(Base):
     __tablename__ = "query_histories"
+    # 查询历史按知识库以 (created_at, id) 键集分页
+    __table_args__ = (
+        Index("ix_query_histories_kb_created_id", "knowledge_base_id", "created_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     knowledge_base_id = Column(Integer, ForeignKey("knowledge_bases.id"), nullable=False)
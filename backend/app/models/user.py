@@ -3,10 +3,8 @@ from sqlalchemy.orm import relationship
 from datetime import datetime
 # 从 database.py 导入 Base
 from ..database import Base
-from passlib.context import CryptContext
-
-# 创建密码加密上下文
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# 密码加密上下文，代价因子由配置决定
+from ..core.password_hashing import pwd_context
 
 class User(Base):
     __tablename__ = "users"
@@ -22,7 +20,7 @@ class User(Base):
     knowledge_bases = relationship("KnowledgeBase", back_populates="user")
     
     def set_password(self, password: str):
-        """设置用户密码"""
+        """设置用户密码，接口中应使用 password_hasher 在专用线程池中哈希"""
         self.hashed_password = pwd_context.hash(password)
     
     def check_password(self, password: str) -> bool:
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, Field, validator
+from typing import Any, Dict, Optional, List
 from datetime import datetime
 
 class KnowledgeBaseBase(BaseModel):
@@ -17,21 +17,56 @@ class KnowledgeBase(KnowledgeBaseBase):
     user_id: int
     collection_name: str
     is_active: bool
+    embedding_model: Optional[str] = None
+    embedding_dimension: Optional[int] = None
+    migration_embedding_model: Optional[str] = None
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
     
     class Config:
         orm_mode = True
 
-class KnowledgeBaseQuery(BaseModel):
+class KnowledgeBaseReembed(BaseModel):
+    embedding_model: str
+
+class RetrievalOptions(BaseModel):
+    # 元数据过滤条件，例如 {"source": "resume"}，列表表示匹配其中任意一个值
+    filters: Optional[Dict[str, Any]] = None
+    # 向量相似度阈值，低于阈值的结果不返回
+    score_threshold: Optional[float] = None
+    # 使用MMR在相关性与多样性之间取舍，mmr_lambda越小结果越多样
+    mmr: bool = False
+    mmr_lambda: float = Field(0.5, ge=0.0, le=1.0)
+
+    @validator("filters")
+    def check_filters(cls, value):
+        # 过滤条件的校验依赖Qdrant客户端的模型，在首次校验时才导入
+        from ..core.search_filters import validate_filters
+        return validate_filters(value)
+
+    def retrieval_kwargs(self) -> Dict[str, Any]:
+        """传给RAG管道检索方法的参数"""
+        return {
+            "filters": self.filters,
+            "score_threshold": self.score_threshold,
+            "mmr_lambda": self.mmr_lambda if self.mmr else None,
+        }
+
+class KnowledgeBaseQuery(RetrievalOptions):
     question: str
     knowledge_base_id: int
 
-class KnowledgeBaseSearch(BaseModel):
+class KnowledgeBaseSearch(RetrievalOptions):
     query: str
     knowledge_base_id: int
     k: int = 4
 
+class KnowledgeBaseFederatedSearch(RetrievalOptions):
+    query: str
+    # 为空时检索当前用户的所有激活知识库
+    knowledge_base_ids: Optional[List[int]] = None
+    k: int = 4
+
 class KnowledgeBaseResponse(BaseModel):
     answer: str
     source_documents: List[dict]
\ No newline at end of file
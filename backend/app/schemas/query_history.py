@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional, Union
 from datetime import datetime
 
 
@@ -19,4 +19,19 @@ class QueryHistory(QueryHistoryBase):
     created_at: datetime
     
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+
+class QueryHistorySummary(BaseModel):
+    """不含回答正文的查询历史摘要"""
+    id: int
+    knowledge_base_id: int
+    question: str
+    similarity_score: Optional[float] = None
+    created_at: datetime
+
+
+class QueryHistoryPage(BaseModel):
+    items: List[Union[QueryHistory, QueryHistorySummary]]
+    # 下一页的游标，没有更多记录时为空
+    next_cursor: Optional[str] = None
@@ -0,0 +1,53 @@
+"""
+跨进程文件锁
+
+多个worker进程共享同一个持久化目录（词法索引、本地向量索引）时，修改文件前需要持有排它锁，
+读取最新状态与写入之间不会被其它进程插入。基于 fcntl.flock，锁随文件关闭自动释放；
+没有 fcntl 的平台（Windows）上退化为空操作，只支持单进程写入。
+"""
+import os
+from contextlib import contextmanager
+from typing import IO, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+@contextmanager
+def file_lock(lock_path: str, shared: bool = False) -> Iterator[None]:
+    """
+    持有锁文件上的锁
+
+    Args:
+        lock_path: 锁文件路径，不存在时创建
+        shared: 为True时加共享锁，否则加排它锁
+    """
+    os.makedirs(os.path.dirname(lock_path) or ".", exist_ok=True)
+    with open(lock_path, "a") as file:
+        if fcntl is not None:
+            fcntl.flock(file.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        # 关闭文件时释放锁
+        yield
+
+
+def try_leader_lock(lock_path: str) -> Optional[IO]:
+    """
+    尝试以非阻塞方式获取锁文件上的排它锁，用于在多个worker进程中只让一个进程执行后台任务
+
+    Args:
+        lock_path: 锁文件路径，不存在时创建
+
+    Returns:
+        持有锁的文件对象，关闭文件（或进程退出）时释放锁；锁已被其它进程持有时返回None
+    """
+    os.makedirs(os.path.dirname(lock_path) or ".", exist_ok=True)
+    file = open(lock_path, "a")
+    if fcntl is not None:
+        try:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            file.close()
+            return None
+    return file
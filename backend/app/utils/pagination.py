@@ -0,0 +1,40 @@
+"""
+键集（游标）分页
+
+按 (created_at, id) 降序翻页：游标记录上一页最后一行的 created_at 和 id，下一页从该位置之后
+继续读取，配合 (外键, created_at, id) 复合索引，翻到任意一页都只扫描一页的索引范围，
+不会像 OFFSET 那样越往后越慢。游标对客户端是不透明的字符串。
+"""
+import base64
+from datetime import datetime
+from typing import Tuple
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """
+    生成游标
+
+    Args:
+        created_at: 当前页最后一行的创建时间
+        row_id: 当前页最后一行的ID
+
+    Returns:
+        URL安全的游标字符串
+    """
+    raw = f"{created_at.isoformat()}|{row_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    解析游标
+
+    Raises:
+        ValueError: 游标格式不正确
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        created_at, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except Exception:
+        raise ValueError("无效的分页游标")
@@ -1,18 +1,17 @@
 import re
 from typing import Dict, Any, List
-import PyPDF2
-from docx import Document
 import os
 import json
 
-# 只有在有TONGYI_API_KEY时才导入Tongyi
-if os.getenv("TONGYI_API_KEY"):
+# PyPDF2、python-docx 和 Tongyi 在解析简历时才导入，不拖慢进程启动
+
+def _load_tongyi():
+    """导入Tongyi，不可用时返回None"""
     try:
         from langchain_community.llms import Tongyi
+        return Tongyi
     except ImportError:
-        Tongyi = None
-else:
-    Tongyi = None
+        return None
 
 def parse_resume(file_path: str, content_type: str) -> Dict[str, Any]:
     """
@@ -38,6 +37,7 @@ def parse_resume(file_path: str, content_type: str) -> Dict[str, Any]:
 
 def _extract_text_from_pdf(file_path: str) -> str:
     """从PDF文件中提取文本"""
+    import PyPDF2
     try:
         with open(file_path, 'rb') as file:
             pdf_reader = PyPDF2.PdfReader(file)
@@ -50,6 +50,7 @@ def _extract_text_from_pdf(file_path: str) -> str:
 
 def _extract_text_from_docx(file_path: str) -> str:
     """从DOCX文件中提取文本"""
+    from docx import Document
     try:
         doc = Document(file_path)
         text = ""
@@ -77,6 +78,7 @@ def _extract_with_ai_model(text: str) -> Dict[str, Any]:
         raise ValueError("缺少TONGYI_API_KEY环境变量")
     
     # 检查Tongyi是否可用
+    Tongyi = _load_tongyi()
     if Tongyi is None:
         raise ValueError("Tongyi模型不可用")
     
@@ -0,0 +1,56 @@
+"""
+带有效期的进程内LRU缓存
+
+条目在写入 ttl_seconds 秒后过期，超过 max_size 条时淘汰最久未使用的条目。多进程部署时每个进程
+各有一份缓存，其它进程的修改最多在有效期后可见。
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """
+    线程安全、带有效期的LRU缓存
+    """
+
+    def __init__(self, ttl_seconds: float, max_size: int):
+        """
+        Args:
+            ttl_seconds: 有效期（秒），不大于0时不缓存
+            max_size: 最大条数
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,126 @@
+"""
+集合配置档位基准测试
+
+对每个部署档位创建临时集合，写入随机向量后测量检索延迟、召回率（与精确检索对比）
+以及估算的常驻内存。需要可访问的Qdrant服务（QDRANT_HOST / QDRANT_PORT）。
+
+用法（在 backend 目录下）:
+    python -m benchmarks.bench_collection_profiles --points 50000 --dim 384
+"""
+import argparse
+import time
+import uuid
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+from app.core.qdrant_collections import (
+    COLLECTION_PROFILES,
+    drop_collection,
+    ensure_collection,
+    get_search_params,
+    resolve_collection,
+)
+from app.core.qdrant_connection import build_qdrant_client
+
+
+def estimate_memory_bytes(profile: dict, points: int, dim: int) -> int:
+    """估算集合常驻内存：原始向量、量化向量与HNSW图"""
+    memory = 0
+    if not profile["on_disk"]:
+        memory += points * dim * 4
+    if profile["scalar_quantization"]:
+        memory += points * dim
+    # HNSW第0层每个点约2m条边，每条边4字节
+    memory += points * profile["hnsw_m"] * 2 * 4
+    return memory
+
+
+def random_vectors(count: int, dim: int, rng: np.random.Generator) -> np.ndarray:
+    vectors = rng.standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def wait_for_indexing(client: QdrantClient, collection_name: str, timeout: float = 600) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        info = client.get_collection(collection_name=resolve_collection(client, collection_name))
+        if info.status == models.CollectionStatus.GREEN:
+            return
+        time.sleep(1)
+
+
+def bench_profile(client, name, profile, vectors, queries, k):
+    collection_name = f"bench_{name}_{uuid.uuid4().hex[:8]}"
+    ensure_collection(client, collection_name, vectors.shape[1], profile=profile)
+    try:
+        batch = 1000
+        for start in range(0, len(vectors), batch):
+            chunk = vectors[start:start + batch]
+            client.upsert(
+                collection_name=collection_name,
+                points=models.Batch(
+                    ids=list(range(start, start + len(chunk))),
+                    vectors=chunk.tolist(),
+                ),
+            )
+        wait_for_indexing(client, collection_name)
+
+        search_params = get_search_params(profile)
+        latencies = []
+        recalls = []
+        for query in queries:
+            exact = client.search(
+                collection_name=collection_name,
+                query_vector=query.tolist(),
+                limit=k,
+                search_params=models.SearchParams(exact=True),
+            )
+            started = time.perf_counter()
+            approx = client.search(
+                collection_name=collection_name,
+                query_vector=query.tolist(),
+                limit=k,
+                search_params=search_params,
+            )
+            latencies.append((time.perf_counter() - started) * 1000)
+            expected = {point.id for point in exact}
+            recalls.append(len(expected & {point.id for point in approx}) / max(len(expected), 1))
+
+        return {
+            "profile": name,
+            "memory_mb": estimate_memory_bytes(profile, len(vectors), vectors.shape[1]) / 1024 / 1024,
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p99_ms": float(np.percentile(latencies, 99)),
+            "recall": float(np.mean(recalls)),
+        }
+    finally:
+        drop_collection(client, collection_name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比较集合配置档位的内存与延迟")
+    parser.add_argument("--points", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    vectors = random_vectors(args.points, args.dim, rng)
+    queries = random_vectors(args.queries, args.dim, rng)
+    client = build_qdrant_client(admin_timeout=600)
+
+    print(f"{'profile':<10} {'memory(MB)':>11} {'p50(ms)':>9} {'p99(ms)':>9} {'recall@' + str(args.k):>10}")
+    for name, profile in COLLECTION_PROFILES.items():
+        result = bench_profile(client, name, profile, vectors, queries, args.k)
+        print(
+            f"{result['profile']:<10} {result['memory_mb']:>11.1f} "
+            f"{result['p50_ms']:>9.2f} {result['p99_ms']:>9.2f} {result['recall']:>10.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
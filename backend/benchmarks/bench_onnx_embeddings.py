@@ -0,0 +1,85 @@
+"""
+ONNX嵌入后端基准测试
+
+比较PyTorch版sentence-transformers与ONNX Runtime（fp32 / int8）：
+单条查询延迟（p50/p99）、批量编码吞吐量，以及与PyTorch向量的余弦相似度（兼容性）。
+需要先导出ONNX模型: python -m app.core.onnx_embeddings --model <模型名称>
+
+用法（在 backend 目录下）:
+    python -m benchmarks.bench_onnx_embeddings --queries 200 --batch 512
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.embeddings import EMBEDDING_MODELS, EMBEDDING_BACKENDS
+from app.core.onnx_embeddings import OnnxEmbeddings, check_compatibility, get_onnx_model_dir
+
+SAMPLE_TEXTS = [
+    "请介绍一下你在分布式系统方面的经验。",
+    "How would you design a rate limiter for a public API?",
+    "候选人熟悉Python、FastAPI和PostgreSQL，有三年后端开发经验。",
+    "解释一下Transformer中自注意力机制的计算过程。",
+    "What is the difference between a process and a thread?",
+    "在Kubernetes中如何实现服务的灰度发布？",
+    "Describe a time you had to debug a memory leak in production.",
+    "Redis的持久化方式有哪些，各自的优缺点是什么？",
+]
+
+
+def measure(model, queries, batch):
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        model.embed_query(query)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    model.embed_documents(batch)
+    throughput = len(batch) / (time.perf_counter() - started)
+
+    return float(np.percentile(latencies, 50)), float(np.percentile(latencies, 99)), throughput
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比较PyTorch与ONNX嵌入后端的延迟与吞吐量")
+    parser.add_argument("--model", default=settings.EMBEDDING_MODEL)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=512)
+    parser.add_argument("--tolerance", type=float, default=0.99, help="与PyTorch向量的最小余弦相似度")
+    args = parser.parse_args()
+
+    queries = [SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)] + f" #{i}" for i in range(args.queries)]
+    batch = [SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)] * (1 + i % 4) for i in range(args.batch)]
+
+    reference = EMBEDDING_BACKENDS["huggingface"](args.model)
+    pooling = EMBEDDING_MODELS[args.model].get("pooling", "mean")
+    max_length = EMBEDDING_MODELS[args.model].get("max_seq_length", 256)
+    backends = {
+        "pytorch": reference,
+        "onnx-fp32": OnnxEmbeddings(
+            get_onnx_model_dir(args.model), quantized=False, pooling=pooling, max_length=max_length
+        ),
+        "onnx-int8": OnnxEmbeddings(
+            get_onnx_model_dir(args.model), quantized=True, pooling=pooling, max_length=max_length
+        ),
+    }
+
+    # 预热，排除首次推理的初始化开销
+    for model in backends.values():
+        model.embed_documents(SAMPLE_TEXTS)
+
+    print(f"{'backend':<10} {'p50(ms)':>9} {'p99(ms)':>9} {'texts/s':>9} {'min cos':>9} {'compatible':>11}")
+    for name, model in backends.items():
+        p50, p99, throughput = measure(model, queries, batch)
+        min_cosine = check_compatibility(reference, model, SAMPLE_TEXTS + batch[:64])
+        print(
+            f"{name:<10} {p50:>9.2f} {p99:>9.2f} {throughput:>9.1f} "
+            f"{min_cosine:>9.4f} {str(min_cosine >= args.tolerance):>11}"
+        )
+
+
+if __name__ == "__main__":
+    main()
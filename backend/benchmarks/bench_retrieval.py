@@ -0,0 +1,177 @@
+"""
+知识库检索质量与延迟基准测试
+
+把带标注的查询/文档数据集导入临时知识库（本地向量索引，不需要Qdrant服务），通过
+MultiRAGPipeline 的 similarity_search 和 query（使用假语言模型，不调用通义千问）测量：
+- recall@k：相关文档出现在前k个结果中的比例
+- MRR：第一个相关文档排名倒数的平均值
+- 检索与问答的P50/P99延迟
+- 每篇文档切分出的点数
+结果可以保存为基线，修改切分方式、k或嵌入模型后与基线对比。基线按嵌入模型、分割器、k和
+检索方式分别保存，延迟与机器有关，只应与同一台机器上保存的基线比较。
+
+数据集为JSON：documents 为 {id, text, metadata} 列表，queries 为 {query, relevant} 列表，
+relevant 为相关文档的id列表。
+
+用法（在 backend 目录下）:
+    python -m benchmarks.bench_retrieval --k 4
+    python -m benchmarks.bench_retrieval --model sentence-transformers/all-MiniLM-L6-v2 --splitter character --save-baseline
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+from langchain_community.llms.fake import FakeListLLM
+
+from app.core.config import settings
+from app.core.embeddings import EMBEDDING_MODELS
+from app.core.multi_rag_pipeline import MultiRAGPipeline
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DATASET = os.path.join(BENCHMARK_DIR, "data", "retrieval_sample.json")
+DEFAULT_BASELINES = os.path.join(BENCHMARK_DIR, "baselines", "retrieval.json")
+
+# 数值越大越好的指标，其余指标越小越好
+HIGHER_IS_BETTER = {"recall", "mrr"}
+
+
+def percentile(values, q):
+    return float(np.percentile(np.array(values) * 1000, q))
+
+
+def ranked_documents(results):
+    """按结果顺序返回去重后的文档id，同一文档的多个块只计第一次出现"""
+    ranked = []
+    for result in results:
+        doc_id = result["metadata"].get("doc_id")
+        if doc_id is not None and doc_id not in ranked:
+            ranked.append(doc_id)
+    return ranked
+
+
+def evaluate(pipeline, queries, k):
+    """
+    对每个查询执行检索和问答，计算召回率、MRR和延迟
+    """
+    recalls, reciprocal_ranks = [], []
+    search_latencies, query_latencies = [], []
+
+    for item in queries:
+        relevant = set(item["relevant"])
+
+        started = time.perf_counter()
+        results = pipeline.similarity_search(item["query"], k)
+        search_latencies.append(time.perf_counter() - started)
+
+        ranked = ranked_documents(results)
+        recalls.append(len(relevant & set(ranked[:k])) / len(relevant))
+        rank = next((i for i, doc_id in enumerate(ranked, start=1) if doc_id in relevant), None)
+        reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+
+        started = time.perf_counter()
+        pipeline.query(item["query"])
+        query_latencies.append(time.perf_counter() - started)
+
+    return {
+        "recall": round(float(np.mean(recalls)), 4),
+        "mrr": round(float(np.mean(reciprocal_ranks)), 4),
+        "search_p50_ms": round(percentile(search_latencies, 50), 2),
+        "search_p99_ms": round(percentile(search_latencies, 99), 2),
+        "query_p50_ms": round(percentile(query_latencies, 50), 2),
+        "query_p99_ms": round(percentile(query_latencies, 99), 2),
+    }
+
+
+def load_baselines(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def report(metrics, baseline):
+    """打印指标，有基线时同时打印差值并标出变差的指标"""
+    for name, value in metrics.items():
+        line = f"{name:<20} {value:>10}"
+        if baseline and name in baseline:
+            delta = value - baseline[name]
+            worse = delta < 0 if name in HIGHER_IS_BETTER else delta > 0
+            line += f"  基线 {baseline[name]:>10}  差值 {delta:+.4f}{'  变差' if worse and delta else ''}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="知识库检索质量与延迟基准测试")
+    parser.add_argument("--dataset", default=DEFAULT_DATASET, help="带标注的数据集JSON")
+    parser.add_argument("--model", default=None, help="嵌入模型名称，默认使用配置中的模型")
+    parser.add_argument("--splitter", choices=["token", "character"], default=None, help="文本分割器，默认使用配置")
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--no-hybrid", action="store_true", help="只使用向量检索")
+    parser.add_argument("--rerank", action="store_true", help="启用交叉编码器重排")
+    parser.add_argument("--baselines", default=DEFAULT_BASELINES, help="基线文件")
+    parser.add_argument("--save-baseline", action="store_true", help="将本次结果保存为基线")
+    args = parser.parse_args()
+
+    with open(args.dataset, encoding="utf-8") as f:
+        dataset = json.load(f)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # 向量和词法索引都写入临时目录，测试结束后删除
+        settings.VECTOR_STORE_BACKEND = "local"
+        settings.LOCAL_VECTOR_DIR = os.path.join(workdir, "vectors")
+        settings.LEXICAL_INDEX_DIR = os.path.join(workdir, "lexical")
+        settings.HYBRID_SEARCH = not args.no_hybrid
+        settings.RERANK_ENABLED = args.rerank
+        if args.splitter:
+            settings.TEXT_SPLITTER = args.splitter
+
+        pipeline = MultiRAGPipeline("benchmark", tongyi_api_key="benchmark", embedding_model_name=args.model)
+        pipeline.llm = FakeListLLM(responses=["基准测试回答"])
+
+        # 假嵌入模型（包括模型加载失败时的后备模型）每次生成随机向量，结果不可复现，不能作为基线
+        fake_model = EMBEDDING_MODELS[pipeline.embedding_model_name]["backend"] == "fake"
+        if args.save_baseline and fake_model:
+            parser.error(f"嵌入模型 {pipeline.embedding_model_name} 生成随机向量，不能保存为基线")
+
+        documents = dataset["documents"]
+        started = time.perf_counter()
+        pipeline.add_documents(
+            [document["text"] for document in documents],
+            [{**document.get("metadata", {}), "doc_id": document["id"]} for document in documents],
+        )
+        ingest_seconds = time.perf_counter() - started
+
+        # 预热：首次检索加载模型，不计入延迟
+        pipeline.similarity_search(dataset["queries"][0]["query"], args.k)
+
+        metrics = evaluate(pipeline, dataset["queries"], args.k)
+        metrics["points_per_document"] = round(len(pipeline.vectorstore.collection) / len(documents), 2)
+        metrics["ingest_ms_per_document"] = round(ingest_seconds * 1000 / len(documents), 2)
+
+    key = "|".join([
+        pipeline.embedding_model_name,
+        settings.TEXT_SPLITTER,
+        f"k={args.k}",
+        "vector" if args.no_hybrid else "hybrid",
+    ] + (["rerank"] if args.rerank else []))
+    baselines = load_baselines(args.baselines)
+
+    print(f"配置: {key}  查询数: {len(dataset['queries'])}  文档数: {len(documents)}")
+    if fake_model:
+        print(f"警告: 嵌入模型 {pipeline.embedding_model_name} 生成随机向量，向量检索结果没有参考价值")
+    report(metrics, baselines.get(key))
+
+    if args.save_baseline:
+        baselines[key] = metrics
+        os.makedirs(os.path.dirname(args.baselines), exist_ok=True)
+        with open(args.baselines, "w", encoding="utf-8") as f:
+            json.dump(baselines, f, ensure_ascii=False, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"基线已保存到 {args.baselines}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+工作进程启动的导入耗时剖析
+
+在子进程中以 python -X importtime 导入 app.main，报告总耗时和累计耗时最多的模块，并检查
+LangChain、Qdrant客户端、PyPDF2、python-docx 等重量级模块没有在启动时被导入。总耗时超出预算
+或重量级模块被导入时以非零状态退出，可以作为CI的一个步骤，限制工作进程的启动时间。
+
+导入时间与机器有关，预算应按CI机器设置；重量级模块检查与机器无关。
+
+用法（在 backend 目录下）:
+    python -m benchmarks.import_profile
+    python -m benchmarks.import_profile --budget-ms 1500 --top 30
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 应在首次使用时才导入的顶层包
+HEAVY_MODULES = (
+    "langchain",
+    "langchain_community",
+    "langchain_core",
+    "qdrant_client",
+    "grpc",
+    "PyPDF2",
+    "docx",
+    "numpy",
+    "torch",
+    "sentence_transformers",
+    "onnxruntime",
+    "dashscope",
+)
+
+# -X importtime 的输出行：import time: self [us] | cumulative | imported package
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def profile_imports(module: str = "app.main"):
+    """
+    在子进程中导入模块
+
+    Returns:
+        (每个模块的累计耗时（微秒）, 被导入的顶层包集合)
+    """
+    code = (
+        f"import sys, {module}\n"
+        "print(','.join(sorted({name.split('.')[0] for name in sys.modules})))"
+    )
+    # 不连接数据库，也不使用 .env 中可能指向生产库的配置
+    env = {**os.environ, "DATABASE_URL": os.environ.get("IMPORT_PROFILE_DATABASE_URL", "sqlite://")}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"导入 {module} 失败:\n{result.stderr[-2000:]}")
+
+    timings = {}
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            timings[match.group(4)] = int(match.group(2))
+    packages = set(result.stdout.strip().splitlines()[-1].split(","))
+    return timings, packages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="工作进程启动的导入耗时剖析")
+    parser.add_argument("--module", default="app.main", help="要导入的模块")
+    parser.add_argument("--budget-ms", type=float, default=0, help="导入总耗时预算（毫秒），0表示不检查")
+    parser.add_argument("--top", type=int, default=20, help="报告累计耗时最多的模块数")
+    args = parser.parse_args()
+
+    timings, packages = profile_imports(args.module)
+    total_ms = timings.get(args.module, 0) / 1000
+
+    print(f"导入 {args.module} 共 {total_ms:.1f} ms")
+    for name, cumulative in sorted(timings.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"{cumulative / 1000:>10.1f} ms  {name}")
+
+    failed = False
+    heavy = sorted(packages.intersection(HEAVY_MODULES))
+    if heavy:
+        print(f"错误: 启动时导入了重量级模块: {', '.join(heavy)}")
+        failed = True
+    if args.budget_ms and total_ms > args.budget_ms:
+        print(f"错误: 导入耗时 {total_ms:.1f} ms 超出预算 {args.budget_ms:.0f} ms")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,16 @@
+import unittest
+
+from benchmarks.import_profile import HEAVY_MODULES, profile_imports
+
+
+class TestColdStart(unittest.TestCase):
+    def test_app_import_skips_heavy_modules(self):
+        # 测试导入应用时不加载LangChain、Qdrant客户端、文档解析等重量级模块
+        timings, packages = profile_imports("app.main")
+
+        self.assertIn("app.main", timings)
+        self.assertEqual(sorted(packages.intersection(HEAVY_MODULES)), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+
+from langchain_core.documents import Document
+
+from app.core.context_compression import SentenceCompressor
+from app.core.retrievers import SCORE_METADATA_KEY
+
+
+class TestSentenceCompressor(unittest.TestCase):
+    def test_keeps_relevant_sentences_and_drops_overlap(self):
+        # 测试只保留与问题相关的句子，块间重叠的句子只保留一次
+        documents = [
+            Document(page_content="Redis用于缓存热点数据。团队每周例会。", metadata={"i": 1}),
+            Document(page_content="Redis用于缓存热点数据。缓存过期采用随机时间。", metadata={"i": 2}),
+        ]
+
+        compressed = SentenceCompressor().compress_documents(documents, "Redis缓存怎么用")
+
+        self.assertEqual(
+            [(document.page_content, document.metadata) for document in compressed],
+            [("Redis用于缓存热点数据。", {"i": 1}), ("缓存过期采用随机时间。", {"i": 2})],
+        )
+
+    def test_token_budget_prefers_higher_ranked_chunks(self):
+        # 测试超出token预算时丢弃排名靠后的内容
+        documents = [
+            Document(page_content="使用Kafka削峰填谷。", metadata={}),
+            Document(page_content="Kafka分区数决定了消费者并行度的上限。", metadata={}),
+        ]
+
+        compressed = SentenceCompressor(token_budget=12).compress_documents(documents, "Kafka")
+
+        self.assertEqual([document.page_content for document in compressed], ["使用Kafka削峰填谷。"])
+
+    def test_stopwords_do_not_count_as_overlap(self):
+        # 测试只与问题共享虚词的句子不算相关，相似度高的块整块保留
+        documents = [
+            Document(page_content="什么时候发版由组长决定。灰度发布先覆盖内部用户。", metadata={SCORE_METADATA_KEY: 0.3}),
+            Document(page_content="先在测试环境验证。再逐步放量。", metadata={SCORE_METADATA_KEY: 0.9}),
+        ]
+
+        compressed = SentenceCompressor().compress_documents(documents, "什么是灰度发布")
+
+        self.assertEqual(
+            [document.page_content for document in compressed],
+            ["灰度发布先覆盖内部用户。", "先在测试环境验证。再逐步放量。"],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
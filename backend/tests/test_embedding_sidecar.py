@@ -0,0 +1,80 @@
+import asyncio
+import os
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.embeddings import Embeddings
+
+from app.core.embedding_sidecar import EmbeddingSidecarServer, SidecarEmbeddings, SidecarError, get_sidecar_stats
+
+
+class LengthEmbeddings(Embeddings):
+    """按文本长度生成向量，便于核对结果与输入的对应关系"""
+
+    def embed_documents(self, texts):
+        return [[float(len(text)), 1.0, 0.5] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def load_test_model(model_name):
+    if model_name != "length":
+        raise ValueError(f"未注册的嵌入模型: {model_name}")
+    return LengthEmbeddings()
+
+
+class TestEmbeddingSidecar(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.socket_path = os.path.join(self.tmpdir.name, "embeddings.sock")
+        self.server = EmbeddingSidecarServer(self.socket_path, max_batch=64, batch_wait_ms=20, loader=load_test_model)
+        self.loop = asyncio.new_event_loop()
+        started = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self.loop)
+            self.loop.run_until_complete(self.server.start(["length"]))
+            started.set()
+            self.loop.run_forever()
+
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+        started.wait(5)
+
+    def tearDown(self):
+        asyncio.run_coroutine_threadsafe(self.server.close(), self.loop).result(5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(5)
+        self.loop.close()
+        self.tmpdir.cleanup()
+
+    def test_concurrent_requests_are_batched(self):
+        # 测试多个客户端同时请求时合并成批编码，且每个请求拿到自己的向量
+        client = SidecarEmbeddings("length", socket_path=self.socket_path, timeout=5, connect_timeout=0)
+        self.assertEqual(client.dimension, 3)
+
+        requests = [["x" * (i + 1)] * (i % 3 + 1) for i in range(16)]
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            results = list(pool.map(client.embed_documents, requests))
+
+        for texts, vectors in zip(requests, results):
+            self.assertEqual(vectors, [[float(len(text)), 1.0, 0.5] for text in texts])
+        self.assertEqual(client.embed_query("abcd"), [4.0, 1.0, 0.5])
+
+        stats = get_sidecar_stats(self.socket_path)["models"]["length"]
+        self.assertEqual(stats["requests"], 17)
+        self.assertLess(stats["batches"], 17)
+
+    def test_unknown_model_and_missing_server(self):
+        # 测试嵌入进程中的错误返回给客户端，嵌入进程未启动时创建客户端失败
+        with self.assertRaises(SidecarError):
+            SidecarEmbeddings("missing", socket_path=self.socket_path, timeout=5, connect_timeout=0)
+        with self.assertRaises(ConnectionError):
+            SidecarEmbeddings("length", socket_path=self.socket_path + ".none", timeout=5, connect_timeout=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+
+from app.core import embeddings
+from app.core.embeddings import EmbeddingModelUnavailable, get_embedding_model, load_embedding_model
+
+
+class TestEmbeddingModelLoading(unittest.TestCase):
+    def setUp(self):
+        self.calls = 0
+
+        def broken_backend(model_name):
+            self.calls += 1
+            raise ConnectionError("无法连接嵌入进程")
+
+        embeddings.EMBEDDING_BACKENDS["test-broken"] = broken_backend
+        embeddings.EMBEDDING_MODELS["test-broken"] = {"backend": "test-broken", "dimension": 8}
+        self.addCleanup(embeddings.EMBEDDING_BACKENDS.pop, "test-broken")
+        self.addCleanup(embeddings.EMBEDDING_MODELS.pop, "test-broken")
+        self.addCleanup(embeddings._load_failures.pop, "test-broken", None)
+
+    def test_failed_load_is_not_retried_during_cooldown(self):
+        # 测试加载失败后冷却期内直接报错，不再重复加载
+        with self.assertRaises(ConnectionError):
+            load_embedding_model("test-broken")
+        with self.assertRaises(EmbeddingModelUnavailable):
+            load_embedding_model("test-broken")
+
+        self.assertEqual(self.calls, 1)
+
+    def test_recorded_model_does_not_fall_back(self):
+        # 测试不允许退回时报错，而不是返回后备模型
+        with self.assertRaises(EmbeddingModelUnavailable):
+            get_embedding_model("test-broken", allow_fallback=False)
+        with self.assertRaises(EmbeddingModelUnavailable):
+            get_embedding_model("test-broken", allow_fallback=False)
+
+
+if __name__ == "__main__":
+    unittest.main()
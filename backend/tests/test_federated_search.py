@@ -0,0 +1,28 @@
+import unittest
+
+from app.core.federated_search import merge_results
+
+
+class TestMergeResults(unittest.TestCase):
+    def test_merges_by_rank_not_raw_scores(self):
+        # 测试不同嵌入模型的余弦相似度不直接比较，按知识库内排名合并，只由词法命中的结果也参与排名
+        first = [{"content": "a1", "score": 0.9}, {"content": "a2", "score": 0.85}]
+        second = [{"content": "b1", "score": None, "rrf_score": 0.03}, {"content": "b2", "score": 0.4}]
+
+        merged = merge_results([first, second], k=4)
+
+        self.assertEqual([result["content"] for result in merged[:2]], ["a1", "b1"])
+        self.assertEqual({result["content"] for result in merged[2:]}, {"a2", "b2"})
+
+    def test_uses_rerank_score_when_all_results_reranked(self):
+        # 测试全部结果都有交叉编码器分数时按该分数合并
+        first = [{"content": "a1", "score": 0.9, "rerank_score": 1.0}]
+        second = [{"content": "b1", "score": 0.3, "rerank_score": 5.0}, {"content": "b2", "score": 0.2, "rerank_score": 2.0}]
+
+        merged = merge_results([first, second], k=2)
+
+        self.assertEqual([result["content"] for result in merged], ["b1", "b2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
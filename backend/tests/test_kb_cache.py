@@ -0,0 +1,93 @@
+import asyncio
+import unittest
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.core.kb_cache import cache_knowledge_base, get_knowledge_base_meta, invalidate_knowledge_base
+from app.database import Base
+from app.models import knowledge_base_stats, query_history, user  # noqa: F401
+from app.models.knowledge_base import KnowledgeBase
+
+
+class TestKnowledgeBaseCache(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+        self.engine = create_async_engine("sqlite+aiosqlite://")
+        self.addCleanup(lambda: self.loop.run_until_complete(self.engine.dispose()))
+        self.sessions = async_sessionmaker(self.engine, class_=AsyncSession, expire_on_commit=False)
+        self.loop.run_until_complete(self._create_schema())
+
+    async def _create_schema(self):
+        async with self.engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+
+    async def _create_knowledge_base(self, kb_id):
+        async with self.sessions() as db:
+            knowledge_base = KnowledgeBase(
+                id=kb_id, user_id=1, name="kb", collection_name=f"cache_test_{kb_id}", embedding_model="a"
+            )
+            db.add(knowledge_base)
+            await db.commit()
+            cache_knowledge_base(knowledge_base)
+
+    async def _update_embedding_model(self, kb_id, embedding_model):
+        async with self.sessions() as db:
+            knowledge_base = (await db.execute(select(KnowledgeBase).where(KnowledgeBase.id == kb_id))).scalar_one()
+            knowledge_base.embedding_model = embedding_model
+            await db.commit()
+            await db.refresh(knowledge_base)
+            return knowledge_base
+
+    def test_hit_does_not_query_database(self):
+        # 测试缓存命中时直接返回缓存的元数据，不再查询数据库
+        async def scenario():
+            await self._create_knowledge_base(9001)
+            await self._update_embedding_model(9001, "b")
+            async with self.sessions() as db:
+                return await get_knowledge_base_meta(db, 1, 9001)
+
+        meta = self.loop.run_until_complete(scenario())
+
+        self.assertEqual(meta.embedding_model, "a")
+        self.assertEqual(meta.version, 1)
+
+    def test_write_path_replaces_older_version(self):
+        # 测试写入路径读到更新的记录后替换缓存，较旧的记录不覆盖缓存
+        async def scenario():
+            await self._create_knowledge_base(9002)
+            stale = KnowledgeBase(
+                id=9002, user_id=1, name="kb", collection_name="cache_test_9002", embedding_model="a", version=1
+            )
+            cache_knowledge_base(await self._update_embedding_model(9002, "b"))
+            cache_knowledge_base(stale)
+            async with self.sessions() as db:
+                return await get_knowledge_base_meta(db, 1, 9002)
+
+        meta = self.loop.run_until_complete(scenario())
+
+        self.assertEqual(meta.embedding_model, "b")
+        self.assertEqual(meta.version, 2)
+
+    def test_miss_reads_database(self):
+        # 测试缓存失效后从数据库读取，已删除的知识库返回None
+        async def scenario():
+            await self._create_knowledge_base(9003)
+            invalidate_knowledge_base(1, 9003)
+            async with self.sessions() as db:
+                meta = await get_knowledge_base_meta(db, 1, 9003)
+                await db.execute(delete(KnowledgeBase).where(KnowledgeBase.id == 9003))
+                await db.commit()
+            invalidate_knowledge_base(1, 9003)
+            async with self.sessions() as db:
+                return meta, await get_knowledge_base_meta(db, 1, 9003)
+
+        meta, deleted = self.loop.run_until_complete(scenario())
+
+        self.assertEqual(meta.collection_name, "cache_test_9003")
+        self.assertIsNone(deleted)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,32 @@
+import unittest
+
+from app.core.kb_stats import LATENCY_BUCKETS_MS, bucket_index, latency_percentile
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    def test_bucket_index(self):
+        # 测试延迟落入上界不小于它的第一个桶，超出所有上界的进入最后一个桶
+        self.assertEqual(bucket_index(0), 0)
+        self.assertEqual(bucket_index(50), 0)
+        self.assertEqual(bucket_index(51), 1)
+        self.assertEqual(bucket_index(10 ** 9), len(LATENCY_BUCKETS_MS) - 1)
+
+    def test_latency_percentile(self):
+        # 测试分位数返回所在桶的上界
+        histogram = [0] * len(LATENCY_BUCKETS_MS)
+        histogram[bucket_index(30)] = 90
+        histogram[bucket_index(800)] = 9
+        histogram[bucket_index(10 ** 9)] = 1
+
+        self.assertEqual(latency_percentile(histogram, 50), 50)
+        self.assertEqual(latency_percentile(histogram, 95), 1000)
+        # 最后一个桶没有上界，返回倒数第二个桶的上界
+        self.assertEqual(latency_percentile(histogram, 100), LATENCY_BUCKETS_MS[-2])
+
+    def test_empty_histogram(self):
+        self.assertIsNone(latency_percentile([], 50))
+        self.assertIsNone(latency_percentile([0] * len(LATENCY_BUCKETS_MS), 99))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.core.kb_transfer import export_knowledge_base, import_knowledge_base
+from app.core.local_vectorstore import open_local_collection
+from app.database import Base
+from app.models import knowledge_base_stats, query_history, user  # noqa: F401
+from app.models.knowledge_base import KnowledgeBase
+
+
+class TestLocalTransfer(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        for name, value in (
+            ("VECTOR_STORE_BACKEND", "local"),
+            ("LOCAL_VECTOR_DIR", os.path.join(self.directory, "vectors")),
+            ("HYBRID_SEARCH", False),
+        ):
+            self.addCleanup(setattr, settings, name, getattr(settings, name))
+            setattr(settings, name, value)
+
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        self.db = sessionmaker(bind=engine)()
+        self.addCleanup(self.db.close)
+
+    def test_export_and_import_through_local_collection(self):
+        # 测试使用本地向量索引时不连接Qdrant，导出的有效点导入到新的本地集合
+        source = open_local_collection("transfer_source")
+        vectors = np.random.default_rng(0).normal(size=(3, 384)).astype(np.float32)
+        source.upsert(
+            ["1", "2", "3"],
+            vectors,
+            [{"page_content": text, "metadata": {"i": i}} for i, text in enumerate(["a", "b", "c"])],
+        )
+        source.delete(["2"])
+        knowledge_base = KnowledgeBase(
+            user_id=1,
+            name="kb",
+            collection_name="transfer_source",
+            embedding_model="sentence-transformers/all-MiniLM-L6-v2",
+            embedding_dimension=384,
+            is_active=True,
+        )
+        archive = os.path.join(self.directory, "kb.tar")
+
+        manifest = export_knowledge_base(knowledge_base, archive)
+        imported = import_knowledge_base(self.db, 1, archive, name="copy")
+
+        target = open_local_collection(imported.collection_name)
+        self.assertEqual(manifest["points"], 2)
+        self.assertEqual(len(target), 2)
+        self.assertEqual(
+            sorted(target.payloads[row]["page_content"] for row in target.rows.values()), ["a", "c"]
+        )
+        hit, score = target.search(vectors[2], 1)[0]
+        self.assertEqual(target.ids[hit], "3")
+        self.assertAlmostEqual(score, 1.0, places=2)
+
+
+if __name__ == "__main__":
+    unittest.main()
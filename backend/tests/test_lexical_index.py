@@ -0,0 +1,131 @@
+import shutil
+import tempfile
+import time
+import unittest
+
+from app.core.lexical_index import LexicalIndex, hybrid_search, reciprocal_rank_fusion, tokenize
+
+
+class TestLexicalIndex(unittest.TestCase):
+    def test_tokenize_mixed_text(self):
+        # 测试英文技术术语保持完整，中文按二元组切分
+        self.assertEqual(
+            tokenize("使用std::vector时报ERR_CONNECTION_RESET"),
+            ["std::vector", "err_connection_reset", "使用", "时报"],
+        )
+
+    def test_exact_term_ranks_first(self):
+        # 测试包含精确术语的文档排在第一位
+        index = LexicalIndex()
+        index.add(
+            ["1", "2", "3"],
+            ["Redis缓存热点数据", "Kafka消息队列削峰填谷", "排查OOMKilled问题时调整了内存限制"],
+        )
+
+        results = index.search("OOMKilled是什么原因", k=2)
+
+        self.assertEqual(results[0][0]["page_content"], "排查OOMKilled问题时调整了内存限制")
+
+    def test_index_reads_appends_from_other_instances(self):
+        # 测试多个进程共享索引文件时能读到其它实例追加的文档，删除同样生效
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+        writer = LexicalIndex(directory)
+        reader = LexicalIndex(directory)
+
+        writer.add(["1", "2"], ["gRPC连接复用", "HNSW参数调优"])
+        self.assertEqual(len(reader.search("grpc", k=5)), 1)
+
+        writer.delete(["1"])
+        self.assertEqual(reader.search("grpc", k=5), [])
+
+    def test_interleaved_writers_keep_offsets_in_sync(self):
+        # 测试两个实例交替写入同一个索引时互不覆盖，新实例读到全部文档
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+        first = LexicalIndex(directory)
+        second = LexicalIndex(directory)
+
+        first.add(["1"], ["kafka分区再平衡"])
+        second.add(["2"], ["redis集群扩容"])
+        first.add(["3"], ["etcd租约续期"])
+        second.delete(["1"])
+
+        for index in (first, second, LexicalIndex(directory)):
+            index.refresh()
+            self.assertEqual(sorted(index.positions), ["2", "3"])
+
+    def test_compaction_is_picked_up_by_other_instances(self):
+        # 测试压缩重写文件后其它实例重新加载，不再按旧偏移量读取
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+        writer = LexicalIndex(directory)
+        reader = LexicalIndex(directory)
+        writer.add(["1", "2"], ["nginx反向代理", "envoy限流"])
+        writer.delete(["1"])
+        self.assertEqual(len(reader.search("envoy", k=5)), 1)
+
+        writer.compact()
+        writer.add(["3"], ["istio熔断"])
+
+        self.assertEqual(len(writer.doc_ids), 2)
+        self.assertEqual(reader.search("nginx", k=5), [])
+        self.assertEqual(sorted(reader.positions), ["2", "3"])
+
+    def test_reciprocal_rank_fusion_merges_duplicates(self):
+        # 测试两路都命中的结果融合分数最高，score 保留向量相似度
+        fused = reciprocal_rank_fusion([
+            [{"content": "a", "metadata": {}, "score": 0.9}, {"content": "b", "metadata": {}, "score": 0.8}],
+            [{"content": "b", "metadata": {}, "lexical_score": 3.0}, {"content": "c", "metadata": {}}],
+        ])
+
+        self.assertEqual([result["content"] for result in fused], ["b", "a", "c"])
+        self.assertEqual(fused[0]["lexical_score"], 3.0)
+        self.assertEqual([result["score"] for result in fused], [0.8, 0.9, None])
+        self.assertGreater(fused[0]["rrf_score"], fused[1]["rrf_score"])
+
+    def test_hybrid_search_falls_back_when_over_budget(self):
+        # 测试词法检索超出延迟预算时只返回向量结果
+        class SlowIndex(LexicalIndex):
+            def search(self, query, k=4, filters=None):
+                time.sleep(0.2)
+                return super().search(query, k, filters)
+
+        index = SlowIndex()
+        index.add(["1"], ["lexical only"])
+
+        def vector_search(query, k):
+            return [{"content": "vector only", "metadata": {}, "score": 0.5}]
+
+        results = hybrid_search(vector_search, index, "lexical", k=2, budget_ms=10)
+
+        self.assertEqual([result["content"] for result in results], ["vector only"])
+
+    def test_hybrid_search_falls_back_when_index_fails(self):
+        # 测试词法检索出错时只返回向量结果
+        class BrokenIndex(LexicalIndex):
+            def search(self, query, k=4, filters=None):
+                raise OSError("索引文件不可读")
+
+        def vector_search(query, k):
+            return [{"content": "vector only", "metadata": {}, "score": 0.5}]
+
+        results = hybrid_search(vector_search, BrokenIndex(), "lexical", k=2, budget_ms=1000)
+
+        self.assertEqual([result["content"] for result in results], ["vector only"])
+
+    def test_hybrid_search_threshold_drops_lexical_only_hits(self):
+        # 测试设置相似度阈值时不返回没有向量相似度的词法结果
+        index = LexicalIndex()
+        index.add(["1"], ["lexical only"])
+
+        def vector_search(query, k):
+            return [{"content": "vector only", "metadata": {}, "score": 0.5}]
+
+        results = hybrid_search(vector_search, index, "lexical", k=2, budget_ms=1000, score_threshold=0.4)
+
+        self.assertEqual([result["content"] for result in results], ["vector only"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+import os
+import shutil
+import tempfile
+import unittest
+import zlib
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.core.config import settings
+from app.core.local_vectorstore import LocalCollection, LocalVectorStore, ReadOnlyVectorStoreError
+
+
+class HashEmbeddings(Embeddings):
+    """按文本内容生成固定随机向量的测试用嵌入模型"""
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        return np.random.default_rng(zlib.crc32(text.encode())).normal(size=16).tolist()
+
+
+class TestLocalVectorStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+
+    def test_search_returns_cosine_scores(self):
+        # 测试检索结果按余弦相似度降序，并保留元数据
+        store = LocalVectorStore.from_texts(["a", "b", "c"], HashEmbeddings(), metadatas=[{"i": 1}, {"i": 2}, {"i": 3}])
+
+        results = store.similarity_search_with_score("b", k=2, search_params=None)
+
+        self.assertEqual(results[0][0].metadata, {"i": 2})
+        self.assertAlmostEqual(results[0][1], 1.0, places=5)
+        self.assertGreater(results[0][1], results[1][1])
+
+    def test_search_applies_filters_and_threshold(self):
+        # 测试元数据过滤在计算相似度之前执行，低于阈值的结果不返回
+        store = LocalVectorStore.from_texts(
+            ["a", "b", "c"],
+            HashEmbeddings(),
+            metadatas=[{"source": "resume"}, {"source": "doc"}, {"source": "resume"}],
+        )
+        embedding = HashEmbeddings().embed_query("b")
+
+        filtered = store.similarity_search_with_score_by_vector(embedding, k=3, filter={"source": "resume"})
+        thresholded = store.similarity_search_with_score_by_vector(embedding, k=3, score_threshold=0.99)
+
+        self.assertEqual(sorted(doc.page_content for doc, _ in filtered), ["a", "c"])
+        self.assertEqual([doc.page_content for doc, _ in thresholded], ["b"])
+
+    def test_persisted_collection_reloads(self):
+        # 测试持久化的集合重新打开后内容不变，删除的点不再返回
+        store = LocalVectorStore.from_texts(
+            ["a", "b", "c"], HashEmbeddings(), ids=["1", "2", "3"], persist_directory=self.directory
+        )
+        store.delete(["3"])
+
+        reloaded = LocalVectorStore("test", HashEmbeddings(), collection=LocalCollection(self.directory))
+
+        self.assertEqual(len(reloaded.collection), 2)
+        self.assertEqual(reloaded.similarity_search("a", k=1)[0].page_content, "a")
+        self.assertNotIn("c", [doc.page_content for doc in reloaded.similarity_search("c", k=3)])
+
+    def test_interleaved_writers_share_collection(self):
+        # 测试两个实例交替写入同一个目录时向量与payload保持对齐，删除互不覆盖
+        first = LocalVectorStore("test", HashEmbeddings(), collection=LocalCollection(self.directory))
+        second = LocalVectorStore("test", HashEmbeddings(), collection=LocalCollection(self.directory))
+
+        first.add_texts(["a"], ids=["1"])
+        second.add_texts(["b"], ids=["2"])
+        first.add_texts(["c"], ids=["3"])
+        second.delete(["1"])
+        first.add_texts(["b2"], ids=["2"])
+
+        for store in (first, second, LocalVectorStore("test", HashEmbeddings(), collection=LocalCollection(self.directory))):
+            self.assertEqual(len(store.collection), 2)
+            self.assertEqual(store.similarity_search("c", k=1)[0].page_content, "c")
+            self.assertEqual(sorted(doc.page_content for doc in store.similarity_search("a", k=5)), ["b2", "c"])
+
+    def test_partial_write_is_discarded_before_next_upsert(self):
+        # 测试进程在写入payload后、写入向量前退出时，之后写入的点仍与向量对齐
+        store = LocalVectorStore("test", HashEmbeddings(), collection=LocalCollection(self.directory))
+        store.add_texts(["a"], ids=["1"])
+        with open(os.path.join(self.directory, "payloads.jsonl"), "a", encoding="utf-8") as f:
+            f.write('{"id": "lost", "page_content": "lost", "metadata": {}}\n')
+
+        reopened = LocalVectorStore("test", HashEmbeddings(), collection=LocalCollection(self.directory))
+        reopened.add_texts(["b"], ids=["2"])
+
+        self.assertEqual(reopened.similarity_search("b", k=1)[0].page_content, "b")
+        self.assertEqual(len(reopened.collection), 2)
+
+    def test_read_only_store_rejects_writes(self):
+        # 测试作为Qdrant后备的只读向量库拒绝写入
+        store = LocalVectorStore("test", HashEmbeddings(), collection=LocalCollection(), read_only=True)
+
+        with self.assertRaises(ReadOnlyVectorStoreError):
+            store.add_texts(["a"])
+
+    def test_upsert_replaces_existing_id(self):
+        # 测试相同ID再次写入时替换旧点
+        store = LocalVectorStore.from_texts(["old"], HashEmbeddings(), ids=["1"])
+        store.add_texts(["new"], ids=["1"])
+
+        self.assertEqual([doc.page_content for doc in store.similarity_search("old", k=5)], ["new"])
+
+    def test_ivf_index_finds_exact_match(self):
+        # 测试点数超过阈值后构建IVF索引，精确匹配的文本仍排在第一位
+        original = settings.LOCAL_IVF_MIN_POINTS
+        settings.LOCAL_IVF_MIN_POINTS = 500
+        self.addCleanup(setattr, settings, "LOCAL_IVF_MIN_POINTS", original)
+        texts = [f"文本{i}" for i in range(1000)]
+
+        store = LocalVectorStore.from_texts(texts, HashEmbeddings(), persist_directory=self.directory, batch_size=200)
+
+        self.assertIsNotNone(store.collection.centroids)
+        self.assertEqual(store.similarity_search("文本123", k=1)[0].page_content, "文本123")
+
+
+if __name__ == "__main__":
+    unittest.main()
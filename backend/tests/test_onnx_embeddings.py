@@ -0,0 +1,65 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+try:
+    import onnxruntime  # noqa: F401
+    import torch
+    import transformers  # noqa: F401
+except ImportError:
+    torch = None
+
+
+@unittest.skipIf(torch is None, "需要安装 torch、onnxruntime 和 transformers")
+class TestOnnxParity(unittest.TestCase):
+    def setUp(self):
+        from transformers import BertConfig, BertModel, BertTokenizerFast
+
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        self.model_dir = os.path.join(self.directory, "model")
+        os.makedirs(self.model_dir)
+
+        # 随机初始化的小型BERT，不需要下载模型
+        vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]", "redis", "kafka", "缓", "存", "队", "列"]
+        vocab += list("abcdefghijklmnopqrstuvwxyz")
+        vocab_file = os.path.join(self.directory, "vocab.txt")
+        with open(vocab_file, "w", encoding="utf-8") as f:
+            f.write("\n".join(vocab) + "\n")
+        self.tokenizer = BertTokenizerFast(vocab_file=vocab_file)
+        torch.manual_seed(0)
+        self.model = BertModel(BertConfig(
+            vocab_size=len(vocab),
+            hidden_size=32,
+            num_hidden_layers=2,
+            num_attention_heads=2,
+            intermediate_size=64,
+            max_position_embeddings=64,
+        )).eval()
+        self.model.save_pretrained(self.model_dir)
+        self.tokenizer.save_pretrained(self.model_dir)
+
+    def test_matches_pytorch_mean_pooling(self):
+        # 测试导出的ONNX模型与PyTorch的平均池化向量一致，超长文本按相同的 max_length 截断
+        from app.core.onnx_embeddings import OnnxEmbeddings, export_onnx_model
+
+        output_dir = export_onnx_model(self.model_dir, os.path.join(self.directory, "onnx"), quantize=False)
+        onnx_model = OnnxEmbeddings(output_dir, quantized=False, pooling="mean", max_length=16)
+        texts = ["redis 缓存", "kafka 队列 " * 20, "abc"]
+
+        encoded = self.tokenizer(texts, padding=True, truncation=True, max_length=16, return_tensors="pt")
+        with torch.no_grad():
+            hidden = self.model(**encoded).last_hidden_state
+        mask = encoded["attention_mask"].unsqueeze(-1).float()
+        reference = ((hidden * mask).sum(dim=1) / mask.sum(dim=1)).numpy()
+        reference /= np.linalg.norm(reference, axis=1, keepdims=True)
+
+        candidate = np.array(onnx_model.embed_documents(texts))
+        self.assertGreater(float((reference * candidate).sum(axis=1).min()), 0.999)
+
+
+if __name__ == "__main__":
+    unittest.main()
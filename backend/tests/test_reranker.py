@@ -0,0 +1,75 @@
+import time
+import unittest
+import warnings
+
+from app.core.config import settings
+from app.core.reranker import Reranker
+
+
+class CountingReranker(Reranker):
+    """按文本长度打分的重排器，记录打分次数"""
+
+    def __init__(self):
+        super().__init__(model_name="test", batch_size=4, cache_size=16)
+        self.calls = 0
+
+    def _predict(self, query, contents):
+        self.calls += 1
+        self.seconds_per_pair = 0.01
+        return [float(len(content)) for content in contents]
+
+
+class TestReranker(unittest.TestCase):
+    def setUp(self):
+        self.results = [
+            {"content": "a", "metadata": {}, "score": 0.9},
+            {"content": "ccc", "metadata": {}, "score": 0.8},
+            {"content": "bb", "metadata": {}, "score": 0.7},
+        ]
+
+    def test_rerank_orders_by_score_and_caches(self):
+        # 测试按交叉编码器分数重排，重复的问题使用缓存
+        reranker = CountingReranker()
+
+        first = reranker.rerank("q", self.results, k=2)
+        second = reranker.rerank("q", self.results, k=2)
+
+        self.assertEqual([result["content"] for result in first], ["ccc", "bb"])
+        self.assertEqual(first, second)
+        self.assertEqual(reranker.calls, 1)
+
+    def test_rerank_skipped_when_over_budget(self):
+        # 测试预计耗时超出剩余预算时保持检索顺序
+        reranker = CountingReranker()
+        reranker.seconds_per_pair = 0.1
+
+        results = reranker.rerank("q", self.results, k=2, deadline=time.perf_counter() + 0.05)
+
+        self.assertEqual([result["content"] for result in results], ["a", "ccc"])
+        self.assertEqual(reranker.calls, 0)
+
+    def test_rerank_retries_after_cooldown(self):
+        # 测试打分出错后在冷却时间内跳过重排，冷却结束后重新尝试
+        reranker = CountingReranker()
+        original_predict = reranker._predict
+        reranker._predict = lambda query, contents: 1 / 0
+        original = settings.RERANK_RETRY_SECONDS
+        settings.RERANK_RETRY_SECONDS = 60
+        self.addCleanup(setattr, settings, "RERANK_RETRY_SECONDS", original)
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            failed = reranker.rerank("q", self.results, k=2)
+        reranker._predict = original_predict
+        skipped = reranker.rerank("q", self.results, k=2)
+        reranker._retry_at = 0.0
+        retried = reranker.rerank("q", self.results, k=2)
+
+        self.assertEqual([result["content"] for result in failed], ["a", "ccc"])
+        self.assertEqual([result["content"] for result in skipped], ["a", "ccc"])
+        self.assertEqual([result["content"] for result in retried], ["ccc", "bb"])
+        self.assertEqual(reranker.calls, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
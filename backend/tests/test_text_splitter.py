@@ -0,0 +1,70 @@
+import unittest
+from app.core import text_splitter
+from app.core.text_splitter import TokenSentenceTextSplitter, estimate_tokens, split_sentences
+
+class TestTextSplitter(unittest.TestCase):
+    def test_split_sentences(self):
+        # 测试中英文句末标点切分
+        sentences = split_sentences("我熟悉Python。你呢？ I use FastAPI. It is fast!\n第二行；结束")
+        
+        self.assertEqual(sentences, ["我熟悉Python。", "你呢？", "I use FastAPI.", "It is fast!", "第二行；", "结束"])
+
+    def test_split_sentences_keeps_decimal_points(self):
+        # 测试不在小数点处切分
+        self.assertEqual(split_sentences("版本3.14已发布。"), ["版本3.14已发布。"])
+
+    def test_chunks_respect_token_budget(self):
+        # 测试每块不超过token上限
+        text = "这是一个关于分布式系统的句子。" * 40
+        splitter = TokenSentenceTextSplitter(chunk_size=50, chunk_overlap=0)
+        
+        chunks = splitter.split_text(text)
+        
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertLessEqual(estimate_tokens(chunk), 50)
+            self.assertTrue(chunk.endswith("。"))
+
+    def test_overlap_is_whole_sentences(self):
+        # 测试块之间只重叠完整句子
+        text = "第一句。第二句。第三句。第四句。"
+        splitter = TokenSentenceTextSplitter(chunk_size=8, chunk_overlap=4)
+        
+        chunks = splitter.split_text(text)
+        
+        self.assertEqual(chunks, ["第一句。第二句。", "第二句。第三句。", "第三句。第四句。"])
+
+    def test_long_sentence_is_split(self):
+        # 测试超长句子按子句切分
+        text = "，".join(["这是一个很长的子句"] * 20) + "。"
+        splitter = TokenSentenceTextSplitter(chunk_size=30, chunk_overlap=0)
+        
+        for chunk in splitter.split_text(text):
+            self.assertLessEqual(estimate_tokens(chunk), 30)
+
+    def test_english_sentences_joined_with_space(self):
+        # 测试英文句子拼接时保留空格
+        splitter = TokenSentenceTextSplitter(chunk_size=100, chunk_overlap=0)
+        
+        self.assertEqual(splitter.split_text("Hello world. Goodbye world."), ["Hello world. Goodbye world."])
+
+    def test_token_counter_uses_model_tokenizer(self):
+        # 测试优先使用嵌入模型的分词器计数
+        class Tokenizer:
+            def encode(self, text, add_special_tokens=True):
+                return list(text)
+
+        class Client:
+            tokenizer = Tokenizer()
+            max_seq_length = 128
+
+        class Model:
+            client = Client()
+
+        counter = text_splitter.get_token_counter(Model())
+        
+        self.assertEqual(counter("abc d"), 5)
+        self.assertEqual(text_splitter.get_max_tokens(Model()), 128)
+
+if __name__ == "__main__":
+    unittest.main()
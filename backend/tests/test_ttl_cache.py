@@ -0,0 +1,37 @@
+import time
+import unittest
+from types import SimpleNamespace
+
+from app.utils.ttl_cache import TTLCache
+
+
+class TestTTLCache(unittest.TestCase):
+    def test_expires_after_ttl(self):
+        # 测试超过有效期的条目不再返回
+        cache = TTLCache(ttl_seconds=0.05, max_size=10)
+        user = SimpleNamespace(id=1, username="alice")
+        cache.put("alice", user)
+
+        self.assertIs(cache.get("alice"), user)
+        time.sleep(0.06)
+        self.assertIsNone(cache.get("alice"))
+
+    def test_invalidate_and_eviction(self):
+        # 测试失效后不再命中，超出容量时淘汰最久未使用的条目
+        cache = TTLCache(ttl_seconds=60, max_size=2)
+        for user_id, name in enumerate(["alice", "bob", "carol"], start=1):
+            cache.put(name, SimpleNamespace(id=user_id, username=name))
+
+        self.assertIsNone(cache.get("alice"))
+        cache.invalidate("bob")
+        self.assertIsNone(cache.get("bob"))
+        self.assertEqual(cache.get("carol").id, 3)
+
+    def test_zero_ttl_disables_cache(self):
+        cache = TTLCache(ttl_seconds=0, max_size=10)
+        cache.put("alice", SimpleNamespace(id=1, username="alice"))
+        self.assertIsNone(cache.get("alice"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -9,6 +9,9 @@ const kbTitle = document.getElementById('kb-title');
 const historyList = document.getElementById('history-list');
 const backBtn = document.getElementById('back-btn');
 
+// 每页查询历史条数
+const HISTORY_PAGE_SIZE = 20;
+
 // 获取知识库ID
 const urlParams = new URLSearchParams(window.location.search);
 const kbId = urlParams.get('kb_id');
@@ -91,13 +94,17 @@ async function loadKnowledgeBaseInfo() {
 }
 
 /**
- * 加载查询历史
+ * 加载一页查询历史，cursor 为上一页返回的 next_cursor
  */
-async function loadQueryHistory() {
+async function loadQueryHistory(cursor = null) {
     const token = localStorage.getItem('access_token');
+    const params = new URLSearchParams({ limit: HISTORY_PAGE_SIZE });
+    if (cursor) {
+        params.set('cursor', cursor);
+    }
     
     try {
-        const response = await fetch(`${API_BASE_URL}/multi-knowledge/knowledge-bases/history/${kbId}`, {
+        const response = await fetch(`${API_BASE_URL}/multi-knowledge/knowledge-bases/history/${kbId}?${params}`, {
             method: 'GET',
             headers: {
                 'Authorization': `Bearer ${token}`
@@ -105,8 +112,8 @@ async function loadQueryHistory() {
         });
         
         if (response.ok) {
-            const history = await response.json();
-            displayQueryHistory(history);
+            const page = await response.json();
+            displayQueryHistory(page.items, page.next_cursor, Boolean(cursor));
         } else {
             historyList.innerHTML = '<p>加载查询历史失败</p>';
         }
@@ -117,15 +124,15 @@ async function loadQueryHistory() {
 }
 
 /**
- * 显示查询历史
+ * 显示查询历史，append 为真时追加到已显示的记录之后
  */
-function displayQueryHistory(history) {
-    if (history.length === 0) {
+function displayQueryHistory(history, nextCursor, append) {
+    if (!append && history.length === 0) {
         historyList.innerHTML = '<p>该知识库暂无查询历史</p>';
         return;
     }
     
-    let html = '<div class="history-list">';
+    let html = '';
     
     history.forEach(item => {
         html += `
@@ -144,6 +151,17 @@ function displayQueryHistory(history) {
         `;
     });
     
-    html += '</div>';
-    historyList.innerHTML = html;
+    const moreBtn = document.getElementById('history-more-btn');
+    if (moreBtn) {
+        moreBtn.remove();
+    }
+    if (!append) {
+        historyList.innerHTML = '<div class="history-list"></div>';
+    }
+    historyList.querySelector('.history-list').insertAdjacentHTML('beforeend', html);
+    
+    if (nextCursor) {
+        historyList.insertAdjacentHTML('beforeend', '<button id="history-more-btn">加载更多</button>');
+        document.getElementById('history-more-btn').addEventListener('click', () => loadQueryHistory(nextCursor));
+    }
 }
\ No newline at end of file